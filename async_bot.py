@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Asyncio Bybit Trading Bot
+Drives many trading pairs from one event loop over pooled keep-alive connections
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from datetime import datetime
+import aiohttp
+from strategies.moving_average import MovingAverageStrategy
+from utils.candle_store import get_candle_store
+from utils.account import POSITIONS_PAGE_LIMIT, index_positions, parse_position
+from utils.instruments import InstrumentCache, size_order
+from utils.http_client import get_client
+from utils.logger import setup_logger
+
+MAINNET_URL = "https://api.bybit.com"
+TESTNET_URL = "https://api-testnet.bybit.com"
+
+class AsyncBybitClient:
+    """Minimal asyncio client for the Bybit v5 endpoints used by the bot"""
+
+    def __init__(self, api_key, api_secret, testnet=True, base_url=None, timeout=10,
+                 pool_size=100, recv_window=5000):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url or (TESTNET_URL if testnet else MAINNET_URL)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.recv_window = recv_window
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        """Create the pooled keep-alive session"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                base_url=self.base_url,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Content-Type": "application/json", "Accept": "application/json"}
+            )
+
+    async def close(self):
+        """Close the session and its pooled connections"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def sign(self, payload):
+        """Build Bybit v5 authentication headers for a payload"""
+        timestamp = str(int(time.time() * 1000))
+        param_str = timestamp + self.api_key + str(self.recv_window) + payload
+        signature = hmac.new(self.api_secret.encode("utf-8"), param_str.encode("utf-8"),
+                             hashlib.sha256).hexdigest()
+        return {
+            "X-BAPI-API-KEY": self.api_key,
+            "X-BAPI-SIGN": signature,
+            "X-BAPI-SIGN-TYPE": "2",
+            "X-BAPI-TIMESTAMP": timestamp,
+            "X-BAPI-RECV-WINDOW": str(self.recv_window)
+        }
+
+    async def request(self, method, path, params, auth=False):
+        """Send a request and return the decoded JSON body"""
+        await self.open()
+        params = {k: v for k, v in params.items() if v is not None}
+
+        if method == "GET":
+            payload = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+            headers = self.sign(payload) if auth else {}
+            url = f"{path}?{payload}" if payload else path
+            async with self.session.get(url, headers=headers) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+        payload = json.dumps(params)
+        headers = self.sign(payload) if auth else {}
+        async with self.session.post(path, data=payload, headers=headers) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def get_wallet_balance(self, **params):
+        return await self.request("GET", "/v5/account/wallet-balance", params, auth=True)
+
+    async def get_kline(self, **params):
+        return await self.request("GET", "/v5/market/kline", params)
+
+    async def get_positions(self, **params):
+        return await self.request("GET", "/v5/position/list", params, auth=True)
+
+    async def place_order(self, **params):
+        return await self.request("POST", "/v5/order/create", params, auth=True)
+
+    async def set_trading_stop(self, **params):
+        return await self.request("POST", "/v5/position/trading-stop", params, auth=True)
+
+class AsyncBybitTradingBot:
+    def __init__(self, config_path="config.json"):
+        self.logger = setup_logger("AsyncBybitTradingBot")
+        self.config = self.load_config(config_path)
+        self.client = AsyncBybitClient(
+            api_key=self.config['api_key'],
+            api_secret=self.config['api_secret'],
+            testnet=self.config.get('testnet', True),
+            base_url=self.config.get('base_url'),
+            timeout=self.config.get('request_timeout', 10),
+            pool_size=self.config.get('async_max_concurrency', 100)
+        )
+        self.strategy = MovingAverageStrategy(
+            short_period=self.config.get("ma_short_period", 20),
+            long_period=self.config.get("ma_long_period", 50),
+            incremental=self.config.get("incremental_signals", False)
+        )
+        # Filters are loaded once at startup, so the shared blocking client is enough here
+        self.instruments = InstrumentCache(
+            get_client(self.config),
+            path=self.config.get("instruments_cache_path", "data/instruments_linear.json"),
+            ttl=self.config.get("instruments_cache_ttl", 86400)
+        )
+        self.instruments.load()
+        # Enough candles for the long MA on the current and previous candle, up to one request's worth
+        self.window_size = min(max(100, self.strategy.long_period + 1), 1000)
+        self.candles = get_candle_store(max(self.config.get("candle_buffer_size", 1000), self.window_size))
+        # Created in run(): on Python 3.9 a semaphore binds to the loop current at creation
+        self.semaphore = None
+
+    def load_config(self, config_path):
+        """Load configuration from JSON file"""
+        try:
+            with open(config_path, 'r') as file:
+                config = json.load(file)
+
+            required_fields = ['api_key', 'api_secret']
+            for field in required_fields:
+                if field not in config or not config[field] or config[field] == f"YOUR_BYBIT_{field.upper()}_HERE":
+                    raise ValueError(f"Please set your {field} in {config_path}")
+
+            self.logger.info("Configuration loaded successfully")
+            return config
+
+        except Exception as e:
+            self.logger.error(f"Error loading configuration: {e}")
+            raise
+
+    async def get_account_balance(self, coin="USDT"):
+        """Get account balance for specific coin"""
+        try:
+            response = await self.client.get_wallet_balance(accountType="UNIFIED", coin=coin)
+            if response['retCode'] == 0:
+                return float(response['result']['list'][0]['coin'][0]['availableToWithdraw'])
+            self.logger.error(f"Error getting balance: {response['retMsg']}")
+        except Exception as e:
+            self.logger.error(f"Error getting account balance: {e}")
+        return 0
+
+    async def get_all_positions(self, settle_coin="USDT"):
+        """Every linear position for the settle coin keyed by symbol, or None on error"""
+        try:
+            positions = {}
+            cursor = None
+            while True:
+                response = await self.client.get_positions(category="linear", settleCoin=settle_coin,
+                                                           limit=POSITIONS_PAGE_LIMIT, cursor=cursor)
+                if response['retCode'] != 0:
+                    self.logger.error(f"Error getting positions: {response['retMsg']}")
+                    return None
+                index_positions(positions, response['result']['list'])
+                cursor = response['result'].get('nextPageCursor')
+                if not cursor or not response['result']['list']:
+                    return positions
+        except Exception as e:
+            self.logger.error(f"Error getting positions: {e}")
+        return None
+
+    async def get_market_data(self, symbol, interval="5", limit=200):
+        """Get historical market data"""
+        try:
+            response = await self.client.get_kline(category="linear", symbol=symbol,
+                                                   interval=interval, limit=limit)
+            if response['retCode'] == 0:
+                return response
+            self.logger.error(f"Error getting market data: {response['retMsg']}")
+        except Exception as e:
+            self.logger.error(f"Error getting market data: {e}")
+        return None
+
+    async def get_current_position(self, symbol):
+        """Get current position for symbol"""
+        try:
+            response = await self.client.get_positions(category="linear", symbol=symbol)
+            if response['retCode'] == 0 and response['result']['list']:
+                return parse_position(response['result']['list'][0])
+        except Exception as e:
+            self.logger.error(f"Error getting position: {e}")
+        return None
+
+    async def place_market_order(self, symbol, side, qty, reduce_only=False, stop_loss=None, take_profit=None,
+                                 order_link_id=None):
+        """Place market order, optionally with stop loss and take profit attached"""
+        try:
+            order_params = {
+                "category": "linear",
+                "symbol": symbol,
+                "side": side,
+                "orderType": "Market",
+                "qty": str(qty),
+                "timeInForce": "IOC"
+            }
+            if reduce_only:
+                order_params["reduceOnly"] = True
+            # A link id makes the order idempotent, so a lost response can be retried safely
+            order_params["orderLinkId"] = order_link_id or f"ma-{uuid.uuid4().hex[:24]}"
+            if stop_loss or take_profit:
+                order_params["tpslMode"] = "Full"
+                if stop_loss:
+                    order_params["stopLoss"] = str(stop_loss)
+                    order_params["slTriggerBy"] = "LastPrice"
+                if take_profit:
+                    order_params["takeProfit"] = str(take_profit)
+                    order_params["tpTriggerBy"] = "LastPrice"
+
+            response = await self.client.place_order(**order_params)
+            if response['retCode'] == 0:
+                self.logger.info(f"Order placed successfully: {side} {qty} {symbol}")
+                return response['result']
+            self.logger.error(f"Order failed: {response['retMsg']}")
+        except Exception as e:
+            self.logger.error(f"Error placing order: {e}")
+        return None
+
+    async def open_protected_position(self, symbol, side, qty, stop_loss, take_profit):
+        """Open a position with TP/SL attached, falling back to confirm-then-set"""
+        # The same link id on both attempts lets the exchange reject a duplicate
+        # if the first request was executed but its response was lost
+        order_link_id = f"ma-{uuid.uuid4().hex[:24]}"
+
+        order = await self.place_market_order(symbol, side, qty, stop_loss=stop_loss, take_profit=take_profit,
+                                              order_link_id=order_link_id)
+        if order or not self.config.get('tpsl_fallback', True):
+            return order
+
+        self.logger.warning(f"Order with attached TP/SL failed for {symbol}, retrying without it")
+        order = await self.place_market_order(symbol, side, qty, order_link_id=order_link_id)
+        if order:
+            attempts = self.config.get('position_confirm_attempts', 5)
+            if not await self.wait_for_position(symbol, timeout=self.config.get('position_confirm_timeout', 5.0),
+                                                attempts=attempts):
+                self.logger.error(f"Position for {symbol} not confirmed after {attempts} checks, "
+                                  f"it is UNPROTECTED: no TP/SL set")
+            elif not await self.set_stop_loss_take_profit(symbol, stop_loss, take_profit):
+                self.logger.error(f"Position for {symbol} is UNPROTECTED: setting TP/SL failed")
+        return order
+
+    async def wait_for_position(self, symbol, timeout=5.0, attempts=5):
+        """Check up to ``attempts`` times, spread over ``timeout`` seconds, for an open position in symbol"""
+        interval = timeout / max(attempts - 1, 1)
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(interval)
+            position = await self.get_current_position(symbol)
+            if position and position['size'] > 0:
+                return position
+        return None
+
+    async def set_stop_loss_take_profit(self, symbol, stop_loss=None, take_profit=None):
+        """Set stop loss and take profit for existing position"""
+        try:
+            params = {"category": "linear", "symbol": symbol}
+            if stop_loss:
+                params["stopLoss"] = str(stop_loss)
+            if take_profit:
+                params["takeProfit"] = str(take_profit)
+
+            response = await self.client.set_trading_stop(**params)
+            if response['retCode'] == 0:
+                self.logger.info(f"TP/SL set for {symbol}: SL={stop_loss}, TP={take_profit}")
+                return True
+            self.logger.error(f"Failed to set TP/SL: {response['retMsg']}")
+        except Exception as e:
+            self.logger.error(f"Error setting TP/SL: {e}")
+        return False
+
+    async def calculate_position_size(self, symbol, current_price, balance=None):
+        """Calculate position size based on account balance, fetching it unless given"""
+        try:
+            if balance is None:
+                balance = await self.get_account_balance()
+            return size_order(balance, current_price, symbol, self.instruments.get(symbol))
+
+        except Exception as e:
+            self.logger.error(f"Error calculating position size: {e}")
+            return self.config.get("position_size", 0.001)
+
+    async def execute_strategy(self, symbol, current_position=None, balance=None):
+        """Execute trading strategy for a symbol with the cycle's position and balance"""
+        async with self.semaphore:
+            try:
+                market_data = await self.get_market_data(symbol, interval="5", limit=self.window_size)
+                if not market_data:
+                    return
+
+                self.candles.ingest(symbol, "5", market_data)
+                candles = self.candles.window(symbol, "5", self.window_size)
+                current_price = float(candles['close'][-1])
+
+                if self.strategy.incremental:
+                    signal, ma_short, ma_long = self.strategy.get_current_signal(market_data, symbol)
+                else:
+                    signal, ma_short, ma_long = self.strategy.get_current_signal(candles)
+                if ma_short is None:
+                    return
+
+                self.logger.info(f"{symbol} - Price: {current_price:.4f}, MA Short: {ma_short:.4f}, MA Long: {ma_long:.4f}")
+
+                if signal == "BUY" and (not current_position or current_position['size'] == 0):
+                    self.logger.info(f"Signal detected for {symbol}: {signal}")
+                    position_size = await self.calculate_position_size(symbol, current_price, balance)
+                    if position_size <= 0:
+                        self.logger.warning(f"Skipping {symbol} entry: minimum order value exceeds what the balance allows")
+                        return
+                    stop_loss = self.instruments.round_price(
+                        symbol, current_price * (1 - self.config.get("stop_loss_percentage", 2.0) / 100))
+                    take_profit = self.instruments.round_price(
+                        symbol, current_price * (1 + self.config.get("take_profit_percentage", 4.0) / 100))
+
+                    # TP/SL go out with the order, so there is no unprotected gap to wait out
+                    await self.open_protected_position(symbol, "Buy", position_size, stop_loss, take_profit)
+
+                elif signal == "SELL" and current_position and current_position['size'] > 0:
+                    self.logger.info(f"Signal detected for {symbol}: {signal}")
+                    await self.place_market_order(symbol, "Sell", current_position['size'], reduce_only=True)
+
+            except Exception as e:
+                self.logger.error(f"Error executing strategy for {symbol}: {e}")
+
+    async def run_cycle(self):
+        """Run one evaluation of every trading pair"""
+        self.logger.info(f"--- Bot Cycle: {datetime.now()} ---")
+        # One wallet and one bulk position request per cycle, shared by every pair
+        balance, positions = await asyncio.gather(self.get_account_balance(), self.get_all_positions())
+        self.logger.info(f"Account Balance: {balance:.4f} USDT")
+        if positions is None:
+            # Without positions a BUY could stack onto an open position, so skip the cycle
+            self.logger.error("Positions unavailable, skipping this cycle")
+            return
+
+        symbols = self.config.get('trading_pairs', ['BTCUSDT'])
+        await asyncio.gather(*(self.execute_strategy(symbol, positions.get(symbol), balance) for symbol in symbols))
+
+    async def run(self, cycles=None):
+        """Main bot loop, scheduled on fixed event-loop deadlines"""
+        self.logger.info("Starting Async Bybit Trading Bot")
+        self.logger.info(f"Trading pairs: {self.config.get('trading_pairs', [])}")
+
+        loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.config.get('async_max_concurrency', 100))
+        interval = self.config.get('trading_interval', 60)
+        deadline = loop.time()
+        completed = 0
+
+        try:
+            async with self.client:
+                while cycles is None or completed < cycles:
+                    await self.run_cycle()
+                    completed += 1
+                    if completed == cycles:
+                        break
+
+                    # Next deadline is fixed, so cycle duration does not cause drift
+                    deadline += interval
+                    if loop.time() > deadline:
+                        self.logger.warning("Cycle overran the trading interval, starting next cycle now")
+                        deadline = loop.time()
+                    await asyncio.sleep(deadline - loop.time())
+
+        except asyncio.CancelledError:
+            self.logger.info("Bot stopped")
+        finally:
+            self.logger.info("Bot shut down")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(AsyncBybitTradingBot().run())
+    except KeyboardInterrupt:
+        print("Bot stopped by user")
+    except Exception as e:
+        print(f"Failed to start bot: {e}")
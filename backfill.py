@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Historical Backfill
+Downloads kline history in parallel pages into the on-disk candle store
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+import numpy as np
+from utils.http_client import get_client
+from utils.klines import parse_klines, interval_to_ms
+from utils.logger import setup_logger
+from utils.ohlcv_store import get_ohlcv_store
+
+# Bybit returns at most this many klines per request
+KLINE_PAGE_LIMIT = 1000
+
+class HistoryBackfill:
+    """Parallel, resumable kline download into an OHLCVStore
+
+    The requested range is split into pages of ``page_size`` candles and
+    every page is fetched on a thread pool through the shared client, so
+    requests are paced by the rate limiter and retried like any other call.
+    Pages complete out of order, so finished pages are held back and written
+    per symbol in order. Candles the store already holds (and page overlaps)
+    are dropped by the store.
+
+    Candles after the newest stored one are appended oldest page first.
+    Candles before the oldest stored one are fetched newest page first and
+    merged in every ``merge_pages`` pages, so the stored history stays
+    contiguous while it grows backwards; each merge rewrites the columns.
+
+    After each written page the next page start per symbol is saved to a
+    checkpoint file, along with the start from which older history is
+    complete; a rerun with the same interval resumes from there.
+    """
+
+    def __init__(self, client, store, interval="5", category="linear", workers=8, page_size=KLINE_PAGE_LIMIT,
+                 checkpoint_path="data/backfill_checkpoint.json", checkpoint_every=1.0, merge_pages=100):
+        self.client = client
+        self.store = store
+        self.interval = str(interval)
+        self.interval_ms = interval_to_ms(interval)
+        if self.interval_ms is None:
+            raise ValueError(f"Interval {interval} has no fixed length and cannot be paged")
+        self.category = category
+        self.workers = workers
+        self.page_size = min(page_size, KLINE_PAGE_LIMIT)
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.merge_pages = merge_pages
+        self.logger = setup_logger("HistoryBackfill")
+
+    def load_checkpoint(self):
+        """Next page start and complete-from time per symbol from an earlier run of the same interval"""
+        checkpoint = {'next': {}, 'complete_from': {}}
+        if not self.checkpoint_path:
+            return checkpoint
+        try:
+            with open(self.checkpoint_path, 'r') as file:
+                saved = json.load(file)
+        except FileNotFoundError:
+            return checkpoint
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable checkpoint {self.checkpoint_path}: {e}")
+            return checkpoint
+        checkpoint.update(saved.get(self.category, {}).get(self.interval, {}))
+        return checkpoint
+
+    def save_checkpoint(self, cursors, complete_from):
+        """Atomically record how far each symbol has been written"""
+        if not self.checkpoint_path:
+            return
+        try:
+            with open(self.checkpoint_path, 'r') as file:
+                checkpoint = json.load(file)
+        except Exception:
+            checkpoint = {}
+        checkpoint.setdefault(self.category, {})[self.interval] = {'next': cursors, 'complete_from': complete_from}
+
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.checkpoint_path}.tmp"
+        with open(temporary, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(temporary, self.checkpoint_path)
+
+    def pages(self, start, end):
+        """(first open time, last open time) of every page between start and end"""
+        page_ms = self.page_size * self.interval_ms
+        first = -(-start // self.interval_ms) * self.interval_ms
+        return [(page, min(page + page_ms, end) - 1) for page in range(first, end, page_ms)]
+
+    def fetch(self, symbol, page_start, page_end):
+        """Download one page as oldest-first arrays, None on failure"""
+        try:
+            response = self.client.get_kline(
+                category=self.category,
+                symbol=symbol,
+                interval=self.interval,
+                start=page_start,
+                end=page_end,
+                limit=self.page_size
+            )
+            if response['retCode'] != 0:
+                self.logger.error(f"Error fetching {symbol} page at {page_start}: {response['retMsg']}")
+                return None
+            arrays = parse_klines(response['result']['list'])
+            if arrays is None:
+                # Nothing traded yet in this range, e.g. before the symbol was listed
+                return {}
+            # Pages are inclusive at both ends, so trim anything outside this one
+            keep = (arrays['timestamp'] >= page_start) & (arrays['timestamp'] <= page_end)
+            return {field: values[keep] for field, values in arrays.items()}
+
+        except Exception as e:
+            self.logger.error(f"Error fetching {symbol} page at {page_start}: {str(e).splitlines()[0]}")
+            return None
+
+    def merge_older(self, symbol, pages):
+        """Merge newest-first pages from before the stored history; returns candles added"""
+        pages = [arrays for arrays in reversed(pages) if arrays]
+        if not pages:
+            return 0
+        arrays = {field: np.concatenate([page[field] for page in pages]) for field in pages[0]}
+        return self.store.merge(symbol, self.interval, arrays)
+
+    def run(self, symbols, start, end=None):
+        """Backfill candles opening in [start, end) (ms) for every symbol; returns candles written per symbol"""
+        end = int(time.time() * 1000) if end is None else end
+        checkpoint = self.load_checkpoint()
+        cursors = {}
+        complete_from = dict(checkpoint['complete_from'])
+        # Pages per (symbol, direction), in the order they are written
+        plans = {}
+        # Symbols with nothing stored, whose first appended page starts their history
+        empty = set()
+        for symbol in symbols:
+            resume = max(start, checkpoint['next'].get(symbol, start))
+            first_timestamp = self.store.first_timestamp(symbol, self.interval)
+            if first_timestamp is None:
+                empty.add(symbol)
+                plans[(symbol, 'older')] = []
+                if complete_from.get(symbol, end) > start:
+                    # Pages the checkpoint skips were only found empty from a later start
+                    resume = start
+            else:
+                older_end = min(first_timestamp, end)
+                skip = complete_from.get(symbol, older_end) <= start
+                plans[(symbol, 'older')] = [] if skip else self.pages(start, older_end)[::-1]
+                resume = max(resume, self.store.last_timestamp(symbol, self.interval) + self.interval_ms)
+            cursors[symbol] = resume
+            plans[(symbol, 'newer')] = self.pages(resume, end)
+
+        total = sum(len(pages) for pages in plans.values())
+        written = dict.fromkeys(symbols, 0)
+        if not total:
+            self.logger.info("Nothing to backfill")
+            return written
+        self.logger.info(f"Backfilling {total} pages of {self.interval} candles for {len(symbols)} symbols "
+                         f"on {self.workers} workers")
+
+        # Completed pages waiting for an earlier page of the same plan
+        pending = {lane: {} for lane in plans}
+        next_page = dict.fromkeys(plans, 0)
+        # Older pages taken in order but not merged yet, newest first
+        unmerged = {lane: [] for lane in plans}
+        # First failed page per plan; later pages cannot be written past the hole
+        failed = {}
+        # The still-forming candle is never stored, so the checkpoint must not pass it
+        forming = int(time.time() * 1000) // self.interval_ms * self.interval_ms
+        done = 0
+        started = last_report = last_saved = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Symbol by symbol, so pages mostly finish in the order they are written
+            futures = {executor.submit(self.fetch, lane[0], page_start, page_end): (lane, index)
+                       for lane, pages in plans.items() for index, (page_start, page_end) in enumerate(pages)}
+            try:
+                for future in as_completed(futures):
+                    lane, index = futures[future]
+                    symbol, direction = lane
+                    done += 1
+                    arrays = future.result()
+                    if arrays is None:
+                        failed[lane] = min(index, failed.get(lane, index))
+                        continue
+
+                    pending[lane][index] = arrays
+                    while next_page[lane] in pending[lane] and next_page[lane] < failed.get(lane, total):
+                        arrays = pending[lane].pop(next_page[lane])
+                        next_page[lane] += 1
+                        if direction == 'newer':
+                            if arrays:
+                                written[symbol] += self.store.append(symbol, self.interval, arrays)
+                            cursors[symbol] = min(plans[lane][next_page[lane] - 1][1] + 1, forming)
+                            if symbol in empty:
+                                # Nothing was stored before this run, so history is complete from its start
+                                complete_from[symbol] = min(start, complete_from.get(symbol, start))
+                            continue
+
+                        unmerged[lane].append(arrays)
+                        if next_page[lane] == len(plans[lane]) or len(unmerged[lane]) >= self.merge_pages:
+                            written[symbol] += self.merge_older(symbol, unmerged[lane])
+                            unmerged[lane] = []
+                        if next_page[lane] == len(plans[lane]):
+                            complete_from[symbol] = start
+
+                    now = time.monotonic()
+                    if now - last_saved >= self.checkpoint_every:
+                        self.save_checkpoint(cursors, complete_from)
+                        last_saved = now
+                    if now - last_report >= 5:
+                        self.logger.info(f"{done}/{total} pages, {done / (now - started):.1f} pages/s")
+                        last_report = now
+            finally:
+                # Stop queued downloads promptly if interrupted
+                for future in futures:
+                    future.cancel()
+                # Older pages written so far are contiguous with the stored history, so keep them
+                for (symbol, _), pages in unmerged.items():
+                    written[symbol] += self.merge_older(symbol, pages)
+                self.save_checkpoint(cursors, complete_from)
+
+        elapsed = time.monotonic() - started
+        self.logger.info(f"Wrote {sum(written.values())} candles in {elapsed:.1f}s "
+                         f"({done / elapsed:.1f} pages/s)")
+        if failed:
+            self.logger.warning(f"Incomplete: {', '.join(sorted({symbol for symbol, _ in failed}))}; "
+                                f"rerun to resume")
+        return written
+
+def parse_time(value):
+    """Milliseconds since the epoch from an ISO date/time (UTC unless given) or a millisecond timestamp"""
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description="Download kline history into the local candle store")
+    parser.add_argument("--config", default="config.json", help="Bot config with API settings")
+    parser.add_argument("--symbols", nargs="+", help="Symbols to fetch (default: the config's trading_pairs)")
+    parser.add_argument("--interval", default="5", help="Kline interval, e.g. 1, 5, 60, D")
+    parser.add_argument("--start", required=True, help="Start date, e.g. 2024-01-01, or a ms timestamp")
+    parser.add_argument("--end", help="End date (default: now)")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent page downloads")
+    parser.add_argument("--checkpoint", default="data/backfill_checkpoint.json", help="Resume file")
+    args = parser.parse_args()
+
+    logger = setup_logger("HistoryBackfill")
+    try:
+        with open(args.config, 'r') as file:
+            config = json.load(file)
+    except FileNotFoundError:
+        # Market data is public, so the defaults work without a config
+        config = {}
+
+    # One pooled connection per worker
+    config['http_pool_size'] = max(config.get('http_pool_size') or 0, args.workers)
+    history_path = config.get("ohlcv_store_path") or "data/ohlcv"
+    backfill = HistoryBackfill(get_client(config), get_ohlcv_store(history_path), interval=args.interval,
+                               workers=args.workers, checkpoint_path=args.checkpoint)
+    symbols = args.symbols or config.get('trading_pairs', ['BTCUSDT'])
+    written = backfill.run(symbols, parse_time(args.start), parse_time(args.end) if args.end else None)
+    for symbol, count in written.items():
+        logger.info(f"{symbol}: {count} candles, {backfill.store.count(symbol, args.interval)} stored")
+
+if __name__ == "__main__":
+    main()
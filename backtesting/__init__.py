@@ -0,0 +1,7 @@
+from .engine import Backtester, rolling_mean, crossovers, EXIT_REASONS
+from .optimizer import GridOptimizer
+from .walk_forward import WalkForward
+from .replay import ReplayEngine, ReplayClient, SimulatedClock
+
+__all__ = ['Backtester', 'rolling_mean', 'crossovers', 'EXIT_REASONS', 'GridOptimizer', 'WalkForward',
+           'ReplayEngine', 'ReplayClient', 'SimulatedClock']
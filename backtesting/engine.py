@@ -0,0 +1,203 @@
+import numpy as np
+from utils.instruments import size_order
+from utils.logger import setup_logger
+
+# Why a trade was closed
+EXIT_SIGNAL = 0
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_END_OF_DATA = 3
+EXIT_REASONS = ('signal', 'stop_loss', 'take_profit', 'end_of_data')
+
+# Bybit's default taker fee for linear perpetuals
+DEFAULT_FEE_RATE = 0.00055
+
+def rolling_mean(values, period):
+    """Trailing mean of every window of ``period`` values, NaN until the first full window"""
+    values = np.asarray(values, dtype=np.float64)
+    means = np.full(len(values), np.nan)
+    if period <= 0 or len(values) < period:
+        return means
+
+    sums = np.empty(len(values) + 1)
+    sums[0] = 0.0
+    np.cumsum(values, out=sums[1:])
+    means[period - 1:] = (sums[period:] - sums[:-period]) / period
+    return means
+
+def crossovers(ma_short, ma_long):
+    """Indices of candles where the short MA crosses above (buys) and below (sells) the long MA"""
+    # NaN comparisons are False, so candles before the first full long window count as below
+    above = ma_short > ma_long
+    prev_above = np.zeros_like(above)
+    prev_above[1:] = above[:-1]
+    return np.flatnonzero(above & ~prev_above), np.flatnonzero(prev_above & ~above)
+
+def round_to_tick(prices, tick_size):
+    """Round prices to the instrument's tick size"""
+    if not tick_size:
+        return prices
+    return np.round(prices / tick_size) * tick_size
+
+class Backtester:
+    """Vectorized historical simulation of MovingAverageStrategy
+
+    A long position is opened at the close of a candle where the short MA
+    crosses above the long MA, with stop loss and take profit placed around
+    that price, and closed at the close of the next downward cross unless
+    SL/TP trigger first. SL/TP are checked against each candle's low and
+    high, with the stop loss winning when a candle touches both. Quantities
+    use the bot's ``size_order`` rules on the running balance, and fees are
+    charged on both sides.
+
+    Crosses are taken on closed candles only. The live bot and
+    ``ReplayEngine`` evaluate with the still-forming last candle, so they
+    act on crosses that can vanish before the candle closes and enter at
+    mid-candle prices; they typically trade more often than this backtest.
+    Results here, and from the optimizer and walk-forward runs built on it,
+    rank parameters on closed-candle signals and are not live-equivalent.
+    """
+
+    def __init__(self, short_period=20, long_period=50, stop_loss_percentage=2.0, take_profit_percentage=4.0,
+                 fee_rate=DEFAULT_FEE_RATE, initial_balance=10000.0, position_fraction=0.1):
+        self.short_period = short_period
+        self.long_period = long_period
+        self.stop_loss_percentage = stop_loss_percentage
+        self.take_profit_percentage = take_profit_percentage
+        self.fee_rate = fee_rate
+        self.initial_balance = initial_balance
+        self.position_fraction = position_fraction
+        self.logger = setup_logger("Backtester")
+
+    @classmethod
+    def from_config(cls, config):
+        """Backtester using the same settings as the live bot"""
+        return cls(
+            short_period=config.get("ma_short_period", 20),
+            long_period=config.get("ma_long_period", 50),
+            stop_loss_percentage=config.get("stop_loss_percentage", 2.0),
+            take_profit_percentage=config.get("take_profit_percentage", 4.0),
+            fee_rate=config.get("backtest_fee_rate", DEFAULT_FEE_RATE),
+            initial_balance=config.get("backtest_initial_balance", 10000.0)
+        )
+
+    def run(self, arrays, symbol="BTCUSDT", instrument=None, ma_short=None, ma_long=None):
+        """Backtest oldest-first OHLC arrays; precomputed MAs can be passed in to skip recomputing them"""
+        try:
+            close = np.asarray(arrays['close'], dtype=np.float64)
+            if ma_short is None:
+                ma_short = rolling_mean(close, self.short_period)
+            if ma_long is None:
+                ma_long = rolling_mean(close, self.long_period)
+
+            buys, sells = crossovers(ma_short, ma_long)
+            trades = self.find_exits(arrays, buys, sells, instrument)
+            return self.settle(trades, symbol, instrument)
+
+        except Exception as e:
+            self.logger.error(f"Error running backtest for {symbol}: {e}")
+            return None
+
+    def find_exits(self, arrays, buys, sells, instrument=None):
+        """Exit candle, price and reason for every entry, without looping over candles"""
+        open_, high, low, close = (np.asarray(arrays[field], dtype=np.float64)
+                                   for field in ('open', 'high', 'low', 'close'))
+        count = len(close)
+
+        # An entry on the final candle has nothing left to trade against
+        buys = buys[buys < count - 1]
+        entry_price = close[buys]
+        tick_size = instrument.get('tick_size') if instrument else None
+        stop_loss = round_to_tick(entry_price * (1 - self.stop_loss_percentage / 100), tick_size)
+        take_profit = round_to_tick(entry_price * (1 + self.take_profit_percentage / 100), tick_size)
+
+        # Crosses alternate, so each position lives at most until the next downward cross
+        next_sell = np.searchsorted(sells, buys, side='right')
+        has_sell = next_sell < len(sells)
+        last_candle = np.full(len(buys), count - 1)
+        if len(sells):
+            # A trend with no downward cross leaves sells empty, so index it only where a sell exists
+            last_candle[has_sell] = sells[next_sell[has_sell]]
+
+        # Assign every candle to the most recent entry and keep those inside a position
+        candles = np.arange(count)
+        trade = np.searchsorted(buys, candles, side='right') - 1
+        held = trade >= 0
+        held[held] &= (candles[held] > buys[trade[held]]) & (candles[held] <= last_candle[trade[held]])
+        candles, trade = candles[held], trade[held]
+
+        hit_stop = low[candles] <= stop_loss[trade]
+        hit_target = high[candles] >= take_profit[trade]
+        hit_signal = has_sell[trade] & (candles == last_candle[trade])
+        hit = hit_stop | hit_target | hit_signal
+        candles, trade = candles[hit], trade[hit]
+        hit_stop, hit_target = hit_stop[hit], hit_target[hit]
+
+        # First triggering candle per trade; trades are already in candle order
+        first = np.flatnonzero(np.r_[True, trade[1:] != trade[:-1]]) if len(trade) else np.array([], dtype=int)
+        trade, candle = trade[first], candles[first]
+        hit_stop, hit_target = hit_stop[first], hit_target[first]
+
+        exit_index = np.full(len(buys), count - 1)
+        reason = np.full(len(buys), EXIT_END_OF_DATA)
+        exit_index[trade] = candle
+        reason[trade] = np.where(hit_stop, EXIT_STOP_LOSS, np.where(hit_target, EXIT_TAKE_PROFIT, EXIT_SIGNAL))
+
+        # A candle that opens beyond a trigger fills at the open, not the trigger price
+        exit_price = close[exit_index]
+        stops = reason == EXIT_STOP_LOSS
+        targets = reason == EXIT_TAKE_PROFIT
+        exit_price[stops] = np.minimum(open_[exit_index[stops]], stop_loss[stops])
+        exit_price[targets] = np.maximum(open_[exit_index[targets]], take_profit[targets])
+
+        return {
+            'entry_index': buys,
+            'exit_index': exit_index,
+            'entry_price': entry_price,
+            'exit_price': exit_price,
+            'reason': reason
+        }
+
+    def settle(self, trades, symbol, instrument=None):
+        """Size trades on the running balance and compute PnL, fees and summary stats"""
+        count = len(trades['entry_index'])
+        quantity = np.zeros(count)
+        pnl = np.zeros(count)
+        fees = np.zeros(count)
+        equity = np.empty(count + 1)
+        equity[0] = balance = self.initial_balance
+
+        # Sizing depends on the balance left by earlier trades, so this part is sequential per trade
+        for i in range(count):
+            if balance <= 0:
+                equity[i + 1:] = balance
+                break
+            entry_price, exit_price = trades['entry_price'][i], trades['exit_price'][i]
+            quantity[i] = size_order(balance, entry_price, symbol, instrument, self.position_fraction)
+            fees[i] = quantity[i] * (entry_price + exit_price) * self.fee_rate
+            pnl[i] = quantity[i] * (exit_price - entry_price) - fees[i]
+            balance += pnl[i]
+            equity[i + 1] = balance
+
+        trades.update(quantity=quantity, pnl=pnl, fees=fees)
+        return {'trades': trades, 'equity': equity, 'stats': self.summarize(pnl, fees, equity, trades['reason'])}
+
+    def summarize(self, pnl, fees, equity, reason):
+        """Headline statistics for a backtest"""
+        wins = pnl > 0
+        gross_profit = pnl[wins].sum()
+        gross_loss = -pnl[pnl < 0].sum()
+        peaks = np.maximum.accumulate(equity)
+        drawdown = (peaks - equity) / peaks
+
+        return {
+            'trades': len(pnl),
+            'wins': int(wins.sum()),
+            'win_rate': float(wins.mean() * 100) if len(pnl) else 0.0,
+            'total_pnl': float(pnl.sum()),
+            'return_pct': float((equity[-1] / equity[0] - 1) * 100),
+            'fees': float(fees.sum()),
+            'profit_factor': float(gross_profit / gross_loss) if gross_loss else float('inf') if gross_profit else 0.0,
+            'max_drawdown_pct': float(drawdown.max() * 100),
+            'exits': {name: int((reason == code).sum()) for code, name in enumerate(EXIT_REASONS)}
+        }
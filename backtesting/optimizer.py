@@ -0,0 +1,139 @@
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from utils.logger import setup_logger
+from .engine import Backtester, rolling_mean, crossovers
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+
+# Stats where a smaller value ranks higher
+MINIMIZED_METRICS = {'max_drawdown_pct', 'fees'}
+
+# Set in each worker process by attach_prices
+_prices = None
+_prices_memory = None
+_backtest_settings = None
+_means = {}
+
+def attach_shared_memory(name):
+    """Attach to the parent's segment without registering it with the resource tracker
+
+    Attaching registers the segment as if this process owned it (bpo-38119),
+    so its tracker can warn about a leak or unlink it while the parent still
+    uses it. On POSIX the workers share the parent's tracker, where an
+    ``unregister`` after attaching would also drop the parent's own
+    registration, so the registration is skipped instead.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+def attach_prices(name, shape, settings):
+    """Worker initializer: map the shared price block instead of receiving a pickled copy"""
+    global _prices, _prices_memory, _backtest_settings
+    _prices_memory = attach_shared_memory(name)
+    block = np.ndarray(shape, dtype=np.float64, buffer=_prices_memory.buf)
+    _prices = dict(zip(PRICE_FIELDS, block))
+    _backtest_settings = settings
+
+def cached_mean(period):
+    """Rolling mean of the shared closes, computed once per worker and period"""
+    means = _means.get(period)
+    if means is None:
+        means = _means[period] = rolling_mean(_prices['close'], period)
+    return means
+
+def run_pair(short_period, long_period, exits, symbol, instrument):
+    """Backtest (SL%, TP%) pairs for one MA pair, computing the crosses once"""
+    buys, sells = crossovers(cached_mean(short_period), cached_mean(long_period))
+
+    backtester = Backtester(short_period, long_period, **_backtest_settings)
+    results = []
+    for stop_loss, take_profit in exits:
+        backtester.stop_loss_percentage = stop_loss
+        backtester.take_profit_percentage = take_profit
+        try:
+            trades = backtester.find_exits(_prices, buys, sells, instrument)
+            stats = backtester.settle(trades, symbol, instrument)['stats']
+        except Exception as e:
+            # One bad grid point is left out rather than ending the sweep
+            backtester.logger.error(f"Error backtesting MA {short_period}/{long_period} "
+                                    f"SL {stop_loss}% TP {take_profit}%: {e}")
+            continue
+        stats.pop('exits')
+        results.append(dict(short_period=short_period, long_period=long_period,
+                            stop_loss_percentage=stop_loss, take_profit_percentage=take_profit, **stats))
+    return results
+
+class GridOptimizer:
+    """Parallel grid search over MA periods and SL/TP percentages
+
+    Prices are copied once into a shared memory block that every worker
+    maps read-only. Tasks are batches of SL/TP combinations for one
+    (short, long) pair, so crossovers are found once per task and each
+    worker computes the rolling mean for a period only once.
+    """
+
+    def __init__(self, fee_rate=None, initial_balance=10000.0, workers=None):
+        self.settings = {'initial_balance': initial_balance}
+        if fee_rate is not None:
+            self.settings['fee_rate'] = fee_rate
+        self.workers = workers or os.cpu_count()
+        self.logger = setup_logger("GridOptimizer")
+
+    @classmethod
+    def from_config(cls, config):
+        """Optimizer using the backtest settings from the bot's config"""
+        return cls(
+            fee_rate=config.get("backtest_fee_rate"),
+            initial_balance=config.get("backtest_initial_balance", 10000.0),
+            workers=config.get("optimizer_workers")
+        )
+
+    def optimize(self, arrays, short_periods, long_periods, stop_losses, take_profits, symbol="BTCUSDT",
+                 instrument=None, metric="return_pct", min_trades=1, top=None):
+        """Backtest every grid point and return results ranked by ``metric``, best first"""
+        pairs = [(short, long) for short, long in itertools.product(short_periods, long_periods) if short < long]
+        exits = list(itertools.product(stop_losses, take_profits))
+        if not pairs or not exits:
+            return []
+
+        block = np.stack([np.asarray(arrays[field], dtype=np.float64) for field in PRICE_FIELDS])
+        memory = shared_memory.SharedMemory(create=True, size=block.nbytes)
+        try:
+            np.ndarray(block.shape, dtype=np.float64, buffer=memory.buf)[:] = block
+            self.logger.info(f"Sweeping {len(pairs) * len(exits)} combinations over {block.shape[1]} candles "
+                             f"on {self.workers} workers")
+
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=attach_prices,
+                                     initargs=(memory.name, block.shape, self.settings)) as executor:
+                # Several tasks per worker keep every core busy even with few MA pairs
+                chunk = max(1, -(-len(pairs) * len(exits) // (self.workers * 4)))
+                futures = [executor.submit(run_pair, short, long, exits[start:start + chunk], symbol, instrument)
+                           for short, long in pairs for start in range(0, len(exits), chunk)]
+                results = []
+                for future in futures:
+                    try:
+                        results.extend(future.result())
+                    except Exception as e:
+                        self.logger.error(f"Error in optimizer task: {e}")
+        finally:
+            memory.close()
+            memory.unlink()
+
+        return self.rank(results, metric, min_trades, top)
+
+    @staticmethod
+    def rank(results, metric="return_pct", min_trades=1, top=None):
+        """Sort results by a stat, dropping runs with too few trades"""
+        results = [result for result in results if result['trades'] >= min_trades]
+        results.sort(key=lambda result: result[metric], reverse=metric not in MINIMIZED_METRICS)
+        return results[:top] if top else results
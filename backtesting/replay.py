@@ -0,0 +1,328 @@
+import itertools
+import logging
+import time
+import numpy as np
+from bot import BybitTradingBot
+from utils.candle_store import CandleStore
+from utils.kline_cache import KlineCache
+from utils.klines import interval_to_ms
+from utils.logger import setup_logger
+from .engine import DEFAULT_FEE_RATE
+
+class SimulatedClock:
+    """Clock that only moves when told to, so replayed sleeps cost nothing"""
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def set(self, now):
+        self.now = max(self.now, float(now))
+
+class ReplayClient:
+    """Stand-in for the pybit client that serves recorded market data at simulated time
+
+    Klines are only visible up to the clock: the candle still forming is
+    reported with its open, or the recorded ticker price when there is one,
+    as its close. Market orders fill at the next unused recorded fill for
+    the symbol and side, or otherwise at the current price. Stop loss and
+    take profit are triggered exchange-side against recorded highs and lows
+    as the clock advances.
+    """
+
+    def __init__(self, clock, klines, interval="5", tickers=None, fills=None, balance=10000.0,
+                 instruments=None, fee_rate=DEFAULT_FEE_RATE):
+        self.clock = clock
+        self.klines = klines
+        self.interval_ms = interval_to_ms(interval)
+        self.tickers = tickers or {}
+        self.fills = {}
+        for fill in fills or []:
+            self.fills.setdefault((fill['symbol'], fill['side']), []).append(fill)
+        self.instruments = instruments or {}
+        self.fee_rate = fee_rate
+        self.balance = balance
+        self.positions = {}
+        self.orders = []
+        self.trades = []
+        self.order_links = set()
+        self.order_ids = itertools.count(1)
+
+    def now_ms(self):
+        return int(self.clock.time() * 1000)
+
+    def price(self, symbol):
+        """Last traded price at the current simulated time"""
+        now = self.now_ms()
+        ticker = self.tickers.get(symbol)
+        if ticker is not None:
+            index = np.searchsorted(ticker['timestamp'], now, side='right') - 1
+            if index >= 0:
+                return float(ticker['price'][index])
+
+        candles = self.klines[symbol]
+        index = np.searchsorted(candles['timestamp'], now, side='right') - 1
+        if candles['timestamp'][index] + self.interval_ms <= now:
+            return float(candles['close'][index])
+        return float(candles['open'][index])
+
+    @staticmethod
+    def ok(result):
+        return {'retCode': 0, 'retMsg': 'OK', 'result': result}
+
+    @staticmethod
+    def error(code, message):
+        return {'retCode': code, 'retMsg': message, 'result': {}}
+
+    def get_kline(self, category="linear", symbol=None, interval="5", limit=200, start=None, end=None, **kwargs):
+        candles = self.klines.get(symbol)
+        if candles is None:
+            return self.error(10001, f"Unknown symbol {symbol}")
+
+        now = self.now_ms()
+        end = now if end is None else min(end, now)
+        timestamps = candles['timestamp']
+        first = 0 if start is None else np.searchsorted(timestamps, start)
+        last = np.searchsorted(timestamps, end, side='right')
+        first = max(first, last - limit)
+
+        rows = []
+        for i in range(last - 1, first - 1, -1):
+            timestamp = int(timestamps[i])
+            if timestamp + self.interval_ms > now:
+                # Still forming: only what has traded so far is known
+                open_price, price = candles['open'][i], self.price(symbol)
+                row = (timestamp, open_price, max(open_price, price), min(open_price, price), price, 0.0)
+            else:
+                row = (timestamp, candles['open'][i], candles['high'][i], candles['low'][i], candles['close'][i],
+                       candles['volume'][i] if 'volume' in candles else 0.0)
+            rows.append([str(value) for value in row] + ["0"])
+        return self.ok({'symbol': symbol, 'category': category, 'list': rows})
+
+    def get_tickers(self, category="linear", symbol=None, **kwargs):
+        return self.ok({'category': category, 'list': [{'symbol': symbol, 'lastPrice': str(self.price(symbol))}]})
+
+    def get_instruments_info(self, category="linear", **kwargs):
+        rows = [{'symbol': symbol,
+                 'lotSizeFilter': {'qtyStep': str(info['qty_step']), 'minOrderQty': str(info['min_qty']),
+                                   'maxOrderQty': str(info.get('max_qty', 0)),
+                                   'maxMktOrderQty': str(info.get('max_market_qty', 0))},
+                 'priceFilter': {'tickSize': str(info['tick_size'])}}
+                for symbol, info in self.instruments.items()]
+        return self.ok({'category': category, 'list': rows, 'nextPageCursor': ''})
+
+    def unrealized_pnl(self, position):
+        return position['size'] * (self.price(position['symbol']) - position['avg_price'])
+
+    def get_wallet_balance(self, accountType="UNIFIED", coin=None, **kwargs):
+        self.advance()
+        unrealized = sum(self.unrealized_pnl(position) for position in self.positions.values())
+        margin = sum(position['size'] * position['avg_price'] for position in self.positions.values())
+        coin_data = {
+            'coin': 'USDT',
+            'walletBalance': str(self.balance),
+            'availableToWithdraw': str(self.balance - margin),
+            'equity': str(self.balance + unrealized),
+            'unrealisedPnl': str(unrealized)
+        }
+        return self.ok({'list': [{'accountType': accountType, 'coin': [coin_data]}]})
+
+    def position_row(self, symbol):
+        position = self.positions.get(symbol)
+        if position is None:
+            return {'symbol': symbol, 'side': '', 'size': '0', 'avgPrice': '0', 'positionValue': '0',
+                    'unrealisedPnl': '0'}
+        return {'symbol': symbol, 'side': 'Buy', 'size': str(position['size']),
+                'avgPrice': str(position['avg_price']),
+                'positionValue': str(position['size'] * position['avg_price']),
+                'unrealisedPnl': str(self.unrealized_pnl(position)),
+                'stopLoss': str(position.get('stop_loss') or ''), 'takeProfit': str(position.get('take_profit') or '')}
+
+    def get_positions(self, category="linear", symbol=None, settleCoin=None, **kwargs):
+        self.advance()
+        symbols = [symbol] if symbol else list(self.positions)
+        return self.ok({'category': category, 'list': [self.position_row(s) for s in symbols],
+                        'nextPageCursor': ''})
+
+    def place_order(self, category="linear", symbol=None, side=None, orderType="Market", qty=None,
+                    orderLinkId=None, reduceOnly=False, stopLoss=None, takeProfit=None, **kwargs):
+        self.advance()
+        if orderLinkId in self.order_links:
+            return self.error(110072, "OrderLinkedID is duplicate")
+        quantity = float(qty)
+        position = self.positions.get(symbol)
+        if side == "Sell" and position is None:
+            return self.error(110017, "Reduce-only order has no position to reduce")
+
+        price = self.fill_price(symbol, side)
+        if orderLinkId:
+            self.order_links.add(orderLinkId)
+        order_id = str(next(self.order_ids))
+        self.orders.append({'time': self.clock.time(), 'symbol': symbol, 'side': side, 'qty': quantity,
+                            'price': price, 'orderId': order_id, 'orderLinkId': orderLinkId})
+        self.balance -= quantity * price * self.fee_rate
+
+        if side == "Buy":
+            if position is None:
+                # Only candles that close after the fill can trigger its SL/TP
+                position = self.positions[symbol] = {'symbol': symbol, 'size': 0.0, 'avg_price': 0.0,
+                                                     'checked': self.closed_candles(symbol)}
+            size = position['size'] + quantity
+            position['avg_price'] = (position['avg_price'] * position['size'] + price * quantity) / size
+            position['size'] = size
+            if stopLoss:
+                position['stop_loss'] = float(stopLoss)
+            if takeProfit:
+                position['take_profit'] = float(takeProfit)
+        else:
+            self.close(symbol, price, "signal", min(quantity, position['size']), fee_paid=True)
+
+        return self.ok({'orderId': order_id, 'orderLinkId': orderLinkId or ''})
+
+    def set_trading_stop(self, category="linear", symbol=None, stopLoss=None, takeProfit=None, **kwargs):
+        self.advance()
+        position = self.positions.get(symbol)
+        if position is None:
+            return self.error(10001, "No position to protect")
+        if stopLoss:
+            position['stop_loss'] = float(stopLoss)
+        if takeProfit:
+            position['take_profit'] = float(takeProfit)
+        return self.ok({})
+
+    def fill_price(self, symbol, side):
+        """Next recorded fill at or before now for this symbol and side, else the current price"""
+        recorded = self.fills.get((symbol, side))
+        if recorded and recorded[0]['time'] <= self.clock.time():
+            return float(recorded.pop(0)['price'])
+        return self.price(symbol)
+
+    def close(self, symbol, price, reason, quantity=None, fee_paid=False):
+        """Realize PnL on (part of) a position"""
+        position = self.positions[symbol]
+        quantity = position['size'] if quantity is None else quantity
+        pnl = quantity * (price - position['avg_price'])
+        fee = 0.0 if fee_paid else quantity * price * self.fee_rate
+        self.balance += pnl - fee
+        self.trades.append({'time': self.clock.time(), 'symbol': symbol, 'entry_price': position['avg_price'],
+                            'exit_price': price, 'qty': quantity, 'pnl': pnl - fee, 'reason': reason})
+        position['size'] -= quantity
+        if position['size'] <= 1e-12:
+            del self.positions[symbol]
+
+    def closed_candles(self, symbol):
+        """Number of candles for a symbol that have fully closed by now"""
+        return int(np.searchsorted(self.klines[symbol]['timestamp'], self.now_ms() - self.interval_ms, side='right'))
+
+    def advance(self):
+        """Trigger stop losses and take profits on candles that closed since the last check"""
+        for symbol, position in list(self.positions.items()):
+            candles = self.klines[symbol]
+            last = self.closed_candles(symbol)
+            for i in range(position['checked'], last):
+                stop_loss, take_profit = position.get('stop_loss'), position.get('take_profit')
+                # The stop wins when one candle touches both, as in the backtester
+                if stop_loss and candles['low'][i] <= stop_loss:
+                    self.close(symbol, min(candles['open'][i], stop_loss), "stop_loss")
+                    break
+                if take_profit and candles['high'][i] >= take_profit:
+                    self.close(symbol, max(candles['open'][i], take_profit), "take_profit")
+                    break
+            position['checked'] = last
+
+class ReplayEngine:
+    """Drives ``BybitTradingBot.execute_strategy`` through recorded data in simulated time
+
+    The bot runs its real decision path against a ``ReplayClient``; every
+    wait is served by a simulated clock, so a replay runs as fast as the bot
+    can decide. Each evaluation is timed with the wall clock to measure
+    per-cycle decision latency.
+    """
+
+    def __init__(self, config, klines, interval="5", tickers=None, fills=None, balance=10000.0,
+                 instruments=None, evaluation_delay=1.0, quiet=True):
+        self.config = dict(config, instruments_cache_path=None, ohlcv_store_path=None, warm_start=False,
+                           use_websocket=False, max_concurrent_symbols=1)
+        self.klines = {symbol: {field: np.asarray(values) for field, values in arrays.items()}
+                       for symbol, arrays in klines.items()}
+        self.interval = interval
+        self.interval_ms = interval_to_ms(interval)
+        self.evaluation_delay = evaluation_delay
+        self.quiet = quiet
+        self.logger = setup_logger("ReplayEngine")
+
+        first = min(int(arrays['timestamp'][0]) for arrays in self.klines.values())
+        self.clock = SimulatedClock(first / 1000)
+        self.client = ReplayClient(self.clock, self.klines, interval, tickers, fills, balance, instruments,
+                                   fee_rate=self.config.get("backtest_fee_rate", DEFAULT_FEE_RATE))
+
+        self.bot = BybitTradingBot(config=self.config, client=self.client)
+        self.bot.candles = CandleStore(self.config.get("candle_buffer_size", 1000))
+        self.bot.sleep = self.clock.sleep
+        # Without kline_cache, klines is the ReplayClient itself, whose clock is the replay clock object
+        if isinstance(self.bot.klines, KlineCache):
+            self.bot.klines.clock = self.clock.time
+
+    def run(self, start=None, end=None, warmup=None):
+        """Replay every candle close between ``start`` and ``end`` (ms); returns a report"""
+        symbols = self.config.get('trading_pairs') or list(self.klines)
+        timestamps = np.unique(np.concatenate([self.klines[symbol]['timestamp'] for symbol in symbols]))
+        warmup = self.bot.strategy.long_period if warmup is None else warmup
+        boundaries = timestamps[warmup:]
+        if start is not None:
+            boundaries = boundaries[boundaries >= start]
+        if end is not None:
+            boundaries = boundaries[boundaries <= end]
+
+        # The bot's setup_logger call resets its level, so quieten it only now, and only for this run
+        bot_logger = logging.getLogger("BybitTradingBot")
+        previous_level = bot_logger.level
+        if self.quiet:
+            # Per-symbol INFO logging would dominate the replay's run time
+            bot_logger.setLevel(logging.WARNING)
+
+        latencies = []
+        started = time.perf_counter()
+        try:
+            for boundary in boundaries:
+                # Evaluate just after the candle opening at ``boundary``, like the live scheduler
+                self.clock.set(boundary / 1000 + self.evaluation_delay)
+                self.bot.account.invalidate()
+                for symbol in symbols:
+                    decision_started = time.perf_counter()
+                    self.bot.execute_strategy(symbol)
+                    latencies.append(time.perf_counter() - decision_started)
+        finally:
+            bot_logger.setLevel(previous_level)
+        elapsed = time.perf_counter() - started
+
+        self.client.get_wallet_balance()
+        latencies = np.array(latencies) * 1000
+        simulated = float(boundaries[-1] - boundaries[0]) / 1000 if len(boundaries) > 1 else 0.0
+        report = {
+            'cycles': len(boundaries),
+            'decisions': len(latencies),
+            'orders': self.client.orders,
+            'trades': self.client.trades,
+            'final_balance': self.client.balance,
+            'open_positions': {symbol: dict(position) for symbol, position in self.client.positions.items()},
+            'latency_ms': {
+                'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'max': float(latencies.max()) if len(latencies) else None
+            },
+            'wall_seconds': elapsed,
+            'simulated_seconds': simulated,
+            'speedup': simulated / elapsed if elapsed else None
+        }
+        self.logger.info(f"Replayed {report['cycles']} cycles, {len(report['orders'])} orders, "
+                         f"decision latency p50 {report['latency_ms']['p50']}ms, speedup {report['speedup']}")
+        return report
@@ -0,0 +1,153 @@
+import itertools
+import numpy as np
+from utils.logger import setup_logger
+from .engine import Backtester, rolling_mean, crossovers
+from .optimizer import MINIMIZED_METRICS
+
+class WalkForward:
+    """Rolling train/test validation of MovingAverageStrategy parameters
+
+    Each fold picks the best grid point on its training window and trades it
+    on the following test window. Rolling means are computed once per period
+    over the whole history, and crossovers once per MA pair; every fold and
+    grid point reads slices of those cached arrays. Trailing means never see
+    future candles, so slicing them leaks nothing into a fold, and folds
+    start with fully warmed-up MAs.
+    """
+
+    def __init__(self, train_size, test_size, step=None, fee_rate=None, initial_balance=10000.0,
+                 metric="return_pct", min_trades=1):
+        self.train_size = train_size
+        self.test_size = test_size
+        self.step = step or test_size
+        self.metric = metric
+        self.min_trades = min_trades
+        self.initial_balance = initial_balance
+        self.backtester = Backtester(initial_balance=initial_balance)
+        if fee_rate is not None:
+            self.backtester.fee_rate = fee_rate
+        self.means = {}
+        self.crosses = {}
+        self.logger = setup_logger("WalkForward")
+
+    @classmethod
+    def from_config(cls, config):
+        """Walk-forward runner using window sizes (in candles) from the bot's config"""
+        return cls(
+            train_size=config.get("walk_forward_train", 8640),
+            test_size=config.get("walk_forward_test", 2016),
+            step=config.get("walk_forward_step"),
+            fee_rate=config.get("backtest_fee_rate"),
+            initial_balance=config.get("backtest_initial_balance", 10000.0),
+            metric=config.get("walk_forward_metric", "return_pct"),
+            min_trades=config.get("walk_forward_min_trades", 1)
+        )
+
+    def folds(self, count):
+        """(train start, test start, test end) for every fold that fits in ``count`` candles"""
+        start = 0
+        while start + self.train_size < count:
+            test_start = start + self.train_size
+            yield start, test_start, min(test_start + self.test_size, count)
+            start += self.step
+
+    def crossings(self, close, short_period, long_period):
+        """Buy and sell crossover indices over the whole history, cached per MA pair for the current run"""
+        key = (short_period, long_period)
+        if key not in self.crosses:
+            for period in key:
+                if period not in self.means:
+                    self.means[period] = rolling_mean(close, period)
+            self.crosses[key] = crossovers(self.means[short_period], self.means[long_period])
+        return self.crosses[key]
+
+    def evaluate(self, arrays, start, end, params, symbol, instrument=None, balance=None):
+        """Backtest one grid point on candles [start, end) using the cached crossovers"""
+        short_period, long_period, stop_loss, take_profit = params
+        buys, sells = self.crossings(arrays['close'], short_period, long_period)
+        buys = buys[np.searchsorted(buys, start):np.searchsorted(buys, end)] - start
+        sells = sells[np.searchsorted(sells, start):np.searchsorted(sells, end)] - start
+
+        backtester = self.backtester
+        backtester.short_period, backtester.long_period = short_period, long_period
+        backtester.stop_loss_percentage, backtester.take_profit_percentage = stop_loss, take_profit
+        backtester.initial_balance = self.initial_balance if balance is None else balance
+
+        window = {field: arrays[field][start:end] for field in ('open', 'high', 'low', 'close')}
+        return backtester.settle(backtester.find_exits(window, buys, sells, instrument), symbol, instrument)
+
+    def run_fold(self, arrays, grid, train_start, test_start, test_end, symbol, instrument=None, balance=None):
+        """Pick the best grid point on one training window and trade it on the test window
+
+        Returns the fold summary and the test backtest, or None when no grid
+        point made enough trades.
+        """
+        minimize = self.metric in MINIMIZED_METRICS
+        best, best_stats = None, None
+        for params in grid:
+            stats = self.evaluate(arrays, train_start, test_start, params, symbol, instrument)['stats']
+            if stats['trades'] < self.min_trades:
+                continue
+            if best is None or (stats[self.metric] < best_stats[self.metric] if minimize
+                                else stats[self.metric] > best_stats[self.metric]):
+                best, best_stats = params, stats
+        if best is None:
+            self.logger.warning(f"No parameters with {self.min_trades}+ trades in fold starting at {train_start}")
+            return None
+
+        # Test windows chain on from the previous fold's ending balance
+        result = self.evaluate(arrays, test_start, test_end, best, symbol, instrument, balance)
+        fold = {
+            'train': (train_start, test_start),
+            'test': (test_start, test_end),
+            'params': dict(zip(('short_period', 'long_period', 'stop_loss_percentage',
+                                'take_profit_percentage'), best)),
+            'train_stats': best_stats,
+            'test_stats': result['stats']
+        }
+        return fold, result
+
+    def run(self, arrays, short_periods, long_periods, stop_losses, take_profits, symbol="BTCUSDT",
+            instrument=None):
+        """Optimize on each training window and report out-of-sample results on the next"""
+        # The caches belong to one price history; a new run may be another symbol or window
+        self.means.clear()
+        self.crosses.clear()
+        try:
+            arrays = {field: np.asarray(arrays[field], dtype=np.float64) for field in ('open', 'high', 'low', 'close')}
+            grid = [(short, long, stop_loss, take_profit) for short, long, stop_loss, take_profit
+                    in itertools.product(short_periods, long_periods, stop_losses, take_profits) if short < long]
+
+            folds = []
+            balance = self.initial_balance
+            out_of_sample = {'pnl': [], 'fees': [], 'reason': []}
+            equity = [balance]
+
+            for train_start, test_start, test_end in self.folds(len(arrays['close'])):
+                try:
+                    outcome = self.run_fold(arrays, grid, train_start, test_start, test_end, symbol, instrument,
+                                            balance)
+                except Exception as e:
+                    # Only this fold is lost; later folds still chain on from the current balance
+                    self.logger.error(f"Error in walk-forward fold starting at {train_start}, skipping it: {e}")
+                    continue
+                if outcome is None:
+                    continue
+
+                fold, result = outcome
+                for key in out_of_sample:
+                    out_of_sample[key].append(result['trades'][key])
+                equity.extend(result['equity'][1:])
+                balance = result['equity'][-1]
+                folds.append(fold)
+
+            if not folds:
+                return {'folds': [], 'stats': None}
+            stats = self.backtester.summarize(np.concatenate(out_of_sample['pnl']),
+                                              np.concatenate(out_of_sample['fees']), np.array(equity),
+                                              np.concatenate(out_of_sample['reason']))
+            return {'folds': folds, 'stats': stats}
+
+        except Exception as e:
+            self.logger.error(f"Error running walk-forward for {symbol}: {e}")
+            return None
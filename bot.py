@@ -1,21 +1,57 @@
 import json
 import time
 import os
+import threading
+import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from pybit.unified_trading import HTTP
 from strategies.moving_average import MovingAverageStrategy
 from utils.logger import setup_logger
+from utils.candle_store import get_candle_store
+from utils.ohlcv_store import get_ohlcv_store
+from utils.kline_cache import KlineCache, MAX_KLINE_LIMIT
+from utils.market_stream import MarketDataStream
+from utils.scheduler import CandleScheduler
+from utils.account import AccountSnapshot
+from utils.instruments import InstrumentCache, size_order
+from utils.klines import interval_to_ms
+from utils.resilience import ResilientClient
+from utils.http_client import get_client, get_latency_histogram
 
 class BybitTradingBot:
-    def __init__(self, config_path="config.json"):
+    def __init__(self, config_path="config.json", config=None, client=None):
         self.logger = setup_logger("BybitTradingBot")
-        self.config = self.load_config(config_path)
-        self.client = self.initialize_client()
+        # A config dict and client can be passed in directly, e.g. to replay recorded data
+        self.config = config if config is not None else self.load_config(config_path)
+        self.sleep = time.sleep
+        self.client = self.initialize_client(client)
         self.strategy = MovingAverageStrategy(
             short_period=self.config.get("ma_short_period", 20),
-            long_period=self.config.get("ma_long_period", 50)
+            long_period=self.config.get("ma_long_period", 50),
+            incremental=self.config.get("incremental_signals", False),
+            verify_incremental=self.config.get("verify_incremental_signals", False),
+            use_arrays=self.config.get("array_signals", False)
         )
+        # Enough candles for the long MA on the current and previous candle, whatever its length
+        self.window_size = max(100, self.strategy.long_period + 1)
+        self.candles = get_candle_store(max(self.config.get("candle_buffer_size", 1000), self.window_size))
+        self.klines = KlineCache(self.client) if self.config.get("kline_cache", True) else self.client
+        history_path = self.config.get("ohlcv_store_path", "data/ohlcv")
+        self.history = get_ohlcv_store(history_path) if history_path else None
+        self.instruments = InstrumentCache(
+            self.client,
+            path=self.config.get("instruments_cache_path", "data/instruments_linear.json"),
+            ttl=self.config.get("instruments_cache_ttl", 86400)
+        )
+        self.instruments.load()
         self.positions = {}
+        self.executor = None
+        self.stream = None
+        self.in_flight = {}
+        self.in_flight_lock = threading.RLock()
+        if self.config.get("warm_start", True):
+            self.warm_start()
         
     def load_config(self, config_path):
         """Load configuration from JSON file"""
@@ -42,19 +78,19 @@ class BybitTradingBot:
             self.logger.error(f"Error loading configuration: {e}")
             raise
     
-    def initialize_client(self):
+    def initialize_client(self, client=None):
         """Initialize Bybit client"""
         try:
-            client = HTTP(
-                api_key=self.config['api_key'],
-                api_secret=self.config['api_secret'],
-                testnet=self.config.get('testnet', True)
-            )
+            # Shared pooled client; the bot and dashboards reuse its warm connections
+            client = client or get_client(self.config)
             
-            # Test connection with timeout handling
+            self.account = AccountSnapshot(client)
+            
+            # Test connection with timeout handling; the response seeds the account snapshot
             try:
                 balance = client.get_wallet_balance(accountType="UNIFIED")
                 if balance['retCode'] == 0:
+                    self.account.load_wallet(balance)
                     self.logger.info(f"Connected to Bybit {'Testnet' if self.config.get('testnet') else 'Mainnet'}")
                 else:
                     self.logger.warning(f"API connection issue: {balance['retMsg']}")
@@ -71,18 +107,8 @@ class BybitTradingBot:
     def get_account_balance(self, coin="USDT"):
         """Get account balance for specific coin"""
         try:
-            response = self.client.get_wallet_balance(
-                accountType="UNIFIED",
-                coin=coin
-            )
-            
-            if response['retCode'] == 0:
-                balance_data = response['result']['list'][0]['coin'][0]
-                available_balance = float(balance_data['availableToWithdraw'])
-                return available_balance
-            else:
-                self.logger.error(f"Error getting balance: {response['retMsg']}")
-                return 0
+            # Served from the cycle's account snapshot; only the first call per cycle hits the API
+            return self.account.balance(coin)
                 
         except Exception as e:
             self.logger.error(f"Error getting account balance: {e}")
@@ -91,7 +117,7 @@ class BybitTradingBot:
     def get_market_data(self, symbol, interval="5", limit=200):
         """Get historical market data"""
         try:
-            response = self.client.get_kline(
+            response = self.klines.get_kline(
                 category="linear",
                 symbol=symbol,
                 interval=interval,
@@ -111,29 +137,16 @@ class BybitTradingBot:
     def get_current_position(self, symbol):
         """Get current position for symbol"""
         try:
-            response = self.client.get_positions(
-                category="linear",
-                symbol=symbol
-            )
-            
-            if response['retCode'] == 0 and response['result']['list']:
-                position_data = response['result']['list'][0]
-                return {
-                    'symbol': position_data['symbol'],
-                    'side': position_data['side'],
-                    'size': float(position_data['size']),
-                    'avg_price': float(position_data['avgPrice']) if position_data['avgPrice'] else 0,
-                    'unrealized_pnl': float(position_data['unrealisedPnl']),
-                    'percentage': float(position_data['unrealisedPnl']) / float(position_data['positionValue']) * 100 if float(position_data['positionValue']) > 0 else 0
-                }
-            return None
+            # Served from the bulk position index of the cycle's account snapshot
+            return self.account.position(symbol)
             
         except Exception as e:
             self.logger.error(f"Error getting position: {e}")
             return None
     
-    def place_market_order(self, symbol, side, qty, reduce_only=False):
-        """Place market order"""
+    def place_market_order(self, symbol, side, qty, reduce_only=False, stop_loss=None, take_profit=None,
+                           order_link_id=None):
+        """Place market order, optionally with stop loss and take profit attached"""
         try:
             order_params = {
                 "category": "linear",
@@ -146,11 +159,24 @@ class BybitTradingBot:
             
             if reduce_only:
                 order_params["reduceOnly"] = True
+            # A link id makes the order idempotent, so a lost response can be retried safely
+            order_params["orderLinkId"] = order_link_id or f"ma-{uuid.uuid4().hex[:24]}"
+            if stop_loss or take_profit:
+                # TP/SL submitted with the order protect the position from the moment it fills
+                order_params["tpslMode"] = "Full"
+                if stop_loss:
+                    order_params["stopLoss"] = str(stop_loss)
+                    order_params["slTriggerBy"] = "LastPrice"
+                if take_profit:
+                    order_params["takeProfit"] = str(take_profit)
+                    order_params["tpTriggerBy"] = "LastPrice"
             
             response = self.client.place_order(**order_params)
             
             if response['retCode'] == 0:
                 self.logger.info(f"Order placed successfully: {side} {qty} {symbol}")
+                # Balance and position changed, so the snapshot is stale
+                self.account.invalidate(symbol)
                 return response['result']
             else:
                 self.logger.error(f"Order failed: {response['retMsg']}")
@@ -160,6 +186,45 @@ class BybitTradingBot:
             self.logger.error(f"Error placing order: {e}")
             return None
     
+    def open_protected_position(self, symbol, side, qty, stop_loss, take_profit):
+        """Open a position with TP/SL attached, falling back to confirm-then-set"""
+        # The same link id on both attempts lets the exchange reject a duplicate
+        # if the first request was executed but its response was lost
+        order_link_id = f"ma-{uuid.uuid4().hex[:24]}"
+        
+        order = self.place_market_order(symbol, side, qty, stop_loss=stop_loss, take_profit=take_profit,
+                                        order_link_id=order_link_id)
+        if order or not self.config.get('tpsl_fallback', True):
+            return order
+        
+        self.logger.warning(f"Order with attached TP/SL failed for {symbol}, retrying without it")
+        order = self.place_market_order(symbol, side, qty, order_link_id=order_link_id)
+        if order:
+            attempts = self.config.get('position_confirm_attempts', 5)
+            if not self.wait_for_position(symbol, timeout=self.config.get('position_confirm_timeout', 5.0),
+                                          attempts=attempts):
+                self.logger.error(f"Position for {symbol} not confirmed after {attempts} checks, "
+                                  f"it is UNPROTECTED: no TP/SL set")
+            elif not self.set_stop_loss_take_profit(symbol, stop_loss, take_profit):
+                self.logger.error(f"Position for {symbol} is UNPROTECTED: setting TP/SL failed")
+        return order
+    
+    def wait_for_position(self, symbol, timeout=5.0, attempts=5):
+        """Check up to ``attempts`` times, spread over ``timeout`` seconds, for an open position in symbol
+
+        Each check is a REST call that counts against the rate limit, so
+        their number is capped rather than polling until the timeout.
+        """
+        interval = timeout / max(attempts - 1, 1)
+        for attempt in range(attempts):
+            if attempt:
+                self.sleep(interval)
+            self.account.invalidate(symbol, balances=False)
+            position = self.get_current_position(symbol)
+            if position and position['size'] > 0:
+                return position
+        return None
+    
     def set_stop_loss_take_profit(self, symbol, stop_loss=None, take_profit=None):
         """Set stop loss and take profit for existing position"""
         try:
@@ -190,36 +255,123 @@ class BybitTradingBot:
         """Calculate position size based on account balance"""
         try:
             balance = self.get_account_balance()
-            max_position_value = balance * 0.1  # Use max 10% of balance
             
-            position_size = max_position_value / current_price
-            
-            # Round to appropriate decimal places
-            if symbol.endswith("USDT"):
-                if "BTC" in symbol:
-                    position_size = round(position_size, 6)
-                else:
-                    position_size = round(position_size, 4)
-            
-            return max(position_size, 0.001)  # Minimum position size
+            # Use max 10% of balance, rounded to the instrument's lot size
+            return size_order(balance, current_price, symbol, self.instruments.get(symbol))
             
         except Exception as e:
             self.logger.error(f"Error calculating position size: {e}")
             return self.config.get("position_size", 0.001)
     
-    def execute_strategy(self, symbol):
-        """Execute trading strategy for a symbol"""
+    def refresh_candles(self, symbol, limit=None):
+        """Fetch the latest klines into the shared candle buffer"""
+        market_data = self.get_market_data(symbol, interval="5", limit=limit or min(self.window_size, MAX_KLINE_LIMIT))
+        if market_data:
+            # Merge into the shared candle buffer so windows can be read back as views
+            self.candles.ingest(symbol, "5", market_data)
+            if self.history is not None:
+                # Closed candles are kept on disk for backtests and later warm starts
+                self.history.ingest(symbol, "5", market_data)
+        return market_data
+    
+    def warm_start(self):
+        """Make every trading pair signal-ready at startup from local history plus one delta request"""
+        symbols = self.config.get('trading_pairs', ['BTCUSDT'])
+        started = time.monotonic()
+        if self.config.get('max_concurrent_symbols', 1) > 1:
+            self.ensure_executor()
+            ready = list(self.executor.map(self.warm_start_symbol, symbols))
+        else:
+            ready = [self.warm_start_symbol(symbol) for symbol in symbols]
+        self.logger.info(f"Warm start: {sum(ready)}/{len(symbols)} pairs signal-ready "
+                         f"in {time.monotonic() - started:.2f}s")
+
+    def warm_start_symbol(self, symbol):
+        """Load a pair's newest candles from disk and fetch only what is missing; returns True when signal-ready"""
         try:
-            # Get market data
-            market_data = self.get_market_data(symbol, interval="5", limit=100)
-            if not market_data:
+            if self.history is not None:
+                stored = self.history.read(symbol, "5", count=self.window_size)
+                if len(stored['timestamp']):
+                    # Copy out of the memory map into the in-memory buffers
+                    arrays = {field: np.array(values) for field, values in stored.items()}
+                    self.candles.extend(symbol, "5", arrays)
+                    if isinstance(self.klines, KlineCache):
+                        self.klines.seed(symbol, "5", arrays)
+
+            held = self.candles.window(symbol, "5", self.window_size)['timestamp']
+            missing = None
+            if len(held):
+                # Candles since the newest one held, plus that one again so the delta overlaps it
+                missing = (int(time.time() * 1000) - int(held[-1])) // interval_to_ms("5") + 1
+
+            if missing is not None and missing <= MAX_KLINE_LIMIT and len(held) + missing - 1 >= self.window_size:
+                # The kline cache works out the delta itself; without it ask for just the missing candles
+                self.refresh_candles(symbol, None if isinstance(self.klines, KlineCache) else max(missing, 2))
+            else:
+                if len(held):
+                    # Buffers only take candles newer than the last one held, so a short or stale
+                    # window from disk would stay short; start over with the full window
+                    self.candles.clear(symbol, "5")
+                    if isinstance(self.klines, KlineCache):
+                        self.klines.invalidate(symbol)
+                if self.window_size <= MAX_KLINE_LIMIT:
+                    self.refresh_candles(symbol)
+                else:
+                    self.fetch_history(symbol)
+
+            candles = self.candles.window(symbol, "5", self.window_size)
+            if self.strategy.incremental and len(candles['close']):
+                self.strategy.seed_state(symbol, candles['timestamp'], candles['close'])
+            return len(candles['close']) > self.strategy.long_period
+
+        except Exception as e:
+            self.logger.error(f"Error warm-starting {symbol}: {e}")
+            return False
+
+    def fetch_history(self, symbol):
+        """Download the newest window_size candles, paging back past the per-request limit"""
+        rows = []
+        end = None
+        while len(rows) < self.window_size:
+            params = {'end': end} if end is not None else {}
+            response = self.client.get_kline(category="linear", symbol=symbol, interval="5",
+                                             limit=min(self.window_size - len(rows), MAX_KLINE_LIMIT), **params)
+            page = response['result']['list'] if response['retCode'] == 0 else []
+            if not page:
+                break
+            rows.extend(page)
+            end = int(page[-1][0]) - 1
+
+        # Pages are newest-first and follow each other backwards in time, so together they form one response
+        kline_data = {'retCode': 0, 'result': {'list': rows}}
+        self.candles.ingest(symbol, "5", kline_data)
+        if self.history is not None:
+            self.history.ingest(symbol, "5", kline_data)
+
+    def execute_strategy(self, symbol, evaluation=None):
+        """Execute trading strategy for a symbol, optionally with a precomputed (signal, ma_short, ma_long)"""
+        try:
+            # Get market data, unless the stream or a batch evaluation already refreshed the buffer
+            market_data = None
+            if self.stream is None and evaluation is None:
+                market_data = self.refresh_candles(symbol)
+                if not market_data:
+                    return
+            
+            candles = self.candles.window(symbol, "5", self.window_size)
+            if not len(candles['close']):
                 return
             
             # Get current price
-            current_price = float(market_data['result']['list'][0][4])
+            current_price = float(candles['close'][-1])
             
             # Get strategy signal
-            signal, ma_short, ma_long = self.strategy.get_current_signal(market_data)
+            if evaluation is not None:
+                signal, ma_short, ma_long = evaluation
+            elif self.strategy.incremental and market_data:
+                signal, ma_short, ma_long = self.strategy.get_current_signal(market_data, symbol)
+            else:
+                signal, ma_short, ma_long = self.strategy.get_current_signal(candles)
             
             # Get current position
             current_position = self.get_current_position(symbol)
@@ -233,14 +385,15 @@ class BybitTradingBot:
                     # Open long position
                     position_size = self.calculate_position_size(symbol, current_price)
                     
-                    order = self.place_market_order(symbol, "Buy", position_size)
-                    if order:
-                        # Set stop loss and take profit
-                        stop_loss = current_price * (1 - self.config.get("stop_loss_percentage", 2.0) / 100)
-                        take_profit = current_price * (1 + self.config.get("take_profit_percentage", 4.0) / 100)
-                        
-                        time.sleep(1)  # Wait for position to be established
-                        self.set_stop_loss_take_profit(symbol, stop_loss, take_profit)
+                    stop_loss = self.instruments.round_price(
+                        symbol, current_price * (1 - self.config.get("stop_loss_percentage", 2.0) / 100))
+                    take_profit = self.instruments.round_price(
+                        symbol, current_price * (1 + self.config.get("take_profit_percentage", 4.0) / 100))
+                    
+                    if position_size > 0:
+                        self.open_protected_position(symbol, "Buy", position_size, stop_loss, take_profit)
+                    else:
+                        self.logger.warning(f"Skipping {symbol} entry: minimum order value exceeds what the balance allows")
                         
                 elif signal == "SELL" and current_position and current_position['size'] > 0:
                     # Close long position
@@ -254,6 +407,135 @@ class BybitTradingBot:
         except Exception as e:
             self.logger.error(f"Error executing strategy for {symbol}: {e}")
     
+    def evaluate_batch(self, symbols):
+        """Signals for many symbols in one vectorized pass over the candle buffers"""
+        if self.stream is None:
+            if self.config.get('max_concurrent_symbols', 1) > 1:
+                self.ensure_executor()
+                list(self.executor.map(self.refresh_candles, symbols))
+            else:
+                for symbol in symbols:
+                    self.refresh_candles(symbol)
+        
+        closes = self.candles.matrix(symbols, "5", self.strategy.long_period + 1)
+        signals, ma_short, ma_long = self.strategy.get_batch_signals(closes)
+        if signals is None:
+            return {}
+        return {symbol: (signals[i], float(ma_short[i]), float(ma_long[i]))
+                for i, symbol in enumerate(symbols) if not np.isnan(ma_long[i])}
+    
+    def execute_strategies(self, symbols):
+        """Execute the strategy for several symbols, concurrently if configured"""
+        evaluations = {}
+        if self.config.get('batch_signals', False):
+            evaluations = self.evaluate_batch(symbols)
+            # Symbols without enough history have nothing to act on
+            symbols = [symbol for symbol in symbols if symbol in evaluations]
+        
+        if self.config.get('max_concurrent_symbols', 1) <= 1:
+            for symbol in symbols:
+                self.execute_strategy(symbol, evaluations.get(symbol))
+            return
+
+        futures = {}
+        for symbol in symbols:
+            future = self.submit_symbol(symbol, evaluations.get(symbol))
+            if future:
+                futures[future] = symbol
+
+        timeout = self.config.get('symbol_timeout', self.config.get('trading_interval', 60))
+        _, pending = wait(futures, timeout=timeout)
+        for future in pending:
+            self.logger.warning(f"{futures[future]} did not finish within {timeout}s, continuing without it")
+
+    def ensure_executor(self):
+        """Create the worker pool on first use"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=max(1, self.config.get('max_concurrent_symbols', 1)),
+                                               thread_name_prefix="strategy")
+
+    def submit_symbol(self, symbol, evaluation=None):
+        """Queue a strategy run for a symbol on the worker pool"""
+        self.ensure_executor()
+
+        with self.in_flight_lock:
+            # A symbol still running from an earlier trigger is not queued twice
+            if symbol in self.in_flight:
+                self.logger.warning(f"{symbol} still running from a previous cycle, skipping")
+                return None
+            future = self.executor.submit(self.execute_strategy, symbol, evaluation)
+            self.in_flight[symbol] = future
+            future.add_done_callback(lambda f: self.finish_symbol(symbol))
+            return future
+
+    def on_candle_close(self, symbol, interval):
+        """Evaluate a symbol as soon as the stream reports a closed candle"""
+        # Pairs closing together share one account refresh
+        self.account.expire(self.config.get('account_snapshot_max_age', 1.0))
+        if self.history is not None:
+            self.history.append(symbol, interval, self.candles.window(symbol, interval))
+        self.submit_symbol(symbol)
+
+    def start_stream(self):
+        """Start WebSocket market data ingestion for all trading pairs"""
+        self.stream = MarketDataStream(
+            symbols=self.config.get('trading_pairs', ['BTCUSDT']),
+            candles=self.candles,
+            rest_client=self.klines,
+            interval="5",
+            url=self.config.get('ws_url'),
+            testnet=self.config.get('testnet', True),
+            on_candle_close=self.on_candle_close,
+            backfill_limit=max(100, self.strategy.long_period + 1)
+        )
+        self.stream.start()
+
+    def finish_symbol(self, symbol):
+        """Mark a symbol as no longer running"""
+        with self.in_flight_lock:
+            self.in_flight.pop(symbol, None)
+
+    def log_request_metrics(self):
+        """Log request latency, plus retry and circuit breaker counts for endpoints that had trouble"""
+        latency = get_latency_histogram()
+        if latency.percentile(50) is not None:
+            self.logger.info(f"Request latency: p50 <= {latency.percentile(50)}ms, p99 <= {latency.percentile(99)}ms")
+        if not isinstance(self.client, ResilientClient):
+            return
+        for name, stats in self.client.metrics().items():
+            if stats['retries'] or stats['failures'] or stats['short_circuited']:
+                self.logger.info(f"{name}: {stats['calls']} calls, {stats['retries']} retries, "
+                                 f"{stats['failures']} failures, {stats['short_circuited']} short-circuited, "
+                                 f"circuit {stats['circuit']}")
+
+    def run_aligned(self):
+        """Bot loop that evaluates each pair just after its candle closes"""
+        scheduler = CandleScheduler(
+            symbols=self.config.get('trading_pairs', ['BTCUSDT']),
+            interval="5",
+            delay=self.config.get('candle_close_delay', 1.0),
+            jitter=self.config.get('schedule_jitter', 0.0)
+        )
+        last_boundary = None
+        
+        while True:
+            boundary, symbols = scheduler.wait_next()
+            if boundary != last_boundary:
+                last_boundary = boundary
+                self.account.invalidate()
+                self.logger.info(f"--- Bot Cycle: {datetime.fromtimestamp(boundary)} candle close ---")
+                balance = self.get_account_balance()
+                self.logger.info(f"Account Balance: {balance:.4f} USDT")
+                self.log_request_metrics()
+            
+            if self.config.get('max_concurrent_symbols', 1) > 1:
+                # Do not wait here, so jittered symbols still fire on time
+                for symbol in symbols:
+                    self.submit_symbol(symbol)
+            else:
+                for symbol in symbols:
+                    self.execute_strategy(symbol)
+
     def run(self):
         """Main bot loop"""
         self.logger.info("Starting Bybit Trading Bot")
@@ -261,16 +543,24 @@ class BybitTradingBot:
         self.logger.info(f"Strategy: Moving Average ({self.config.get('ma_short_period', 20)}/{self.config.get('ma_long_period', 50)})")
         
         try:
+            if self.config.get('use_websocket', False):
+                self.start_stream()
+            elif self.config.get('align_to_candle_close', False):
+                self.run_aligned()
+            
             while True:
                 self.logger.info(f"--- Bot Cycle: {datetime.now()} ---")
+                self.account.invalidate()
                 
                 # Check account balance
                 balance = self.get_account_balance()
                 self.logger.info(f"Account Balance: {balance:.4f} USDT")
                 
-                # Execute strategy for each trading pair
-                for symbol in self.config.get('trading_pairs', ['BTCUSDT']):
-                    self.execute_strategy(symbol)
+                # Execute strategy for each trading pair; with streaming enabled,
+                # closed candles trigger evaluations instead
+                if self.stream is None:
+                    self.execute_strategies(self.config.get('trading_pairs', ['BTCUSDT']))
+                self.log_request_metrics()
                 
                 # Wait for next cycle
                 interval = self.config.get('trading_interval', 60)
@@ -282,6 +572,10 @@ class BybitTradingBot:
         except Exception as e:
             self.logger.error(f"Unexpected error: {e}")
         finally:
+            if self.stream:
+                self.stream.stop()
+            if self.executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
             self.logger.info("Bot shut down")
 
 if __name__ == "__main__":
@@ -216,7 +216,7 @@ def test_api_connection():
     print("🔗 Testing API Connection...")
     
     try:
-        from pybit.unified_trading import HTTP
+        from utils.http_client import get_client
         
         # Load config
         with open('config.json', 'r') as f:
@@ -228,11 +228,7 @@ def test_api_connection():
             return True
         
         # Test connection
-        client = HTTP(
-            api_key=config['api_key'],
-            api_secret=config['api_secret'],
-            testnet=config.get('testnet', True)
-        )
+        client = get_client(config)
         
         response = client.get_wallet_balance(accountType="UNIFIED")
         
@@ -12,9 +12,15 @@ import time
 from datetime import datetime, timedelta
 import logging
 import random
-from pybit.unified_trading import HTTP
 from strategies.moving_average import MovingAverageStrategy
 from utils.logger import setup_logger
+from utils.candle_store import get_candle_store
+from utils.ohlcv_store import get_ohlcv_store
+from utils.kline_cache import KlineCache
+from utils.klines import INTERVAL_MS
+from utils.market_stream import MarketDataStream
+from utils.account import AccountSnapshot
+from utils.http_client import get_client, get_latency_histogram
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'bybit_trading_bot_enhanced_secret_key'
@@ -27,8 +33,18 @@ class EnhancedTradingDashboard:
         self.client = self.initialize_client()
         self.strategy = MovingAverageStrategy(
             short_period=self.config.get("ma_short_period", 20),
-            long_period=self.config.get("ma_long_period", 50)
+            long_period=self.config.get("ma_long_period", 50),
+            incremental=self.config.get("incremental_signals", False),
+            use_arrays=self.config.get("array_signals", False)
         )
+        # Enough candles for the long MA on the current and previous candle, whatever its length
+        self.window_size = max(100, self.strategy.long_period + 1)
+        self.candles = get_candle_store(max(self.config.get("candle_buffer_size", 1000), self.window_size))
+        self.klines = KlineCache(self.client) if self.client and self.config.get("kline_cache", True) else self.client
+        history_path = self.config.get("ohlcv_store_path", "data/ohlcv")
+        self.history = get_ohlcv_store(history_path) if history_path else None
+        self.stream = None
+        self.account = AccountSnapshot(self.client) if self.client else None
         
         self.bot_start_time = datetime.now()
         self.trade_history = []
@@ -62,11 +78,8 @@ class EnhancedTradingDashboard:
                 self.logger.warning("API keys not configured - using demo mode")
                 return None
                 
-            client = HTTP(
-                api_key=self.config['api_key'],
-                api_secret=self.config['api_secret'],
-                testnet=self.config.get('testnet', True)
-            )
+            # Shared pooled client; the bot and dashboards reuse its warm connections
+            client = get_client(self.config)
             
             # Test connection
             try:
@@ -114,10 +127,7 @@ class EnhancedTradingDashboard:
             return self.demo_balance
             
         try:
-            response = self.client.get_wallet_balance(accountType="UNIFIED", coin="USDT")
-            if response['retCode'] == 0 and response['result']['list']:
-                balance_data = response['result']['list'][0]['coin'][0]
-                return float(balance_data['availableToWithdraw'])
+            return self.account.balance("USDT")
         except Exception as e:
             self.logger.error(f"Error getting balance: {e}")
         
@@ -179,16 +189,28 @@ class EnhancedTradingDashboard:
             }
             
         try:
-            response = self.client.get_kline(
-                category="linear",
-                symbol=symbol,
-                interval="5",
-                limit=100
-            )
+            # With the stream running the candle buffer is already current
+            response = None
+            if self.stream is None:
+                response = self.klines.get_kline(
+                    category="linear",
+                    symbol=symbol,
+                    interval="5",
+                    limit=self.window_size
+                )
+                if response['retCode'] != 0:
+                    return None
+                self.candles.ingest(symbol, "5", response)
+                if self.history is not None:
+                    self.history.ingest(symbol, "5", response)
             
-            if response['retCode'] == 0:
-                current_price = float(response['result']['list'][0][4])
-                signal, ma_short, ma_long = self.strategy.get_current_signal(response)
+            candles = self.candles.window(symbol, "5", self.window_size)
+            if len(candles['close']):
+                current_price = float(candles['close'][-1])
+                if self.strategy.incremental and response:
+                    signal, ma_short, ma_long = self.strategy.get_current_signal(response, symbol)
+                else:
+                    signal, ma_short, ma_long = self.strategy.get_current_signal(candles)
                 
                 return {
                     'symbol': symbol,
@@ -268,6 +290,10 @@ class EnhancedTradingDashboard:
         """Enhanced update loop with more real-time data"""
         while self.running:
             try:
+                # Fresh account snapshot for this round of updates
+                if self.account:
+                    self.account.invalidate()
+                
                 # Get current data
                 balance = self.get_account_balance()
                 positions = self.get_current_positions()
@@ -313,6 +339,19 @@ class EnhancedTradingDashboard:
                 self.logger.error(f"Error in update loop: {e}")
                 time.sleep(5)
     
+    def is_history_key(self, symbol, interval):
+        """Whether a history request names a traded or stored symbol and a known interval"""
+        if self.history is None or str(interval) not in INTERVAL_MS:
+            return False
+        return symbol in self.config.get('trading_pairs', []) or symbol in self.history.symbols()
+    
+    def get_history(self, symbol, interval="5", start=None, end=None, limit=1000):
+        """Stored candles for a symbol from the on-disk history, oldest first"""
+        if self.history is None:
+            return None
+        candles = self.history.read(symbol, interval, start, end, limit)
+        return {field: values.tolist() for field, values in candles.items()}
+    
     def get_uptime(self):
         """Get bot uptime"""
         uptime = datetime.now() - self.bot_start_time
@@ -323,6 +362,17 @@ class EnhancedTradingDashboard:
     def start_monitoring(self):
         """Start the monitoring thread"""
         self.running = True
+        if self.client and self.config.get('use_websocket', False):
+            self.stream = MarketDataStream(
+                symbols=self.config.get('trading_pairs', ['BTCUSDT']),
+                candles=self.candles,
+                rest_client=self.klines,
+                interval="5",
+                url=self.config.get('ws_url'),
+                testnet=self.config.get('testnet', True),
+                backfill_limit=self.window_size
+            )
+            self.stream.start()
         self.monitor_thread = threading.Thread(target=self.update_loop, daemon=True)
         self.monitor_thread.start()
         self.logger.info("Enhanced web interface monitoring started")
@@ -330,6 +380,9 @@ class EnhancedTradingDashboard:
     def stop_monitoring(self):
         """Stop the monitoring thread"""
         self.running = False
+        if self.stream:
+            self.stream.stop()
+            self.stream = None
         self.logger.info("Enhanced web interface monitoring stopped")
 
 # Global dashboard instance
@@ -354,6 +407,27 @@ def api_status():
         'trading_pairs': dashboard.config.get('trading_pairs', [])
     })
 
+@app.route('/api/latency')
+def api_latency():
+    """Request count and p50/p99 latency per Bybit endpoint"""
+    return jsonify(get_latency_histogram().summary())
+
+@app.route('/api/history/<symbol>')
+def api_history(symbol):
+    """Stored candles for a symbol; optional interval, start, end (ms) and limit query parameters"""
+    interval = request.args.get('interval', '5')
+    if dashboard.history is not None and not dashboard.is_history_key(symbol, interval):
+        # Both become store paths, so anything unexpected is refused before the store is touched
+        return jsonify({'error': f'Unknown symbol or interval: {symbol} {interval}'}), 404
+    history = dashboard.get_history(
+        symbol,
+        interval=interval,
+        start=request.args.get('start', type=int),
+        end=request.args.get('end', type=int),
+        limit=min(request.args.get('limit', 1000, type=int), 10000)
+    )
+    return jsonify(history if history is not None else {'error': 'History store disabled'})
+
 @app.route('/api/market/<symbol>')
 def get_market_data_api(symbol):
     """Get market data for specific symbol"""
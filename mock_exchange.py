@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+"""
+Mock Bybit Exchange
+Local stand-in for the Bybit v5 REST endpoints the bot and dashboards use,
+with simulated markets, an in-memory order book and latency/error injection
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from utils.klines import interval_to_ms
+from utils.logger import setup_logger
+
+MINUTE_MS = 60_000
+TAKER_FEE = 0.00055
+MAKER_FEE = 0.0002
+
+DEFAULT_SYMBOLS = {
+    'BTCUSDT': {'price': 65000.0, 'tick_size': 0.1, 'qty_step': 0.001, 'min_qty': 0.001},
+    'ETHUSDT': {'price': 3200.0, 'tick_size': 0.01, 'qty_step': 0.01, 'min_qty': 0.01},
+    'SOLUSDT': {'price': 150.0, 'tick_size': 0.001, 'qty_step': 0.1, 'min_qty': 0.1},
+}
+
+class RawJSON:
+    """Already-encoded JSON, spliced into a response unchanged by ``dump_json``"""
+
+    def __init__(self, text):
+        self.text = text
+
+def dump_json(payload):
+    """``json.dumps`` that inserts RawJSON values as they are"""
+    raw = []
+    # Random, so echoed client strings cannot pose as a placeholder
+    token = uuid.uuid4().hex
+
+    def placeholder(value):
+        if not isinstance(value, RawJSON):
+            raise TypeError(f"{type(value).__name__} is not JSON serializable")
+        raw.append(value.text)
+        return f"{token}{len(raw) - 1}"
+
+    text = json.dumps(payload, default=placeholder)
+    for i, fragment in enumerate(raw):
+        text = text.replace(f'"{token}{i}"', fragment, 1)
+    return text
+
+class ExchangeError(Exception):
+    """Rejected request, reported to the client as a non-zero retCode"""
+
+    def __init__(self, ret_code, message):
+        super().__init__(message)
+        self.ret_code = ret_code
+        self.message = message
+
+class MarketSimulator:
+    """Deterministic random-walk 1-minute candles, generated lazily as time passes"""
+
+    def __init__(self, symbol, price, history_minutes=43_200, volatility=0.0008, seed=0, now_ms=None):
+        self.symbol = symbol
+        self.volatility = volatility
+        self.rng = np.random.default_rng([seed, sum(symbol.encode("utf-8"))])
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        # Start on a day boundary so every interval's candles line up with the base minutes
+        self.start = (now_ms // MINUTE_MS - history_minutes) // 1440 * 1440 * MINUTE_MS
+        self.open = np.empty(0)
+        self.high = np.empty(0)
+        self.low = np.empty(0)
+        self.close = np.empty(0)
+        self.volume = np.empty(0)
+        self.last_close = price
+        self.rows = {}
+        self.extend_to(now_ms)
+
+    def extend_to(self, now_ms):
+        """Generate minutes up to and including the one containing ``now_ms``"""
+        needed = (now_ms - self.start) // MINUTE_MS + 1 - len(self.close)
+        if needed <= 0:
+            return
+
+        returns = self.rng.normal(0, self.volatility, needed)
+        close = self.last_close * np.exp(np.cumsum(returns))
+        open_ = np.empty(needed)
+        open_[0] = self.last_close
+        open_[1:] = close[:-1]
+        wick = np.abs(self.rng.normal(0, self.volatility / 2, (2, needed)))
+        high = np.maximum(open_, close) * (1 + wick[0])
+        low = np.minimum(open_, close) * (1 - wick[1])
+        volume = self.rng.gamma(2.0, 50.0, needed)
+
+        self.open = np.concatenate([self.open, open_])
+        self.high = np.concatenate([self.high, high])
+        self.low = np.concatenate([self.low, low])
+        self.close = np.concatenate([self.close, close])
+        self.volume = np.concatenate([self.volume, volume])
+        self.last_close = float(close[-1])
+
+    def price(self):
+        return float(self.close[-1])
+
+    def minute_index(self, timestamp):
+        return (timestamp - self.start) // MINUTE_MS
+
+    def klines(self, interval, limit=200, start=None, end=None, now_ms=None):
+        """Newest-first Bybit kline rows for any fixed interval, as an encoded JSON array"""
+        interval_ms = interval_to_ms(interval)
+        if interval_ms is None or interval_ms < MINUTE_MS:
+            raise ExchangeError(10001, f"Unsupported interval {interval}")
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        end = now_ms if end is None else min(int(end), now_ms)
+        last_open = end // interval_ms * interval_ms
+        first_open = last_open - (limit - 1) * interval_ms
+        if start is not None:
+            first_open = max(first_open, -(-int(start) // interval_ms) * interval_ms)
+        first_open = max(first_open, -(-self.start // interval_ms) * interval_ms)
+        if first_open > last_open:
+            return RawJSON("[]")
+
+        # Closed candles never change, so their encoded rows are cached per interval
+        cache = self.rows.setdefault(interval_ms, {})
+        timestamps = range(last_open, first_open - 1, -interval_ms)
+        missing = [ts for ts in timestamps if ts not in cache]
+        if missing:
+            cache.update(self.format_rows(missing[-1], last_open, interval_ms))
+        rows = RawJSON("[" + ",".join([cache[ts] for ts in timestamps]) + "]")
+        # The forming candle is rebuilt on the next request
+        cache.pop(now_ms // interval_ms * interval_ms, None)
+        return rows
+
+    def format_rows(self, first_open, last_open, interval_ms):
+        """Aggregate minutes into candles opening in [first_open, last_open] and encode them as JSON rows"""
+        minutes = interval_ms // MINUTE_MS
+        first = self.minute_index(first_open)
+        last = min(self.minute_index(last_open) + minutes, len(self.close))
+        count = (last_open - first_open) // interval_ms + 1
+
+        # Pad the forming candle to whole intervals and reduce every candle in one pass
+        padded = count * minutes
+        def block(values, fill):
+            out = np.full(padded, fill)
+            out[:last - first] = values[first:last]
+            return out.reshape(count, minutes)
+
+        open_ = self.open[first:last:minutes][:count]
+        high = block(self.high, -np.inf).max(axis=1)
+        low = block(self.low, np.inf).min(axis=1)
+        volume = block(self.volume, 0.0).sum(axis=1)
+        close_index = np.minimum(np.arange(1, count + 1) * minutes, last - first) - 1
+        close = self.close[first:last][close_index]
+        timestamps = first_open + np.arange(count) * interval_ms
+
+        # Formatting plain floats is several times faster than formatting numpy scalars
+        columns = zip(timestamps.tolist(), open_.tolist(), high.tolist(), low.tolist(), close.tolist(),
+                      volume.tolist())
+        return {ts: f'["{ts}","{o:.8g}","{h:.8g}","{l:.8g}","{c:.8g}","{v:.4f}","{v * c:.4f}"]'
+                for ts, o, h, l, c, v in columns}
+
+class OrderBook:
+    """Simulated liquidity around the market price plus resting user limit orders
+
+    Market and marketable limit orders walk the price levels, so large
+    orders pay slippage. Consumed liquidity is replenished whenever the
+    market price moves. Resting limit orders fill when the market trades
+    through their price.
+    """
+
+    def __init__(self, tick_size, depth=25, level_qty=None, spread_ticks=1):
+        self.tick_size = tick_size
+        self.depth = depth
+        self.level_qty = level_qty
+        self.spread_ticks = spread_ticks
+        self.mid = None
+        self.asks = []
+        self.bids = []
+        self.resting = {'Buy': [], 'Sell': []}
+
+    def refill(self, mid):
+        """Rebuild the simulated levels around a new market price"""
+        if mid == self.mid:
+            return
+        self.mid = mid
+        # Roughly $50k of depth per level whatever the instrument's price
+        level_qty = self.level_qty or 50_000 / mid
+        self.asks = [[self.round(mid + self.tick_size * (self.spread_ticks + i)), level_qty * (1 + i / 5)]
+                     for i in range(self.depth)]
+        self.bids = [[self.round(mid - self.tick_size * (self.spread_ticks + i)), level_qty * (1 + i / 5)]
+                     for i in range(self.depth)]
+
+    def round(self, price):
+        return round(round(price / self.tick_size) * self.tick_size, 10)
+
+    def take(self, side, qty, limit_price=None):
+        """Consume liquidity for a taker order; returns (filled qty, average price)"""
+        levels = self.asks if side == "Buy" else self.bids
+        filled = cost = 0.0
+        for level in levels:
+            price, available = level
+            if limit_price is not None and (price > limit_price if side == "Buy" else price < limit_price):
+                break
+            take = min(available, qty - filled)
+            level[1] -= take
+            filled += take
+            cost += take * price
+            if filled >= qty:
+                break
+        levels[:] = [level for level in levels if level[1] > 0]
+        return filled, (cost / filled if filled else None)
+
+    def rest(self, order):
+        """Queue a limit order by price priority, then time"""
+        orders = self.resting[order['side']]
+        # Best bid first for buys, lowest ask first for sells
+        keys = [-o['price'] if order['side'] == "Buy" else o['price'] for o in orders]
+        key = -order['price'] if order['side'] == "Buy" else order['price']
+        orders.insert(bisect.bisect_right(keys, key), order)
+
+    def cancel(self, order_id):
+        for orders in self.resting.values():
+            for i, order in enumerate(orders):
+                if order['orderId'] == order_id:
+                    return orders.pop(i)
+        return None
+
+    def cross(self, low, high):
+        """Resting orders the market traded through between ``low`` and ``high``"""
+        filled = []
+        while self.resting['Buy'] and self.resting['Buy'][0]['price'] >= low:
+            filled.append(self.resting['Buy'].pop(0))
+        while self.resting['Sell'] and self.resting['Sell'][0]['price'] <= high:
+            filled.append(self.resting['Sell'].pop(0))
+        return filled
+
+class MockExchange:
+    """Accounts, positions and matching for the mock server; one lock guards all state"""
+
+    def __init__(self, symbols=None, balance=10000.0, leverage=10, seed=0, history_minutes=43_200):
+        self.symbols = symbols or DEFAULT_SYMBOLS
+        self.leverage = leverage
+        self.balance = balance
+        self.markets = {symbol: MarketSimulator(symbol, info['price'], history_minutes, seed=seed)
+                        for symbol, info in self.symbols.items()}
+        self.books = {symbol: OrderBook(info['tick_size']) for symbol, info in self.symbols.items()}
+        self.positions = {}
+        self.orders = {}
+        self.order_links = set()
+        self.checked = {symbol: len(market.close) for symbol, market in self.markets.items()}
+        self.order_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def market(self, symbol):
+        market = self.markets.get(symbol)
+        if market is None:
+            raise ExchangeError(10001, f"Symbol {symbol} does not exist")
+        return market
+
+    def advance(self, now_ms=None):
+        """Move markets to now, refill books and trigger resting orders and TP/SL"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        for symbol, market in self.markets.items():
+            market.extend_to(now_ms)
+            self.books[symbol].refill(market.price())
+            first, last = self.checked[symbol] - 1, len(market.close)
+            if first >= last:
+                continue
+            low, high = market.low[first:last].min(), market.high[first:last].max()
+            self.checked[symbol] = last
+
+            for order in self.books[symbol].cross(low, high):
+                self.fill(order, order['qty'], order['price'], MAKER_FEE)
+            self.trigger_stops(symbol, first, last)
+
+    def trigger_stops(self, symbol, first, last):
+        """Close the position at its TP/SL if minutes [first, last) traded through either"""
+        position = self.positions.get(symbol)
+        if not position:
+            return
+        # The fill minute's low and high may have printed before the fill, so only later minutes count
+        first = max(first, position['opened'] + 1)
+        market = self.markets[symbol]
+        long = position['side'] == "Buy"
+        stop_loss, take_profit = position.get('stop_loss'), position.get('take_profit')
+        for low, high in zip(market.low[first:last], market.high[first:last]):
+            # The stop is checked first when one minute touches both
+            if stop_loss and (low <= stop_loss if long else high >= stop_loss):
+                return self.close_position(symbol, stop_loss)
+            if take_profit and (high >= take_profit if long else low <= take_profit):
+                return self.close_position(symbol, take_profit)
+
+    def close_position(self, symbol, price):
+        position = self.positions[symbol]
+        side = "Sell" if position['side'] == "Buy" else "Buy"
+        self.apply_fill(symbol, side, position['size'], price, TAKER_FEE)
+
+    def wallet(self):
+        unrealized = margin = 0.0
+        for symbol, position in self.positions.items():
+            price = self.markets[symbol].price()
+            direction = 1 if position['side'] == "Buy" else -1
+            unrealized += direction * position['size'] * (price - position['avg_price'])
+            margin += position['size'] * position['avg_price'] / self.leverage
+        return {
+            'accountType': 'UNIFIED',
+            'totalEquity': f"{self.balance + unrealized:.4f}",
+            'coin': [{
+                'coin': 'USDT',
+                'walletBalance': f"{self.balance:.4f}",
+                'equity': f"{self.balance + unrealized:.4f}",
+                'unrealisedPnl': f"{unrealized:.4f}",
+                'availableToWithdraw': f"{max(0.0, self.balance - margin):.4f}"
+            }]
+        }
+
+    def position_row(self, symbol):
+        position = self.positions.get(symbol)
+        price = self.markets[symbol].price()
+        if not position:
+            return {'symbol': symbol, 'side': '', 'size': '0', 'avgPrice': '0', 'positionValue': '0',
+                    'unrealisedPnl': '0', 'markPrice': f"{price:.8g}", 'leverage': str(self.leverage),
+                    'positionIdx': 0, 'stopLoss': '', 'takeProfit': ''}
+        direction = 1 if position['side'] == "Buy" else -1
+        return {
+            'symbol': symbol,
+            'side': position['side'],
+            'size': f"{position['size']:.8g}",
+            'avgPrice': f"{position['avg_price']:.8g}",
+            'positionValue': f"{position['size'] * position['avg_price']:.4f}",
+            'unrealisedPnl': f"{direction * position['size'] * (price - position['avg_price']):.4f}",
+            'markPrice': f"{price:.8g}",
+            'leverage': str(self.leverage),
+            'positionIdx': 0,
+            'stopLoss': str(position.get('stop_loss') or ''),
+            'takeProfit': str(position.get('take_profit') or '')
+        }
+
+    def place_order(self, params):
+        symbol = params.get('symbol')
+        market = self.market(symbol)
+        side = params.get('side')
+        if side not in ("Buy", "Sell"):
+            raise ExchangeError(10001, "side must be Buy or Sell")
+        order_type = params.get('orderType', "Market")
+        qty = float(params.get('qty') or 0)
+        info = self.symbols[symbol]
+        if qty < info['min_qty']:
+            raise ExchangeError(110094, f"Order qty below minimum {info['min_qty']}")
+
+        limit_price = float(params['price']) if order_type == "Limit" and params.get('price') else None
+        if order_type == "Limit" and limit_price is None:
+            raise ExchangeError(10001, "Limit orders need a price")
+
+        link_id = params.get('orderLinkId')
+        if link_id and link_id in self.order_links:
+            raise ExchangeError(110072, "OrderLinkedID is duplicate")
+
+        position = self.positions.get(symbol)
+        if str(params.get('reduceOnly')).lower() == "true":
+            if not position or position['side'] == side:
+                raise ExchangeError(110017, "Reduce-only order has same side with current position")
+            qty = min(qty, position['size'])
+
+        # Only an accepted order uses up its link id, so a rejected one can be retried with it
+        if link_id:
+            self.order_links.add(link_id)
+        order = {
+            'orderId': str(uuid.UUID(int=next(self.order_ids))),
+            'orderLinkId': link_id or '',
+            'symbol': symbol,
+            'side': side,
+            'orderType': order_type,
+            'qty': qty,
+            'price': float(params['price']) if params.get('price') else None,
+            'stop_loss': float(params['stopLoss']) if params.get('stopLoss') else None,
+            'take_profit': float(params['takeProfit']) if params.get('takeProfit') else None,
+            'status': 'New',
+            'filled': 0.0,
+            'created': int(time.time() * 1000)
+        }
+        self.orders[order['orderId']] = order
+
+        book = self.books[symbol]
+        book.refill(market.price())
+        filled, average = book.take(side, qty, limit_price)
+        if filled:
+            self.fill(order, filled, average, TAKER_FEE)
+        if order['filled'] < qty:
+            if order_type == "Limit":
+                book.rest(dict(order, qty=qty - order['filled'], price=limit_price))
+            else:
+                # IOC market order: whatever the book could not absorb is cancelled
+                order['status'] = 'PartiallyFilledCanceled' if order['filled'] else 'Cancelled'
+        return {'orderId': order['orderId'], 'orderLinkId': order['orderLinkId']}
+
+    def fill(self, order, qty, price, fee_rate):
+        resting = self.orders.get(order['orderId'], order)
+        resting['filled'] += qty
+        resting['status'] = 'Filled' if resting['filled'] >= resting['qty'] - 1e-12 else 'PartiallyFilled'
+        self.apply_fill(order['symbol'], order['side'], qty, price, fee_rate)
+        position = self.positions.get(order['symbol'])
+        if position and position['side'] == order['side']:
+            # TP/SL sent with the order protect the position it opened
+            if order.get('stop_loss'):
+                position['stop_loss'] = order['stop_loss']
+            if order.get('take_profit'):
+                position['take_profit'] = order['take_profit']
+
+    def apply_fill(self, symbol, side, qty, price, fee_rate):
+        """Net a fill into the one-way position and realize PnL"""
+        self.balance -= qty * price * fee_rate
+        # Minute the position opened in, so TP/SL are only checked against minutes after it
+        minute = len(self.markets[symbol].close) - 1
+        position = self.positions.get(symbol)
+        if position is None or position['size'] == 0:
+            self.positions[symbol] = {'side': side, 'size': qty, 'avg_price': price, 'opened': minute}
+            return
+
+        if position['side'] == side:
+            size = position['size'] + qty
+            position['avg_price'] = (position['avg_price'] * position['size'] + price * qty) / size
+            position['size'] = size
+            return
+
+        closed = min(qty, position['size'])
+        direction = 1 if position['side'] == "Buy" else -1
+        self.balance += direction * closed * (price - position['avg_price'])
+        position['size'] -= closed
+        if position['size'] <= 1e-12:
+            del self.positions[symbol]
+            if qty > closed:
+                self.positions[symbol] = {'side': side, 'size': qty - closed, 'avg_price': price,
+                                          'opened': minute}
+
+    def cancel_order(self, params):
+        order_id = params.get('orderId')
+        if not order_id and params.get('orderLinkId'):
+            order_id = next((o['orderId'] for o in self.orders.values()
+                             if o['orderLinkId'] == params['orderLinkId']), None)
+        order = self.orders.get(order_id)
+        if order is None or self.books[order['symbol']].cancel(order_id) is None:
+            raise ExchangeError(110001, "Order does not exist")
+        order['status'] = 'Cancelled'
+        return {'orderId': order_id, 'orderLinkId': order['orderLinkId']}
+
+    def open_orders(self, params):
+        symbol = params.get('symbol')
+        return [{'orderId': o['orderId'], 'orderLinkId': o['orderLinkId'], 'symbol': o['symbol'],
+                 'side': o['side'], 'orderType': o['orderType'], 'price': str(o['price'] or ''),
+                 'qty': f"{o['qty']:.8g}", 'cumExecQty': f"{o['filled']:.8g}", 'orderStatus': o['status']}
+                for o in self.orders.values()
+                if o['status'] in ('New', 'PartiallyFilled') and (not symbol or o['symbol'] == symbol)]
+
+    def set_trading_stop(self, params):
+        position = self.positions.get(params.get('symbol'))
+        if not position:
+            raise ExchangeError(10001, "can not set tp/sl/ts for zero position")
+        if params.get('stopLoss'):
+            position['stop_loss'] = float(params['stopLoss'])
+        if params.get('takeProfit'):
+            position['take_profit'] = float(params['takeProfit'])
+        return {}
+
+    def instruments(self):
+        return [{'symbol': symbol, 'status': 'Trading', 'contractType': 'LinearPerpetual',
+                 'lotSizeFilter': {'qtyStep': str(info['qty_step']), 'minOrderQty': str(info['min_qty']),
+                                   'maxOrderQty': '1000000', 'maxMktOrderQty': '100000'},
+                 'priceFilter': {'tickSize': str(info['tick_size'])}}
+                for symbol, info in self.symbols.items()]
+
+    def handle(self, method, path, params):
+        """Dispatch one request under the exchange lock; returns the ``result`` payload"""
+        with self.lock:
+            self.advance()
+            if path == "/v5/market/time":
+                now = time.time()
+                return {'timeSecond': str(int(now)), 'timeNano': str(int(now * 1e9))}
+            if path == "/v5/market/kline":
+                market = self.market(params.get('symbol'))
+                rows = market.klines(params.get('interval', "5"), min(int(params.get('limit', 200)), 1000),
+                                     params.get('start'), params.get('end'))
+                return {'symbol': params.get('symbol'), 'category': params.get('category', 'linear'), 'list': rows}
+            if path == "/v5/market/tickers":
+                symbols = [params['symbol']] if params.get('symbol') else list(self.markets)
+                return {'category': 'linear', 'list': [
+                    {'symbol': s, 'lastPrice': f"{self.market(s).price():.8g}",
+                     'bid1Price': f"{self.books[s].bids[0][0]:.8g}" if self.books[s].bids else '',
+                     'ask1Price': f"{self.books[s].asks[0][0]:.8g}" if self.books[s].asks else ''}
+                    for s in symbols]}
+            if path == "/v5/market/instruments-info":
+                return {'category': 'linear', 'list': self.instruments(), 'nextPageCursor': ''}
+            if path == "/v5/account/wallet-balance":
+                return {'list': [self.wallet()]}
+            if path == "/v5/position/list":
+                symbols = [params['symbol']] if params.get('symbol') else list(self.positions)
+                return {'category': 'linear', 'list': [self.position_row(s) for s in symbols],
+                        'nextPageCursor': ''}
+            if path == "/v5/order/create" and method == "POST":
+                return self.place_order(params)
+            if path == "/v5/order/cancel" and method == "POST":
+                return self.cancel_order(params)
+            if path == "/v5/order/realtime":
+                return {'category': 'linear', 'list': self.open_orders(params), 'nextPageCursor': ''}
+            if path == "/v5/position/trading-stop" and method == "POST":
+                return self.set_trading_stop(params)
+        raise ExchangeError(404, f"Unknown endpoint {method} {path}")
+
+class MockExchangeServer:
+    """Asyncio HTTP/1.1 keep-alive server for a MockExchange
+
+    One event loop serves every connection, so injected latency is an
+    ``asyncio.sleep`` that never ties up a thread, and exchange state needs
+    no locking beyond what ``MockExchange`` already does. The request
+    parsing is deliberately minimal: Bybit clients send one request at a
+    time per connection with a ``Content-Length`` body.
+    """
+
+    rate_limit = 100
+
+    def __init__(self, host="127.0.0.1", port=8900, exchange=None, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0):
+        self.exchange = exchange or MockExchange()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # Bound now, so a port already in use fails here rather than once serving starts
+        self.socket = socket.create_server((host, port))
+        self.server_address = self.socket.getsockname()
+        self.loop = None
+        self.server = None
+        # Open connections' handler tasks and writers, closed on shutdown
+        self.connections = {}
+
+    def serve_forever(self):
+        """Serve until ``shutdown()`` is called from another thread, or until interrupted"""
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.handle_connection, sock=self.socket)
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        # Idle keep-alive connections would otherwise be cancelled mid-read when the loop ends
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+
+    def shutdown(self):
+        """Stop serving; safe to call from another thread"""
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+
+    def server_close(self):
+        self.socket.close()
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, version = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if line:
+                        key, _, value = line.partition(":")
+                        headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                body = await reader.readexactly(length) if length else b""
+                url = urlparse(target)
+                if method == "POST":
+                    try:
+                        params = json.loads(body) if body else {}
+                    except ValueError:
+                        params = {}
+                else:
+                    params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+                status, extra, payload = await self.respond(method, url.path, params)
+                keep_alive = (headers.get('connection', '').lower() != "close" if version == "HTTP/1.1"
+                              else headers.get('connection', '').lower() == "keep-alive")
+                response_body = dump_json(payload).encode("utf-8")
+                # One write per response: headers and body never wait on each other's ACK
+                response_head = "".join([
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n",
+                    "Content-Type: application/json\r\n",
+                    f"Content-Length: {len(response_body)}\r\n",
+                    "" if keep_alive else "Connection: close\r\n",
+                    *(f"{key}: {value}\r\n" for key, value in extra.items()),
+                    "\r\n"
+                ])
+                writer.write(response_head.encode("latin-1") + response_body)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ValueError, ConnectionError):
+            # Malformed request line or a client that went away mid-request
+            return
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+
+    async def respond(self, method, path, params):
+        """Status, extra headers and JSON payload for one request"""
+        if self.latency_ms or self.jitter_ms:
+            await asyncio.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+        status = 200
+        reset = int(time.time() * 1000) + 1000
+        headers = {'X-Bapi-Limit': str(self.rate_limit), 'X-Bapi-Limit-Status': str(self.rate_limit - 1),
+                   'X-Bapi-Limit-Reset-Timestamp': str(reset)}
+        if self.error_rate and random.random() < self.error_rate:
+            # Injected failures mirror what the real API returns under stress
+            kind = random.choice(("server", "rate_limit", "http"))
+            if kind == "http":
+                status, payload = 503, {'retCode': 10016, 'retMsg': "Service unavailable"}
+            elif kind == "rate_limit":
+                headers['X-Bapi-Limit-Status'] = "0"
+                payload = {'retCode': 10006, 'retMsg': "Too many visits!"}
+            else:
+                payload = {'retCode': 10016, 'retMsg': "Internal server error"}
+            payload.update(result={}, retExtInfo={}, time=int(time.time() * 1000))
+            return status, headers, payload
+
+        try:
+            result = self.exchange.handle(method, path, params)
+            payload = {'retCode': 0, 'retMsg': "OK", 'result': result, 'retExtInfo': {},
+                       'time': int(time.time() * 1000)}
+        except ExchangeError as e:
+            if e.ret_code == 404:
+                status = 404
+            payload = {'retCode': e.ret_code, 'retMsg': e.message, 'result': {}, 'retExtInfo': {},
+                       'time': int(time.time() * 1000)}
+        except (TypeError, ValueError, KeyError) as e:
+            payload = {'retCode': 10001, 'retMsg': f"Invalid parameter: {e}", 'result': {},
+                       'retExtInfo': {}, 'time': int(time.time() * 1000)}
+        return status, headers, payload
+
+def create_server(host="127.0.0.1", port=8900, exchange=None, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0):
+    """Build (but do not start) a mock exchange server"""
+    return MockExchangeServer(host, port, exchange, latency_ms, jitter_ms, error_rate)
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Bybit v5 REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--balance", type=float, default=10000.0, help="Starting USDT balance")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the simulated markets")
+    args = parser.parse_args()
+
+    logger = setup_logger("MockExchange")
+    exchange = MockExchange(balance=args.balance, seed=args.seed)
+    server = create_server(args.host, args.port, exchange, args.latency_ms, args.jitter_ms, args.error_rate)
+    logger.info(f"Mock Bybit exchange listening on http://{args.host}:{args.port} "
+                f"(symbols: {', '.join(exchange.symbols)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Mock exchange stopped")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
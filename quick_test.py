@@ -20,26 +20,22 @@ def main():
     
     # Test 2: Check imports
     try:
-        from pybit.unified_trading import HTTP
-        print("✓ PyBit imported")
-        
         from utils.logger import setup_logger
         print("✓ Logger imported")
         
         from strategies.moving_average import MovingAverageStrategy
         print("✓ Strategy imported")
         
+        from utils.http_client import get_client
+        print("✓ HTTP client factory imported")
+        
     except Exception as e:
         print(f"✗ Import error: {e}")
         return False
     
     # Test 3: Test API connection
     try:
-        client = HTTP(
-            api_key=config['api_key'],
-            api_secret=config['api_secret'],
-            testnet=config['testnet']
-        )
+        client = get_client(config)
         
         # Simple API test
         response = client.get_wallet_balance(accountType="UNIFIED")
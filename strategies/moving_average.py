@@ -1,61 +1,315 @@
+import math
+from collections import deque
 import pandas as pd
 import numpy as np
 from utils.logger import setup_logger
+from utils.klines import parse_klines
+
+class MovingAverageState:
+    """Running-sum moving average state for a single symbol"""
+
+    def __init__(self, short_period, long_period):
+        self.short_period = short_period
+        self.long_period = long_period
+        self.closes = deque(maxlen=long_period)
+        self.short_sum = 0.0
+        self.long_sum = 0.0
+        self.last_timestamp = None
+        self.above = False
+        self.prev_above = None
+        self.pushes = 0
+
+    @property
+    def ready(self):
+        return len(self.closes) >= self.long_period
+
+    @property
+    def ma_short(self):
+        return self.short_sum / self.short_period
+
+    @property
+    def ma_long(self):
+        return self.long_sum / self.long_period
+
+    def reset(self):
+        """Drop all accumulated candles"""
+        self.closes.clear()
+        self.short_sum = 0.0
+        self.long_sum = 0.0
+        self.last_timestamp = None
+        self.above = False
+        self.prev_above = None
+        self.pushes = 0
+
+    def seed(self, timestamps, closes):
+        """Rebuild state from oldest-first timestamps and closes"""
+        self.reset()
+        for timestamp, close in zip(timestamps, closes):
+            self.push(timestamp, close)
+
+    def push(self, timestamp, close):
+        """Append a new candle in O(1)"""
+        if len(self.closes) >= self.short_period:
+            self.short_sum -= self.closes[-self.short_period]
+        if len(self.closes) == self.long_period:
+            self.long_sum -= self.closes[0]
+        self.closes.append(close)
+        self.short_sum += close
+        self.long_sum += close
+        self.last_timestamp = timestamp
+
+        # Periodically resync the sums to stop floating point drift
+        self.pushes += 1
+        if self.pushes % self.long_period == 0:
+            self.resync()
+
+        self.prev_above = self.above if len(self.closes) > 1 else None
+        self.above = self._is_above()
+
+    def replace_last(self, close):
+        """Update the close of the newest (still open) candle in O(1)"""
+        previous_close = self.closes[-1]
+        self.closes[-1] = close
+        self.short_sum += close - previous_close
+        self.long_sum += close - previous_close
+        self.above = self._is_above()
+
+    def resync(self):
+        """Recompute running sums exactly from the stored closes"""
+        closes = list(self.closes)
+        self.short_sum = math.fsum(closes[-self.short_period:])
+        self.long_sum = math.fsum(closes)
+
+    def update(self, rows):
+        """Apply newest-first Bybit kline rows, touching only new candles"""
+        if self.last_timestamp is None:
+            self.seed([int(row[0]) for row in reversed(rows)], [float(row[4]) for row in reversed(rows)])
+            return
+
+        new_rows = []
+        overlaps = False
+        for row in rows:
+            timestamp = int(row[0])
+            if timestamp <= self.last_timestamp:
+                overlaps = timestamp == self.last_timestamp
+                if overlaps:
+                    new_rows.append(row)
+                break
+            new_rows.append(row)
+
+        if not overlaps:
+            # Gap between the stored window and the new data, start over
+            self.seed([int(row[0]) for row in reversed(rows)], [float(row[4]) for row in reversed(rows)])
+            return
+
+        for row in reversed(new_rows):
+            timestamp = int(row[0])
+            if timestamp == self.last_timestamp:
+                self.replace_last(float(row[4]))
+            else:
+                self.push(timestamp, float(row[4]))
+
+    def signal(self):
+        """Crossover signal between the previous and the newest candle"""
+        if self.prev_above is None:
+            return None
+        if self.above and not self.prev_above:
+            return "BUY"
+        if self.prev_above and not self.above:
+            return "SELL"
+        return None
+
+    def _is_above(self):
+        return self.ready and self.ma_short > self.ma_long
 
 class MovingAverageStrategy:
-    def __init__(self, short_period=20, long_period=50):
+    def __init__(self, short_period=20, long_period=50, incremental=False, verify_incremental=False,
+                 use_arrays=False):
         self.short_period = short_period
         self.long_period = long_period
+        self.incremental = incremental
+        self.use_arrays = use_arrays
+        self.verify_incremental = verify_incremental
+        self.states = {}
         self.logger = setup_logger("MovingAverageStrategy")
         
     def calculate_signals(self, df):
-        """Calculate moving average signals"""
+        """Calculate moving average signals for every candle, returning a new frame"""
         try:
             # Calculate moving averages
-            df['ma_short'] = df['close'].rolling(window=self.short_period).mean()
-            df['ma_long'] = df['close'].rolling(window=self.long_period).mean()
+            ma_short = df['close'].rolling(window=self.short_period).mean()
+            ma_long = df['close'].rolling(window=self.long_period).mean()
             
-            # Generate signals
-            df['signal'] = 0
-            df['signal'][self.short_period:] = np.where(
-                df['ma_short'][self.short_period:] > df['ma_long'][self.short_period:], 1, 0
-            )
-            df['position'] = df['signal'].diff()
+            # Generate signals in one array rather than through a chained slice assignment
+            signal = np.where(ma_short.to_numpy() > ma_long.to_numpy(), 1, 0)
+            signal[:self.short_period] = 0
+            signal = pd.Series(signal, index=df.index)
             
-            return df
+            # assign() leaves the caller's frame untouched
+            return df.assign(ma_short=ma_short, ma_long=ma_long, signal=signal, position=signal.diff())
             
         except Exception as e:
             self.logger.error(f"Error calculating signals: {e}")
             return None
     
-    def get_current_signal(self, data):
-        """Get current trading signal"""
+    def get_current_signal(self, data, symbol=None, use_arrays=None):
+        """Get current trading signal from a kline response or a candle window"""
+        if isinstance(data, dict) and 'close' in data:
+            return self.get_signal_from_arrays(data)
+
+        if self.incremental and symbol:
+            return self.get_incremental_signal(symbol, data)
+
+        if use_arrays is None:
+            use_arrays = self.use_arrays
+        if use_arrays:
+            return self.get_signal_from_arrays(self.prepare_arrays(data))
+
         try:
             df = self.prepare_dataframe(data)
             if df is None or len(df) < self.long_period:
                 return None, None, None
             
-            # Calculate signals
-            df = self.calculate_signals(df)
-            if df is None:
-                return None, None, None
-            
-            # Get latest values
-            latest = df.iloc[-1]
-            previous = df.iloc[-2] if len(df) > 1 else None
-            
-            signal = None
-            if previous is not None:
-                if latest['position'] == 1.0:  # Buy signal
-                    signal = "BUY"
-                elif latest['position'] == -1.0:  # Sell signal
-                    signal = "SELL"
-            
-            return signal, latest['ma_short'], latest['ma_long']
+            # Only the last two MA values decide the signal, so read them off the
+            # close column instead of building full-length signal columns
+            return self.get_signal_from_arrays({'close': df['close'].to_numpy()})
             
         except Exception as e:
             self.logger.error(f"Error getting current signal: {e}")
             return None, None, None
+
+    def get_signal_from_arrays(self, arrays):
+        """Get current trading signal from oldest-first columnar arrays"""
+        try:
+            if arrays is None or len(arrays['close']) < self.long_period:
+                return None, None, None
+
+            closes = arrays['close']
+            ma_short = closes[-self.short_period:].mean()
+            ma_long = closes[-self.long_period:].mean()
+            above = ma_short > ma_long
+
+            # Previous candle only has a long MA once we have one extra close
+            prev_above = False
+            if len(closes) > self.long_period:
+                prev_above = closes[-self.short_period - 1:-1].mean() > closes[-self.long_period - 1:-1].mean()
+
+            signal = None
+            if above and not prev_above:
+                signal = "BUY"
+            elif prev_above and not above:
+                signal = "SELL"
+
+            return signal, float(ma_short), float(ma_long)
+
+        except Exception as e:
+            self.logger.error(f"Error getting signal from arrays: {e}")
+            return None, None, None
+
+    def get_batch_signals(self, closes):
+        """Get current signals for many symbols from a (symbols, candles) close matrix
+
+        Rows are oldest-first and aligned on the newest candle; shorter
+        histories are NaN-padded on the left. Returns a list of signals and
+        arrays of short and long MAs, with None/NaN where a row lacks data.
+        """
+        try:
+            closes = np.asarray(closes, dtype=np.float64)
+            if closes.ndim != 2:
+                raise ValueError("closes must be a 2-D (symbols, candles) array")
+            count = len(closes)
+            signals = [None] * count
+            if closes.shape[1] < self.long_period:
+                return signals, np.full(count, np.nan), np.full(count, np.nan)
+
+            # Only the newest long_period + 1 closes matter; one cumulative sum
+            # over that tail gives the current and previous window sums for every row
+            tail = closes[:, -(self.long_period + 1):]
+            available = np.count_nonzero(~np.isnan(tail), axis=1)
+            sums = np.zeros((count, tail.shape[1] + 1))
+            np.cumsum(np.nan_to_num(tail), axis=1, out=sums[:, 1:])
+
+            def window_mean(period, lag):
+                end = sums.shape[1] - 1 - lag
+                return (sums[:, end] - sums[:, end - period]) / period
+
+            ready = available >= self.long_period
+            ma_short = np.where(ready, window_mean(self.short_period, 0), np.nan)
+            ma_long = np.where(ready, window_mean(self.long_period, 0), np.nan)
+            above = ma_short > ma_long
+
+            # Previous candle only has a long MA once a row has one extra close
+            if tail.shape[1] > self.long_period:
+                prev_above = window_mean(self.short_period, 1) > window_mean(self.long_period, 1)
+                prev_above &= available > self.long_period
+            else:
+                prev_above = np.zeros(count, dtype=bool)
+
+            buys = np.flatnonzero(above & ~prev_above)
+            sells = np.flatnonzero(prev_above & ~above)
+            for i in buys:
+                signals[i] = "BUY"
+            for i in sells:
+                signals[i] = "SELL"
+
+            # NaN comparisons are False, so rows without enough data stay signal-free
+            return signals, ma_short, ma_long
+
+        except Exception as e:
+            self.logger.error(f"Error getting batch signals: {e}")
+            return None, None, None
+
+    def get_incremental_signal(self, symbol, data):
+        """Get current trading signal from per-symbol running sums"""
+        try:
+            if not data or 'result' not in data:
+                return None, None, None
+
+            state = self.states.get(symbol)
+            if state is None:
+                state = MovingAverageState(self.short_period, self.long_period)
+                self.states[symbol] = state
+
+            state.update(data['result']['list'])
+            if not state.ready:
+                return None, None, None
+
+            if self.verify_incremental and not self.check_incremental(symbol, data):
+                return self.get_current_signal(data)
+
+            return state.signal(), state.ma_short, state.ma_long
+
+        except Exception as e:
+            self.logger.error(f"Error getting incremental signal for {symbol}: {e}")
+            self.states.pop(symbol, None)
+            return self.get_current_signal(data)
+
+    def seed_state(self, symbol, timestamps, closes):
+        """Build a symbol's incremental MA state from oldest-first history, e.g. candles loaded at startup"""
+        state = MovingAverageState(self.short_period, self.long_period)
+        # One extra close gives the previous candle's MAs, so the first update can report a crossover
+        keep = self.long_period + 1
+        state.seed([int(timestamp) for timestamp in timestamps[-keep:]], [float(close) for close in closes[-keep:]])
+        self.states[symbol] = state
+        return state
+
+    def check_incremental(self, symbol, data, tolerance=1e-9):
+        """Compare incremental state against a full recompute, resetting it on mismatch"""
+        state = self.states.get(symbol)
+        df = self.prepare_dataframe(data)
+        if state is None or df is None or len(df) < self.long_period:
+            return False
+
+        ma_short = df['close'].iloc[-self.short_period:].mean()
+        ma_long = df['close'].iloc[-self.long_period:].mean()
+        if (math.isclose(state.ma_short, ma_short, rel_tol=tolerance)
+                and math.isclose(state.ma_long, ma_long, rel_tol=tolerance)):
+            return True
+
+        self.logger.warning(f"Incremental MA mismatch for {symbol}: "
+                            f"short {state.ma_short} vs {ma_short}, long {state.ma_long} vs {ma_long}")
+        self.states.pop(symbol, None)
+        return False
     
     def prepare_dataframe(self, kline_data):
         """Convert kline data to DataFrame"""
@@ -82,3 +336,15 @@ class MovingAverageStrategy:
         except Exception as e:
             self.logger.error(f"Error preparing dataframe: {e}")
             return None
+
+    def prepare_arrays(self, kline_data):
+        """Convert kline data to columnar NumPy arrays"""
+        try:
+            if not kline_data or 'result' not in kline_data:
+                return None
+
+            return parse_klines(kline_data['result']['list'])
+
+        except Exception as e:
+            self.logger.error(f"Error preparing arrays: {e}")
+            return None
@@ -5,7 +5,7 @@ Test Bybit API connection with the provided credentials
 
 import json
 import sys
-from pybit.unified_trading import HTTP
+from utils.http_client import get_client
 
 def test_api_connection():
     """Test connection to Bybit API"""
@@ -19,11 +19,7 @@ def test_api_connection():
         print(f"Using Testnet: {config['testnet']}")
         
         # Initialize client
-        client = HTTP(
-            api_key=config['api_key'],
-            api_secret=config['api_secret'],
-            testnet=config.get('testnet', True)
-        )
+        client = get_client(config)
         
         # Test connection by getting wallet balance
         print("\nTesting wallet balance retrieval...")
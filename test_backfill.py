@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the resumable history backfill, against a fake kline endpoint
+"""
+
+import os
+import tempfile
+import threading
+from backfill import HistoryBackfill
+from utils.ohlcv_store import OHLCVStore
+
+INTERVAL_MS = 60_000
+START = 1_600_000_000_000 // INTERVAL_MS * INTERVAL_MS
+END = START + 100 * INTERVAL_MS
+
+class FakeKlineClient:
+    """Serves 1-minute klines from ``listed`` on; page starts in ``failing`` fail once each"""
+
+    def __init__(self, listed=START, failing=()):
+        self.listed = listed
+        self.failing = set(failing)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get_kline(self, category="linear", symbol=None, interval="1", start=None, end=None, limit=200):
+        with self.lock:
+            self.requests.append(start)
+            if start in self.failing:
+                self.failing.discard(start)
+                return {'retCode': 10016, 'retMsg': "Server error", 'result': {}}
+        first = max(start, self.listed)
+        timestamps = list(range(first, end + 1, INTERVAL_MS))[:limit]
+        rows = [[str(timestamp), "1", "1", "1", str(timestamp // INTERVAL_MS), "1", "1"]
+                for timestamp in reversed(timestamps)]
+        return {'retCode': 0, 'retMsg': "OK", 'result': {'list': rows}}
+
+def stored(store):
+    return ((store.read("BTCUSDT", "1")['timestamp'] - START) // INTERVAL_MS).tolist()
+
+def backfill(client, root):
+    return HistoryBackfill(client, OHLCVStore(os.path.join(root, "ohlcv")), interval="1", workers=4,
+                           page_size=10, checkpoint_path=os.path.join(root, "checkpoint.json"))
+
+def test_resumes_after_failed_page():
+    """A rerun fetches only the pages from the first failed one on and fills the history in"""
+    with tempfile.TemporaryDirectory() as root:
+        client = FakeKlineClient(failing=[START + 40 * INTERVAL_MS])
+        written = backfill(client, root).run(["BTCUSDT"], START, END)
+        assert written == {"BTCUSDT": 40}
+        assert stored(backfill(client, root).store) == list(range(40))
+
+        client.requests.clear()
+        written = backfill(client, root).run(["BTCUSDT"], START, END)
+        assert written == {"BTCUSDT": 60}
+        assert sorted(client.requests) == [START + page * 10 * INTERVAL_MS for page in range(4, 10)]
+        assert stored(backfill(client, root).store) == list(range(100))
+
+def test_checkpoint_skips_unlisted_history():
+    """Pages before a symbol was listed are not requested again once the checkpoint marks them complete"""
+    with tempfile.TemporaryDirectory() as root:
+        client = FakeKlineClient(listed=START + 35 * INTERVAL_MS)
+        assert backfill(client, root).run(["BTCUSDT"], START, END) == {"BTCUSDT": 65}
+
+        client.requests.clear()
+        assert backfill(client, root).run(["BTCUSDT"], START, END) == {"BTCUSDT": 0}
+        assert client.requests == []
+
+        # Without the checkpoint the empty pages before the listing would be fetched again
+        os.remove(os.path.join(root, "checkpoint.json"))
+        backfill(client, root).run(["BTCUSDT"], START, END)
+        assert len(client.requests) == 4
+
+def test_extends_older_history():
+    """An earlier start merges older pages in front of the stored history"""
+    with tempfile.TemporaryDirectory() as root:
+        client = FakeKlineClient()
+        backfill(client, root).run(["BTCUSDT"], START + 50 * INTERVAL_MS, END)
+        written = backfill(client, root).run(["BTCUSDT"], START, END)
+        assert written == {"BTCUSDT": 50}
+        assert stored(backfill(client, root).store) == list(range(100))
+
+if __name__ == "__main__":
+    for check in [test_resumes_after_failed_page, test_checkpoint_skips_unlisted_history, test_extends_older_history]:
+        check()
+        print(f"✓ {check.__doc__}")
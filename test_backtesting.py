@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the backtesting tools, using synthetic price series
+"""
+
+import numpy as np
+from backtesting import Backtester, GridOptimizer, WalkForward
+
+def trending_prices(count=300):
+    """Flat then steadily rising closes: one upward MA cross and no downward cross"""
+    close = np.concatenate([np.full(count // 2, 100.0), np.linspace(100.0, 130.0, count - count // 2)])
+    return {'open': close.copy(), 'high': close * 1.001, 'low': close * 0.999, 'close': close}
+
+def swinging_prices(count=300):
+    """Closes oscillating around 100, crossing the MAs both ways"""
+    close = 100.0 + 10.0 * np.sin(np.linspace(0.0, 12.0 * np.pi, count))
+    return {'open': close.copy(), 'high': close * 1.001, 'low': close * 0.999, 'close': close}
+
+def test_buys_without_sells():
+    """A history with buy crosses but no sell cross still backtests"""
+    result = Backtester(short_period=5, long_period=20, take_profit_percentage=100.0).run(trending_prices())
+    assert result is not None, "backtest failed"
+    assert result['stats']['trades'] == 1
+    assert result['stats']['exits']['end_of_data'] == 1
+
+def test_optimizer_trending():
+    """A grid sweep over a trending series returns every grid point"""
+    results = GridOptimizer(workers=2).optimize(trending_prices(), [5, 10], [20, 30], [2.0], [50.0, 100.0],
+                                                min_trades=0)
+    assert len(results) == 8, f"expected 8 results, got {len(results)}"
+
+def test_walk_forward_trending():
+    """Walk-forward folds with a buy cross and no sell cross are evaluated, not discarded"""
+    result = WalkForward(train_size=200, test_size=50, min_trades=0).run(trending_prices(), [5], [20], [2.0], [100.0])
+    assert result is not None, "walk-forward failed"
+    assert len(result['folds']) == 2
+
+def test_walk_forward_reuse():
+    """A second run on the same instance matches a fresh instance on that history"""
+    def run(walk_forward, prices):
+        return walk_forward.run(prices, [5], [20], [2.0], [100.0])
+
+    def make():
+        return WalkForward(train_size=200, test_size=50, min_trades=0)
+
+    walk_forward = make()
+    for prices in (trending_prices(), swinging_prices()):
+        reused, fresh = run(walk_forward, prices), run(make(), prices)
+        assert reused is not None and fresh is not None, "walk-forward failed"
+        assert repr(reused) == repr(fresh), "reused instance kept the previous history's crossovers"
+
+if __name__ == "__main__":
+    for check in [test_buys_without_sells, test_optimizer_trending, test_walk_forward_trending,
+                  test_walk_forward_reuse]:
+        check()
+        print(f"✓ {check.__doc__}")
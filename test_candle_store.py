@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the candle ring buffer and store
+"""
+
+import numpy as np
+from utils.candle_store import CandleRingBuffer, CandleStore
+from utils.klines import KLINE_FIELDS
+
+INTERVAL_MS = 60_000
+
+def candles(first, count):
+    """Oldest-first columnar candles whose every price is the candle's index"""
+    index = np.arange(first, first + count, dtype=np.float64)
+    arrays = {field: index.copy() for field in KLINE_FIELDS[1:]}
+    arrays['timestamp'] = np.arange(first, first + count, dtype=np.int64) * INTERVAL_MS
+    return arrays
+
+def test_wraparound():
+    """Appends past capacity keep the newest candles, oldest first, in every window size"""
+    buffer = CandleRingBuffer(capacity=8, interval_ms=INTERVAL_MS)
+    appended = []
+    for i in range(21):
+        buffer.append(i * INTERVAL_MS, [float(i)] * (len(KLINE_FIELDS) - 1))
+        appended.append(i)
+        for count in (1, 3, 8, 20):
+            window = buffer.window(count)
+            expected = appended[-min(count, 8):]
+            assert window['close'].tolist() == expected
+            assert (window['timestamp'] // INTERVAL_MS).tolist() == expected
+    assert len(buffer) == 8
+    assert buffer.last_timestamp == 20 * INTERVAL_MS
+
+def test_window_is_view():
+    """Windows alias the buffer instead of copying it, even across the wrap point"""
+    buffer = CandleRingBuffer(capacity=8, interval_ms=INTERVAL_MS)
+    buffer.extend(candles(0, 13))
+    window = buffer.window(8)
+    assert np.shares_memory(window['close'], buffer.values)
+    assert np.shares_memory(window['timestamp'], buffer.timestamps)
+    assert window['close'].tolist() == list(range(5, 13))
+
+def test_bulk_write_over_capacity():
+    """A bulk write larger than the buffer keeps only its newest candles"""
+    buffer = CandleRingBuffer(capacity=8, interval_ms=INTERVAL_MS)
+    buffer.extend(candles(0, 3))
+    buffer.extend(candles(3, 20))
+    assert buffer.window()['close'].tolist() == list(range(15, 23))
+
+def test_extend_replaces_forming_candle_and_restarts_on_gap():
+    """The newest candle is updated in place, older ones are ignored, and a gap starts over"""
+    buffer = CandleRingBuffer(capacity=8, interval_ms=INTERVAL_MS)
+    buffer.extend(candles(0, 5))
+    update = candles(3, 3)
+    update['close'] = np.array([-1.0, 40.0, 5.0])
+    buffer.extend(update)
+    # Candle 3 is already closed and kept; 4 is the forming candle and takes the new close
+    assert buffer.window()['close'].tolist() == [0, 1, 2, 3, 40, 5]
+
+    buffer.extend(candles(10, 2))
+    assert buffer.window()['close'].tolist() == [10, 11]
+
+def test_store_matrix():
+    """The store aligns symbols on the newest candle and NaN-pads shorter histories"""
+    store = CandleStore(capacity=8)
+    store.extend("BTCUSDT", "1", candles(0, 6))
+    store.extend("ETHUSDT", "1", candles(0, 2))
+    matrix = store.matrix(["BTCUSDT", "ETHUSDT", "SOLUSDT"], "1", 4)
+    assert matrix[0].tolist() == [2, 3, 4, 5]
+    assert np.isnan(matrix[1, :2]).all() and matrix[1, 2:].tolist() == [0, 1]
+    assert np.isnan(matrix[2]).all()
+
+if __name__ == "__main__":
+    for check in [test_wraparound, test_window_is_view, test_bulk_write_over_capacity,
+                  test_extend_replaces_forming_candle_and_restarts_on_gap, test_store_matrix]:
+        check()
+        print(f"✓ {check.__doc__}")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Offline checks for order sizing against instrument filters
+"""
+
+from utils.instruments import size_order
+
+BTC_FILTERS = {'qty_step': 0.001, 'min_qty': 0.001, 'max_qty': 100.0, 'max_market_qty': 50.0,
+               'min_notional': 5.0, 'tick_size': 0.1}
+
+def test_floors_to_lot_step():
+    """Quantities are floored to the lot step"""
+    assert size_order(10000, 65000, "BTCUSDT", BTC_FILTERS) == 0.015
+
+def test_raises_to_min_notional():
+    """Orders below the minimum order value are raised to it when the balance allows"""
+    # 0.001 ETH is worth 2 USDT, so the order is raised to 0.003 (6 USDT)
+    assert size_order(20, 2000, "ETHUSDT", BTC_FILTERS) == 0.003
+
+def test_min_qty_above_balance():
+    """The minimum quantity is not ordered when it is worth more than the balance"""
+    assert size_order(30, 65000, "BTCUSDT", BTC_FILTERS) == 0.0
+
+def test_min_notional_above_balance():
+    """The minimum order value is not ordered when it is more than the balance"""
+    assert size_order(4, 2000, "ETHUSDT", BTC_FILTERS) == 0.0
+
+if __name__ == "__main__":
+    for check in [test_floors_to_lot_step, test_raises_to_min_notional, test_min_qty_above_balance,
+                  test_min_notional_above_balance]:
+        check()
+        print(f"✓ {check.__doc__}")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the closed-candle kline cache, against a fake exchange clock
+"""
+
+import random
+from utils.kline_cache import KlineCache
+
+INTERVAL_MS = 300_000
+
+class FakeKlineClient:
+    """Serves newest-first 5-minute klines up to ``now``; the forming candle's close moves with time"""
+
+    def __init__(self, now_ms):
+        self.now_ms = now_ms
+        self.calls = []
+        # Shifts every candle's open time, as if the exchange's history no longer lined up
+        self.offset_ms = 0
+
+    def clock(self):
+        return self.now_ms / 1000
+
+    def row(self, timestamp):
+        close = timestamp / INTERVAL_MS
+        if timestamp + INTERVAL_MS > self.now_ms:
+            close += (self.now_ms - timestamp) / INTERVAL_MS
+        return [str(timestamp), str(close), str(close + 1), str(close - 1), str(close), "1", "1"]
+
+    def get_kline(self, category="linear", symbol=None, interval="5", limit=200, start=None):
+        self.calls.append({'limit': limit, 'start': start})
+        newest = (self.now_ms - self.offset_ms) // INTERVAL_MS * INTERVAL_MS + self.offset_ms
+        timestamps = range(newest, newest - limit * INTERVAL_MS, -INTERVAL_MS)
+        rows = [self.row(timestamp) for timestamp in timestamps if start is None or timestamp >= start]
+        return {'retCode': 0, 'retMsg': "OK", 'result': {'symbol': symbol, 'category': category, 'list': rows}}
+
+def test_delta_matches_uncached():
+    """Cached responses equal uncached ones while only the new candles are requested"""
+    random.seed(3)
+    client = FakeKlineClient(now_ms=1_700_000_000_000)
+    cache = KlineCache(client, clock=client.clock)
+    for _ in range(200):
+        client.now_ms += random.choice([1_000, 60_000, INTERVAL_MS, 3 * INTERVAL_MS + 7_000])
+        cached = cache.get_kline(symbol="BTCUSDT", interval="5", limit=100)
+        client.calls.clear()
+        assert cached == client.get_kline(symbol="BTCUSDT", interval="5", limit=100)
+
+    client.calls.clear()
+    client.now_ms += INTERVAL_MS
+    cache.get_kline(symbol="BTCUSDT", interval="5", limit=100)
+    assert len(client.calls) == 1 and client.calls[0]['start'] is not None and client.calls[0]['limit'] <= 4, \
+        "expected one small delta request"
+
+def test_restarts_on_mismatch():
+    """A delta that does not line up with the cache triggers a full refetch"""
+    client = FakeKlineClient(now_ms=1_700_000_000_000)
+    cache = KlineCache(client, clock=client.clock)
+    cache.get_kline(symbol="BTCUSDT", interval="5", limit=100)
+
+    client.offset_ms = 60_000
+    client.now_ms += INTERVAL_MS
+    client.calls.clear()
+    cached = cache.get_kline(symbol="BTCUSDT", interval="5", limit=100)
+    assert [call['start'] is None for call in client.calls] == [False, True]
+    client.calls.clear()
+    assert cached == client.get_kline(symbol="BTCUSDT", interval="5", limit=100)
+
+def test_open_candle_fills_limit():
+    """A limit of one returns just the forming candle"""
+    client = FakeKlineClient(now_ms=1_700_000_000_000)
+    cache = KlineCache(client, clock=client.clock)
+    cache.get_kline(symbol="BTCUSDT", interval="5", limit=100)
+    client.now_ms += 1_000
+    cached = cache.get_kline(symbol="BTCUSDT", interval="5", limit=1)
+    assert cached == client.get_kline(symbol="BTCUSDT", interval="5", limit=1)
+
+if __name__ == "__main__":
+    for check in [test_delta_matches_uncached, test_restarts_on_mismatch, test_open_candle_fills_limit]:
+        check()
+        print(f"✓ {check.__doc__}")
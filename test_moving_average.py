@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the incremental moving average state, using synthetic klines
+"""
+
+import math
+import numpy as np
+from strategies.moving_average import MovingAverageStrategy
+
+INTERVAL_MS = 300_000
+
+def kline_response(candles, limit=100):
+    """Newest-first Bybit kline response for the last ``limit`` (timestamp, close) candles"""
+    rows = [[str(timestamp), str(close), str(close), str(close), str(close), "1", "1"]
+            for timestamp, close in reversed(candles[-limit:])]
+    return {'retCode': 0, 'result': {'list': rows}}
+
+def candle_stream(steps=400, seed=1):
+    """Kline responses as a stream sees them: forming-candle updates, new candles and one gap"""
+    rng = np.random.default_rng(seed)
+    candles = [(i * INTERVAL_MS, 100.0 + i * 0.01) for i in range(60)]
+    for step in range(steps):
+        timestamp, close = candles[-1]
+        close = 100.0 + 5.0 * math.sin(step / 15.0) + rng.normal(0, 0.3)
+        if step == steps // 2:
+            # Candles missed while disconnected; the next response no longer overlaps the state
+            candles.extend((timestamp + i * INTERVAL_MS, close) for i in range(1, 150))
+        elif rng.random() < 0.5:
+            candles[-1] = (timestamp, close)
+        else:
+            candles.append((timestamp + INTERVAL_MS, close))
+        yield kline_response(candles)
+
+def test_incremental_matches_recompute():
+    """Incremental signals and MAs match a full recompute on every update"""
+    incremental = MovingAverageStrategy(short_period=5, long_period=20, incremental=True)
+    full = MovingAverageStrategy(short_period=5, long_period=20)
+    signals = set()
+    for response in candle_stream():
+        signal, ma_short, ma_long = incremental.get_current_signal(response, "BTCUSDT")
+        expected_signal, expected_short, expected_long = full.get_current_signal(response)
+        assert signal == expected_signal
+        assert math.isclose(ma_short, expected_short, rel_tol=1e-9)
+        assert math.isclose(ma_long, expected_long, rel_tol=1e-9)
+        signals.add(signal)
+    assert {"BUY", "SELL"} <= signals, "stream produced no crossovers to compare"
+
+def test_seeded_state_reports_next_cross():
+    """State seeded from stored history reports the same signal as a recompute on the next update"""
+    incremental = MovingAverageStrategy(short_period=5, long_period=20, incremental=True)
+    full = MovingAverageStrategy(short_period=5, long_period=20)
+    responses = list(candle_stream(steps=120, seed=2))
+    rows = list(reversed(responses[-2]['result']['list']))
+    incremental.seed_state("BTCUSDT", [int(row[0]) for row in rows], [float(row[4]) for row in rows])
+
+    signal, ma_short, _ = incremental.get_current_signal(responses[-1], "BTCUSDT")
+    expected_signal, expected_short, _ = full.get_current_signal(responses[-1])
+    assert signal == expected_signal
+    assert math.isclose(ma_short, expected_short, rel_tol=1e-9)
+
+if __name__ == "__main__":
+    for check in [test_incremental_matches_recompute, test_seeded_state_reports_next_cross]:
+        check()
+        print(f"✓ {check.__doc__}")
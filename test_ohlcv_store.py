@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the on-disk candle store, in a temporary directory
+"""
+
+import os
+import tempfile
+import numpy as np
+from utils.ohlcv_store import OHLCVStore, MERGE_MARKER, ROW_BYTES
+from utils.klines import KLINE_FIELDS
+
+INTERVAL_MS = 60_000
+NOW_MS = 1_000 * INTERVAL_MS
+
+def candles(first, count):
+    """Oldest-first columnar 1-minute candles whose every price is the candle's index"""
+    index = np.arange(first, first + count, dtype=np.float64)
+    arrays = {field: index.copy() for field in KLINE_FIELDS[1:]}
+    arrays['timestamp'] = np.arange(first, first + count, dtype=np.int64) * INTERVAL_MS
+    return arrays
+
+def stored(store):
+    return (store.read("BTCUSDT", "1")['timestamp'] // INTERVAL_MS).tolist()
+
+def test_append():
+    """Appends keep only closed candles newer than the last stored one"""
+    with tempfile.TemporaryDirectory() as root:
+        store = OHLCVStore(root)
+        assert store.append("BTCUSDT", "1", candles(0, 5), now_ms=NOW_MS) == 5
+        assert store.append("BTCUSDT", "1", candles(3, 4), now_ms=NOW_MS) == 2
+        # Candle 999 closes at NOW_MS; candle 1000 is still forming
+        assert store.append("BTCUSDT", "1", candles(998, 3), now_ms=NOW_MS) == 2
+        assert stored(store) == [0, 1, 2, 3, 4, 5, 6, 998, 999]
+        assert store.read("BTCUSDT", "1", start=2 * INTERVAL_MS, end=5 * INTERVAL_MS)['close'].tolist() == [2, 3, 4]
+        assert store.read("BTCUSDT", "1", count=2)['close'].tolist() == [998, 999]
+        assert store.last_timestamp("BTCUSDT", "1") == 999 * INTERVAL_MS
+        assert store.symbols("1") == ["BTCUSDT"] and store.symbols("5") == []
+
+def test_merge():
+    """Older and interleaved history is merged in order; stored candles win over duplicates"""
+    with tempfile.TemporaryDirectory() as root:
+        store = OHLCVStore(root)
+        store.append("BTCUSDT", "1", candles(10, 5), now_ms=NOW_MS)
+        columns = store.read("BTCUSDT", "1")
+
+        older = candles(0, 12)
+        older['close'][:] = -1
+        assert store.merge("BTCUSDT", "1", older, now_ms=NOW_MS) == 10
+        assert stored(store) == list(range(15))
+        assert store.read("BTCUSDT", "1")['close'].tolist() == [-1] * 10 + [10, 11, 12, 13, 14]
+        assert store.first_timestamp("BTCUSDT", "1") == 0
+        # Slices taken before the merge still read the old files
+        assert columns['close'].tolist() == [10, 11, 12, 13, 14]
+        assert not any(name.endswith(".merge") for name in os.listdir(store.directory("BTCUSDT", "1")))
+
+def test_interrupted_append_repaired():
+    """Rows past the shortest column are ignored by readers and truncated by the next append"""
+    with tempfile.TemporaryDirectory() as root:
+        store = OHLCVStore(root)
+        store.append("BTCUSDT", "1", candles(0, 3), now_ms=NOW_MS)
+        # A crash after writing the next candle's timestamp and open, but not the rest
+        for field in ('timestamp', 'open'):
+            with open(store.path("BTCUSDT", "1", field), 'ab') as file:
+                file.write(np.zeros(1, dtype=np.int64).tobytes())
+        assert store.count("BTCUSDT", "1") == 3
+        assert stored(store) == [0, 1, 2]
+
+        assert store.append("BTCUSDT", "1", candles(3, 2), now_ms=NOW_MS) == 2
+        assert stored(store) == [0, 1, 2, 3, 4]
+        assert store.read("BTCUSDT", "1")['open'].tolist() == [0, 1, 2, 3, 4]
+        sizes = {os.path.getsize(store.path("BTCUSDT", "1", field)) for field in KLINE_FIELDS}
+        assert sizes == {5 * ROW_BYTES}
+
+def stage_merge(store, arrays):
+    """Write merged columns to their .merge files, as a merge that crashed before its renames"""
+    for field in KLINE_FIELDS:
+        with open(f"{store.path('BTCUSDT', '1', field)}.merge", 'wb') as file:
+            file.write(np.asarray(arrays[field]).astype(np.int64 if field == 'timestamp' else np.float64).tobytes())
+
+def test_pending_merge_recovered():
+    """With the marker in place, the next lock finishes the merge; without it the staged files are dropped"""
+    with tempfile.TemporaryDirectory() as root:
+        store = OHLCVStore(root)
+        store.append("BTCUSDT", "1", candles(5, 3), now_ms=NOW_MS)
+        directory = store.directory("BTCUSDT", "1")
+
+        stage_merge(store, candles(0, 8))
+        open(os.path.join(directory, MERGE_MARKER), 'w').close()
+        restarted = OHLCVStore(root)
+        with restarted.locked("BTCUSDT", "1"):
+            pass
+        assert stored(restarted) == list(range(8))
+        assert not os.path.exists(os.path.join(directory, MERGE_MARKER))
+
+        stage_merge(restarted, candles(0, 2))
+        restarted = OHLCVStore(root)
+        assert restarted.append("BTCUSDT", "1", candles(8, 1), now_ms=NOW_MS) == 1
+        assert stored(restarted) == list(range(9))
+        assert not any(name.endswith(".merge") for name in os.listdir(directory))
+
+def test_rejects_path_components():
+    """Symbols and intervals that could escape the store directory are refused"""
+    store = OHLCVStore(tempfile.gettempdir())
+    for symbol, interval in [("../BTCUSDT", "1"), ("BTCUSDT", "../1"), ("", "1"), ("BTCUSDT", "7")]:
+        try:
+            store.directory(symbol, interval)
+        except ValueError:
+            continue
+        raise AssertionError(f"{symbol!r} {interval!r} should be rejected")
+
+if __name__ == "__main__":
+    for check in [test_append, test_merge, test_interrupted_append_repaired, test_pending_merge_recovered,
+                  test_rejects_path_components]:
+        check()
+        print(f"✓ {check.__doc__}")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the token buckets and the priority request scheduler
+"""
+
+import threading
+import time
+from utils.rate_limiter import (
+    TokenBucket, RequestScheduler, PRIORITY_ORDER, PRIORITY_ACCOUNT, PRIORITY_MARKET
+)
+
+def test_headers_correct_bucket():
+    """X-Bapi-Limit sets the rate, Limit-Status caps the tokens, and a spent limit blocks until reset"""
+    bucket = TokenBucket(rate=10)
+    bucket.update(limit=20, remaining=5)
+    assert bucket.rate == bucket.capacity == 20
+    assert 5 <= bucket.tokens < 5.1
+
+    # Remaining never adds tokens the local bucket has already spent
+    bucket.tokens = 1
+    bucket.update(remaining=15)
+    assert bucket.tokens < 1.1
+
+    reset_ms = int((time.time() + 2) * 1000)
+    bucket.update(remaining=0, reset_ms=reset_ms)
+    now = time.monotonic()
+    assert 1.5 < bucket.wait_time(now) <= 2.0
+
+def test_scheduler_reads_headers():
+    """Response headers reach the group's bucket; responses without them change nothing"""
+    scheduler = RequestScheduler({'market': 100})
+    scheduler.update_from_headers('market', {'X-Bapi-Limit': "50", 'X-Bapi-Limit-Status': "0",
+                                             'X-Bapi-Limit-Reset-Timestamp': str(int((time.time() + 1) * 1000))})
+    bucket = scheduler.bucket('market')
+    assert bucket.rate == 50
+    assert bucket.wait_time(time.monotonic()) > 0.5
+
+    scheduler.update_from_headers('account', {'X-Bapi-Limit': "5"})
+    scheduler.update_from_headers('account', {'X-Bapi-Limit-Status': "not a number"})
+    assert scheduler.bucket('account').rate == 50
+
+def test_priority_order():
+    """Queued order requests are served before account reads, then market reads, regardless of arrival"""
+    scheduler = RequestScheduler({'market': 20})
+    scheduler.bucket('market').tokens = 0
+    served = []
+
+    def request(priority):
+        scheduler.acquire('market', priority, timeout=5)
+        served.append(priority)
+
+    threads = []
+    for priority in (PRIORITY_MARKET, PRIORITY_MARKET, PRIORITY_ACCOUNT, PRIORITY_ORDER):
+        thread = threading.Thread(target=request, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        # Wait for each request to queue so arrival order is fixed
+        while len(scheduler.waiting['market']) < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+
+    assert served == [PRIORITY_ORDER, PRIORITY_ACCOUNT, PRIORITY_MARKET, PRIORITY_MARKET]
+    assert scheduler.stats['requests'] == 4
+
+def test_acquire_timeout_leaves_queue():
+    """A request that times out gives up its place instead of blocking the ones behind it"""
+    scheduler = RequestScheduler({'order': 1})
+    scheduler.block('order', seconds=10)
+    try:
+        scheduler.acquire('order', PRIORITY_ORDER, timeout=0.05)
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("acquire should have timed out")
+    assert scheduler.waiting['order'] == []
+    assert scheduler.stats['rate_limited'] == 1
+
+if __name__ == "__main__":
+    for check in [test_headers_correct_bucket, test_scheduler_reads_headers, test_priority_order,
+                  test_acquire_timeout_leaves_queue]:
+        check()
+        print(f"✓ {check.__doc__}")
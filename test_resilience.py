@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Offline checks for the circuit breaker and the retrying client, on a fake clock
+"""
+
+from utils.resilience import (
+    CircuitBreaker, CircuitOpenError, ResilientClient, DUPLICATE_ORDER_RET_CODE
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class ExchangeError(Exception):
+    """Stands in for pybit's InvalidRequestError, which carries the retCode"""
+
+    def __init__(self, status_code):
+        super().__init__(f"retCode {status_code}")
+        self.status_code = status_code
+
+class ScriptedClient:
+    """Raises or returns the scripted outcomes in turn, recording each call's kwargs"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def place_order(self, **kwargs):
+        return self.respond(kwargs)
+
+    def get_tickers(self, **kwargs):
+        return self.respond(kwargs)
+
+    def respond(self, kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+OK = {'retCode': 0, 'retMsg': "OK", 'result': {}}
+
+def test_breaker_states():
+    """closed -> open after the threshold, half_open after the timeout, one trial, then closed"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    assert breaker.state == "closed"
+    assert breaker.record_failure() is False
+    assert breaker.record_failure() is False
+    assert breaker.record_failure() is True
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow(), "only one trial call while half open"
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+def test_failed_trial_reopens():
+    """A failed half-open trial restarts the open period without counting as a new opening"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.record_failure() is False
+    assert breaker.state == "open"
+    clock.now += 29
+    assert breaker.state == "open"
+
+def test_client_fails_fast_when_open():
+    """The client opens an endpoint's circuit on repeated timeouts and stops calling it"""
+    clock = FakeClock()
+    client = ScriptedClient(*[TimeoutError("read timed out")] * 3)
+    resilient = ResilientClient(client, max_retries=5, failure_threshold=3, reset_timeout=30,
+                                clock=clock, sleep=clock.sleep)
+    try:
+        resilient.get_tickers(category="linear")
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("expected the last timeout to be raised")
+    assert len(client.calls) == 3
+
+    try:
+        resilient.get_tickers(category="linear")
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("expected the open circuit to fail fast")
+    assert len(client.calls) == 3
+    metrics = resilient.metrics()['get_tickers']
+    assert metrics['circuit'] == "open" and metrics['circuit_opened'] == 1 and metrics['short_circuited'] == 1
+
+def test_order_without_link_id_not_retried():
+    """A timed-out order without an orderLinkId is raised rather than resent"""
+    clock = FakeClock()
+    client = ScriptedClient(TimeoutError("read timed out"), OK)
+    resilient = ResilientClient(client, clock=clock, sleep=clock.sleep)
+    try:
+        resilient.place_order(category="linear", symbol="BTCUSDT", side="Buy", qty="0.01")
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("order without orderLinkId must not be retried")
+    assert len(client.calls) == 1
+
+def test_order_with_link_id_retried():
+    """An order with an orderLinkId is resent, and a duplicate rejection counts as accepted"""
+    clock = FakeClock()
+    client = ScriptedClient(TimeoutError("read timed out"), OK)
+    resilient = ResilientClient(client, clock=clock, sleep=clock.sleep)
+    order = dict(category="linear", symbol="BTCUSDT", side="Buy", qty="0.01", orderLinkId="bot-1")
+    assert resilient.place_order(**order) == OK
+    assert [call['orderLinkId'] for call in client.calls] == ["bot-1", "bot-1"]
+
+    client = ScriptedClient(TimeoutError("read timed out"), ExchangeError(DUPLICATE_ORDER_RET_CODE))
+    resilient = ResilientClient(client, clock=clock, sleep=clock.sleep)
+    response = resilient.place_order(**order)
+    assert response['retCode'] == 0 and response['result']['orderLinkId'] == "bot-1"
+
+def test_business_errors_not_retried():
+    """Rejections that are not transient are raised at once and leave the circuit closed"""
+    clock = FakeClock()
+    client = ScriptedClient(ExchangeError(110007), OK)
+    resilient = ResilientClient(client, failure_threshold=1, clock=clock, sleep=clock.sleep)
+    try:
+        resilient.get_tickers(category="linear")
+    except ExchangeError:
+        pass
+    else:
+        raise AssertionError("business error should be raised")
+    assert len(client.calls) == 1
+    assert resilient.metrics()['get_tickers']['circuit'] == "closed"
+
+if __name__ == "__main__":
+    for check in [test_breaker_states, test_failed_trial_reopens, test_client_fails_fast_when_open,
+                  test_order_without_link_id_not_retried, test_order_with_link_id_retried,
+                  test_business_errors_not_retried]:
+        check()
+        print(f"✓ {check.__doc__}")
@@ -1,3 +1,21 @@
 from .logger import setup_logger
+from .klines import parse_klines, interval_to_ms, KLINE_FIELDS
+from .candle_store import CandleRingBuffer, CandleStore, get_candle_store
+from .ohlcv_store import OHLCVStore, get_ohlcv_store
+from .kline_cache import KlineCache
+from .market_stream import MarketDataStream
+from .scheduler import CandleScheduler
+from .account import AccountSnapshot, parse_position
+from .instruments import InstrumentCache, round_to_step, size_order
+from .rate_limiter import RequestScheduler, RateLimitedClient, get_request_scheduler
+from .resilience import ResilientClient, CircuitBreaker, CircuitOpenError
+from .http_client import create_client, get_client, get_latency_histogram, LatencyHistogram
 
-__all__ = ['setup_logger']
+__all__ = ['setup_logger', 'parse_klines', 'interval_to_ms', 'KLINE_FIELDS',
+           'CandleRingBuffer', 'CandleStore', 'get_candle_store', 'OHLCVStore',
+           'get_ohlcv_store', 'KlineCache',
+           'MarketDataStream', 'CandleScheduler', 'AccountSnapshot',
+           'parse_position', 'InstrumentCache', 'round_to_step', 'size_order',
+           'RequestScheduler', 'RateLimitedClient', 'get_request_scheduler',
+           'ResilientClient', 'CircuitBreaker', 'CircuitOpenError',
+           'create_client', 'get_client', 'get_latency_histogram', 'LatencyHistogram']
@@ -0,0 +1,156 @@
+import threading
+import time
+
+# Bybit returns at most this many positions per page
+POSITIONS_PAGE_LIMIT = 200
+
+def parse_position(position_data):
+    """Convert a raw Bybit position into the bot's position dict"""
+    position_value = float(position_data.get('positionValue') or 0)
+    unrealized_pnl = float(position_data.get('unrealisedPnl') or 0)
+    return {
+        'symbol': position_data['symbol'],
+        'side': position_data['side'],
+        'size': float(position_data['size']),
+        'avg_price': float(position_data['avgPrice']) if position_data.get('avgPrice') else 0,
+        'unrealized_pnl': unrealized_pnl,
+        'percentage': unrealized_pnl / position_value * 100 if position_value > 0 else 0
+    }
+
+def index_positions(positions, rows):
+    """Add a page of raw Bybit positions to a dict keyed by symbol"""
+    for position_data in rows:
+        position = parse_position(position_data)
+        # In hedge mode a symbol has one entry per side; prefer the open one
+        existing = positions.get(position['symbol'])
+        if existing is None or (existing['size'] == 0 and position['size'] > 0):
+            positions[position['symbol']] = position
+    return positions
+
+class AccountSnapshot:
+    """Cycle-scoped view of wallet balances and positions
+
+    Balances for every coin come from a single wallet request, and all
+    linear positions for the settle coin from one paginated position
+    request indexed by symbol. Call ``invalidate()`` at the start of a cycle
+    and after fills so the next read fetches fresh data. Requests run
+    outside the lock, which only guards the cached dicts, so workers reading
+    different symbols do not queue behind one another's round trips.
+    """
+
+    def __init__(self, client, account_type="UNIFIED", settle_coin="USDT"):
+        self.client = client
+        self.account_type = account_type
+        self.settle_coin = settle_coin
+        self.balances = None
+        self.positions = None
+        self.stale_symbols = set()
+        self.fetched_at = None
+        # Bumped by invalidate(); a fetch that overlapped one is returned but not cached
+        self.generation = 0
+        self.lock = threading.RLock()
+
+    def load_wallet(self, response, generation=None):
+        """Index every coin of a ``get_wallet_balance`` response and return the balances"""
+        if response['retCode'] != 0:
+            raise RuntimeError(response['retMsg'])
+
+        balances = {}
+        for account in response['result']['list']:
+            for coin_data in account.get('coin', []):
+                balances[coin_data['coin']] = {
+                    'wallet_balance': float(coin_data.get('walletBalance') or 0),
+                    'available': float(coin_data.get('availableToWithdraw') or 0),
+                    'equity': float(coin_data.get('equity') or 0),
+                    'unrealized_pnl': float(coin_data.get('unrealisedPnl') or 0)
+                }
+
+        with self.lock:
+            if generation is None or generation == self.generation:
+                self.balances = balances
+                self.fetched_at = time.time()
+        return balances
+
+    def refresh(self):
+        """Fetch balances for all coins in one request"""
+        generation = self.generation
+        return self.load_wallet(self.client.get_wallet_balance(accountType=self.account_type), generation)
+
+    def balance(self, coin="USDT"):
+        """Available balance for a coin, fetching the wallet once per snapshot"""
+        balances = self.balances
+        if balances is None:
+            balances = self.refresh()
+        return balances.get(coin, {}).get('available', 0.0)
+
+    def fetch_positions(self, **params):
+        """Page through ``get_positions`` and index the results by symbol"""
+        positions = {}
+        cursor = None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get_positions(category="linear", limit=POSITIONS_PAGE_LIMIT, **params)
+            if response['retCode'] != 0:
+                raise RuntimeError(response['retMsg'])
+
+            index_positions(positions, response['result']['list'])
+            cursor = response['result'].get('nextPageCursor')
+            if not cursor or not response['result']['list']:
+                return positions
+
+    def refresh_positions(self):
+        """Fetch every linear position for the settle coin in bulk"""
+        generation = self.generation
+        positions = self.fetch_positions(settleCoin=self.settle_coin)
+        with self.lock:
+            if generation == self.generation:
+                self.positions = positions
+                self.stale_symbols.clear()
+                self.fetched_at = time.time()
+        return positions
+
+    def position(self, symbol):
+        """Position for a symbol, or None when flat"""
+        with self.lock:
+            positions, stale, generation = self.positions, symbol in self.stale_symbols, self.generation
+        if positions is None:
+            return self.refresh_positions().get(symbol)
+        if not stale:
+            return positions.get(symbol)
+
+        # Only this symbol changed since the bulk load, so refetch just it
+        fetched = self.fetch_positions(symbol=symbol)
+        with self.lock:
+            if generation == self.generation:
+                self.positions.update(fetched)
+                self.stale_symbols.discard(symbol)
+        return fetched.get(symbol)
+
+    def all_positions(self):
+        """Every position in the snapshot, keyed by symbol"""
+        with self.lock:
+            positions = None if self.stale_symbols else self.positions
+        if positions is None:
+            positions = self.refresh_positions()
+        with self.lock:
+            return dict(positions)
+
+    def invalidate(self, symbol=None, balances=True):
+        """Drop cached positions (all, or just one symbol's) and optionally the balances"""
+        with self.lock:
+            self.generation += 1
+            if balances:
+                self.balances = None
+            if symbol is None:
+                self.positions = None
+                self.stale_symbols.clear()
+            elif self.positions is not None:
+                self.positions.pop(symbol, None)
+                self.stale_symbols.add(symbol)
+
+    def expire(self, max_age):
+        """Invalidate everything if the snapshot is older than ``max_age`` seconds"""
+        with self.lock:
+            if self.fetched_at is None or time.time() - self.fetched_at > max_age:
+                self.invalidate()
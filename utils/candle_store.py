@@ -0,0 +1,178 @@
+import threading
+import numpy as np
+from .klines import parse_klines, interval_to_ms, KLINE_FIELDS
+
+class CandleRingBuffer:
+    """Fixed-capacity OHLCV ring buffer with zero-copy window views
+
+    Every candle is written twice, at ``i`` and ``i + capacity``, so any
+    window of up to ``capacity`` candles is one contiguous slice and can be
+    handed out as a view without copying or reordering.
+    """
+
+    def __init__(self, capacity=1000, interval_ms=None):
+        self.capacity = capacity
+        self.interval_ms = interval_ms
+        self.timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.values = np.zeros((len(KLINE_FIELDS) - 1, 2 * capacity), dtype=np.float64)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last_timestamp(self):
+        if not self.size:
+            return None
+        return int(self.timestamps[self.head - 1 + self.capacity])
+
+    def clear(self):
+        """Drop all stored candles"""
+        self.head = 0
+        self.size = 0
+
+    def append(self, timestamp, values):
+        """Append a candle in O(1), overwriting the oldest one when full"""
+        index = self.head
+        self.timestamps[index] = self.timestamps[index + self.capacity] = timestamp
+        self.values[:, index] = self.values[:, index + self.capacity] = values
+        self.head = (index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def replace_last(self, values):
+        """Overwrite the newest candle in place"""
+        index = (self.head - 1) % self.capacity
+        self.values[:, index] = self.values[:, index + self.capacity] = values
+
+    def extend(self, arrays):
+        """Merge oldest-first columnar arrays, replacing the newest candle if it reappears"""
+        timestamps = arrays['timestamp']
+        if not len(timestamps):
+            return
+
+        values = np.vstack([arrays[field] for field in KLINE_FIELDS[1:]])
+        last_timestamp = self.last_timestamp
+        if last_timestamp is not None and self.interval_ms and timestamps[0] > last_timestamp + self.interval_ms:
+            # Missing candles between what we hold and the new data
+            self.clear()
+            last_timestamp = None
+
+        if last_timestamp is not None:
+            if timestamps[-1] < last_timestamp:
+                return
+            start = int(np.searchsorted(timestamps, last_timestamp))
+            if timestamps[start] == last_timestamp:
+                self.replace_last(values[:, start])
+                start += 1
+            timestamps = timestamps[start:]
+            values = values[:, start:]
+
+        self.write(timestamps, values)
+
+    def write(self, timestamps, values):
+        """Bulk-append candles newer than the newest stored one"""
+        count = len(timestamps)
+        if not count:
+            return
+        if count > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = values[:, -self.capacity:]
+            count = self.capacity
+
+        positions = (self.head + np.arange(count)) % self.capacity
+        self.timestamps[positions] = self.timestamps[positions + self.capacity] = timestamps
+        self.values[:, positions] = self.values[:, positions + self.capacity] = values
+        self.head = (self.head + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def window(self, count=None):
+        """Return the newest ``count`` candles as oldest-first array views
+
+        The views alias the buffer, so copy them before the next append if
+        they must outlive it.
+        """
+        count = self.size if count is None else min(count, self.size)
+        end = self.head if self.head >= count else self.head + self.capacity
+        start = end - count
+
+        window = {'timestamp': self.timestamps[start:end]}
+        for i, field in enumerate(KLINE_FIELDS[1:]):
+            window[field] = self.values[i, start:end]
+        return window
+
+class CandleStore:
+    """Process-wide candle buffers keyed by (symbol, interval)"""
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def buffer(self, symbol, interval):
+        """Get or create the ring buffer for a symbol and interval"""
+        key = (symbol, str(interval))
+        with self.lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = CandleRingBuffer(self.capacity, interval_to_ms(interval))
+                self.buffers[key] = buffer
+            return buffer
+
+    def ingest(self, symbol, interval, kline_data):
+        """Merge a Bybit kline response, parsing only candles we do not hold yet"""
+        if not kline_data or 'result' not in kline_data:
+            return
+
+        buffer = self.buffer(symbol, interval)
+        rows = kline_data['result']['list']
+        last_timestamp = buffer.last_timestamp
+
+        # Rows are newest-first, so stop at the first candle we already have
+        if last_timestamp is not None:
+            for i, row in enumerate(rows):
+                if int(row[0]) <= last_timestamp:
+                    rows = rows[:i + 1]
+                    break
+
+        arrays = parse_klines(rows)
+        if arrays is None:
+            return
+        with self.lock:
+            buffer.extend(arrays)
+
+    def extend(self, symbol, interval, arrays):
+        """Merge oldest-first columnar arrays, e.g. history loaded from disk"""
+        buffer = self.buffer(symbol, interval)
+        with self.lock:
+            buffer.extend(arrays)
+
+    def clear(self, symbol, interval):
+        """Drop a symbol's buffered candles, e.g. before refetching a window that cannot be extended"""
+        buffer = self.buffer(symbol, interval)
+        with self.lock:
+            buffer.clear()
+
+    def window(self, symbol, interval, count=None):
+        """Newest candles for a symbol as oldest-first array views"""
+        return self.buffer(symbol, interval).window(count)
+
+    def matrix(self, symbols, interval, count, field='close'):
+        """One field for many symbols as a (symbols, count) array, NaN-padded on the left"""
+        matrix = np.full((len(symbols), count), np.nan)
+        for i, symbol in enumerate(symbols):
+            values = self.window(symbol, interval, count)[field]
+            if len(values):
+                matrix[i, count - len(values):] = values
+        return matrix
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_candle_store(capacity=1000):
+    """Get the candle store shared by the bot and the dashboards"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CandleStore(capacity)
+        return _default_store
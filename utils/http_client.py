@@ -0,0 +1,135 @@
+import bisect
+import socket
+import threading
+from urllib.parse import urlparse
+from pybit.unified_trading import HTTP
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from .rate_limiter import RateLimitedClient, get_request_scheduler
+from .resilience import ResilientClient
+
+# Upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+class LatencyHistogram:
+    """Bucketed request latencies per API path"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, path, seconds):
+        index = bisect.bisect_left(self.buckets, seconds * 1000)
+        with self.lock:
+            counts = self.counts.get(path)
+            if counts is None:
+                # One extra slot for latencies above the last bucket
+                counts = self.counts[path] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+
+    def merged(self, path=None):
+        with self.lock:
+            if path is not None:
+                return list(self.counts.get(path, []))
+            merged = [0] * (len(self.buckets) + 1)
+            for counts in self.counts.values():
+                merged = [a + b for a, b in zip(merged, counts)]
+            return merged
+
+    def percentile(self, q, path=None):
+        """Upper bucket bound in ms for the ``q``-th percentile, or None without samples"""
+        counts = self.merged(path)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = total * q / 100
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+
+    def summary(self):
+        """Request count, p50 and p99 per path"""
+        with self.lock:
+            paths = list(self.counts)
+        return {path: {'requests': sum(self.merged(path)),
+                       'p50_ms': self.percentile(50, path),
+                       'p99_ms': self.percentile(99, path)}
+                for path in paths}
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled connections disable Nagle and enable TCP keep-alive"""
+
+    socket_options = HTTPConnection.default_socket_options + [
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    ]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+_latency = LatencyHistogram()
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_latency_histogram():
+    """Latencies of every request sent through factory-built clients"""
+    return _latency
+
+def tune_session(session, pool_size=10, histogram=None):
+    """Give a requests session a sized keep-alive pool and latency recording"""
+    adapter = KeepAliveAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if histogram is not None:
+        def record_latency(response, *args, **kwargs):
+            histogram.record(urlparse(response.url).path, response.elapsed.total_seconds())
+        session.hooks['response'].append(record_latency)
+
+def create_client(config):
+    """Build a pooled pybit client wrapped in the configured rate limiter and retries"""
+    rate_limited = config.get('rate_limiter', True)
+    client = HTTP(
+        api_key=config.get('api_key'),
+        api_secret=config.get('api_secret'),
+        testnet=config.get('testnet', True),
+        # Separate connect and read timeouts; requests accepts the tuple as-is
+        timeout=(config.get('connect_timeout', 3), config.get('request_timeout', 10)),
+        return_response_headers=rate_limited
+    )
+    if config.get('base_url'):
+        client.endpoint = config['base_url'].rstrip('/')
+
+    # Enough connections for every worker thread plus the main loop and dashboards
+    pool_size = config.get('http_pool_size') or max(10, config.get('max_concurrent_symbols', 1) * 2)
+    tune_session(client.client, pool_size, _latency)
+
+    if rate_limited:
+        # All traffic is paced and queued by the shared request scheduler
+        client = RateLimitedClient(client, get_request_scheduler(config.get('rate_limits')))
+    if config.get('retry_requests', True):
+        # Outermost, so every retry is paced by the rate limiter as well
+        client = ResilientClient(
+            client,
+            max_retries=config.get('max_retries', 3),
+            base_delay=config.get('retry_base_delay', 0.25),
+            deadline=config.get('call_deadline', 10.0),
+            deadlines=config.get('call_deadlines'),
+            failure_threshold=config.get('circuit_failure_threshold', 5),
+            reset_timeout=config.get('circuit_reset_timeout', 30.0)
+        )
+    return client
+
+def get_client(config):
+    """Process-wide client for a set of credentials, shared by the bot and dashboards"""
+    key = (config.get('api_key'), config.get('testnet', True), config.get('base_url'))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = create_client(config)
+            _clients[key] = client
+        return client
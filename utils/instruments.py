@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, ROUND_UP
+from .logger import setup_logger
+
+# Bybit returns at most this many instruments per page
+INSTRUMENTS_PAGE_LIMIT = 1000
+
+def round_to_step(value, step, rounding=ROUND_DOWN):
+    """Round a value to a multiple of step without binary float artefacts"""
+    step = Decimal(str(step))
+    if step <= 0:
+        return value
+    units = (Decimal(str(value)) / step).to_integral_value(rounding=rounding)
+    return float(units * step)
+
+def size_order(balance, price, symbol, instrument=None, fraction=0.1):
+    """Order quantity for ``fraction`` of the balance at ``price``
+
+    With instrument filters the quantity is floored to the lot step and
+    clamped to the exchange's minimum and maximum, and raised to the
+    minimum order value; 0 is returned when the minimum quantity or order
+    value is more than the balance or the maximum quantity allows. Without
+    filters the legacy precision guess and 0.001 floor are used.
+    """
+    quantity = balance * fraction / price
+
+    if instrument is None:
+        if symbol.endswith("USDT"):
+            quantity = round(quantity, 6 if "BTC" in symbol else 4)
+        return max(quantity, 0.001)
+
+    quantity = round_to_step(quantity, instrument['qty_step'])
+    quantity = max(quantity, instrument['min_qty'])
+    min_notional = instrument.get('min_notional')
+    if min_notional and quantity * price < min_notional:
+        # Smallest lot-step quantity worth at least the minimum order value
+        quantity = round_to_step(min_notional / price, instrument['qty_step'], ROUND_UP)
+        max_qty = instrument.get('max_market_qty') or instrument.get('max_qty')
+        if max_qty and quantity > max_qty:
+            return 0.0
+    if quantity * price > balance:
+        # The exchange minimum is worth more than the balance, so the order would only be rejected
+        return 0.0
+    if instrument.get('max_market_qty'):
+        quantity = min(quantity, round_to_step(instrument['max_market_qty'], instrument['qty_step']))
+    return quantity
+
+class InstrumentCache:
+    """Lot-size and tick-size filters for every instrument in a category
+
+    Filters are loaded in one paginated ``get_instruments_info`` sweep and
+    persisted to disk. At startup the on-disk copy is used immediately and,
+    when older than ``ttl`` seconds, refreshed on a background thread.
+    """
+
+    def __init__(self, client, path="data/instruments_linear.json", ttl=86400, category="linear"):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.category = category
+        self.instruments = {}
+        self.fetched_at = None
+        self.refresh_thread = None
+        self.lock = threading.Lock()
+        self.logger = setup_logger("InstrumentCache")
+
+    def load(self, background=True):
+        """Load from disk, refreshing from the API if missing or expired"""
+        if self.path is None:
+            # Nothing persisted, always start from the API
+            self.refresh()
+            return
+        try:
+            with open(self.path, 'r') as file:
+                cached = json.load(file)
+            with self.lock:
+                self.instruments = cached['instruments']
+                self.fetched_at = cached['fetched_at']
+            self.logger.info(f"Loaded {len(self.instruments)} instruments from {self.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable instrument cache {self.path}: {e}")
+
+        if not self.instruments:
+            self.refresh()
+        elif time.time() - self.fetched_at > self.ttl:
+            if background:
+                self.refresh_thread = threading.Thread(target=self.refresh, daemon=True, name="instrument-refresh")
+                self.refresh_thread.start()
+            else:
+                self.refresh()
+
+    def refresh(self):
+        """Fetch all instrument filters and persist them"""
+        try:
+            instruments = {}
+            cursor = None
+            while True:
+                params = {"category": self.category, "limit": INSTRUMENTS_PAGE_LIMIT}
+                if cursor:
+                    params["cursor"] = cursor
+                response = self.client.get_instruments_info(**params)
+                if response['retCode'] != 0:
+                    raise RuntimeError(response['retMsg'])
+
+                for info in response['result']['list']:
+                    instruments[info['symbol']] = self.parse(info)
+
+                cursor = response['result'].get('nextPageCursor')
+                if not cursor or not response['result']['list']:
+                    break
+
+            with self.lock:
+                self.instruments = instruments
+                self.fetched_at = time.time()
+            self.save()
+            self.logger.info(f"Refreshed {len(instruments)} {self.category} instruments")
+
+        except Exception as e:
+            self.logger.error(f"Error refreshing instruments: {e}")
+
+    @staticmethod
+    def parse(info):
+        """Keep only the filters used for sizing and price rounding"""
+        lot_size = info.get('lotSizeFilter', {})
+        price_filter = info.get('priceFilter', {})
+        return {
+            'qty_step': float(lot_size.get('qtyStep') or lot_size.get('basePrecision') or 0),
+            'min_qty': float(lot_size.get('minOrderQty') or 0),
+            'max_qty': float(lot_size.get('maxOrderQty') or 0),
+            'max_market_qty': float(lot_size.get('maxMktOrderQty') or 0),
+            'min_notional': float(lot_size.get('minNotionalValue') or 0),
+            'tick_size': float(price_filter.get('tickSize') or 0)
+        }
+
+    def save(self):
+        """Write the filters to disk atomically"""
+        if self.path is None:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with self.lock:
+                cached = {'fetched_at': self.fetched_at, 'instruments': self.instruments}
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as file:
+                json.dump(cached, file)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            self.logger.error(f"Error saving instrument cache: {e}")
+
+    def get(self, symbol):
+        """Filters for a symbol, or None if unknown"""
+        return self.instruments.get(symbol)
+
+    def round_qty(self, symbol, quantity):
+        """Floor a quantity to the symbol's lot step"""
+        instrument = self.get(symbol)
+        if instrument is None:
+            return quantity
+        return round_to_step(quantity, instrument['qty_step'])
+
+    def round_price(self, symbol, price):
+        """Round a price to the symbol's tick size"""
+        instrument = self.get(symbol)
+        if instrument is None:
+            return price
+        return round_to_step(price, instrument['tick_size'], ROUND_HALF_UP)
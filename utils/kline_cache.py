@@ -0,0 +1,111 @@
+import threading
+import time
+from .klines import interval_to_ms, KLINE_FIELDS
+
+# Bybit returns at most this many candles per kline request
+MAX_KLINE_LIMIT = 1000
+
+class KlineCache:
+    """Caching layer in front of ``client.get_kline``
+
+    Closed candles are remembered per (symbol, interval). Later calls only
+    request candles from the last cached one onwards, and the response is
+    rebuilt from the cache in the same newest-first shape Bybit returns.
+    """
+
+    def __init__(self, client, capacity=MAX_KLINE_LIMIT, clock=time.time):
+        self.client = client
+        self.capacity = capacity
+        self.clock = clock
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get_kline(self, category="linear", symbol=None, interval="5", limit=200, **kwargs):
+        """Drop-in replacement for ``client.get_kline``"""
+        interval_ms = interval_to_ms(interval)
+        if interval_ms is None or kwargs or limit > self.capacity:
+            # Explicit ranges and variable-length intervals bypass the cache
+            return self.client.get_kline(category=category, symbol=symbol, interval=interval,
+                                         limit=limit, **kwargs)
+
+        key = (category, symbol, str(interval))
+        now = int(self.clock() * 1000)
+        with self.lock:
+            closed = self.entries.get(key)
+            last_closed = int(closed[-1][0]) if closed and len(closed) >= limit - 1 else None
+
+        missing = None
+        if last_closed is not None and (now - last_closed) // interval_ms + 2 <= MAX_KLINE_LIMIT:
+            missing = (now - last_closed) // interval_ms + 2
+
+        if missing is None:
+            response = self.client.get_kline(category=category, symbol=symbol, interval=interval, limit=limit)
+        else:
+            # Re-request the last cached candle too, in case it was still settling
+            response = self.client.get_kline(category=category, symbol=symbol, interval=interval,
+                                             start=last_closed, limit=missing)
+        if response['retCode'] != 0:
+            return response
+
+        rows = response['result']['list']
+        if missing is not None and (not rows or int(rows[-1][0]) != last_closed):
+            # Delta does not line up with the cache, start over
+            with self.lock:
+                self.entries.pop(key, None)
+            return self.get_kline(category=category, symbol=symbol, interval=interval, limit=limit)
+
+        open_row = None
+        new_closed = []
+        for row in reversed(rows):
+            if int(row[0]) + interval_ms <= now:
+                new_closed.append(row)
+            else:
+                open_row = row
+
+        with self.lock:
+            closed = self.entries.get(key) if missing is not None else None
+            if closed is None:
+                closed = self.entries[key] = []
+            if new_closed:
+                # Drop cached candles the response supersedes
+                first = int(new_closed[0][0])
+                while closed and int(closed[-1][0]) >= first:
+                    closed.pop()
+                closed.extend(new_closed)
+                if len(closed) > 2 * self.capacity:
+                    del closed[:-self.capacity]
+            response = self.build_response(response, closed, open_row, limit)
+
+        return response
+
+    def seed(self, symbol, interval, arrays, category="linear"):
+        """Pre-fill closed candles from oldest-first columnar history, so the next call fetches only newer ones"""
+        interval_ms = interval_to_ms(interval)
+        if interval_ms is None:
+            return
+        now = int(self.clock() * 1000)
+        columns = zip(*(arrays[field][-self.capacity:].tolist() for field in KLINE_FIELDS))
+        rows = [[str(int(row[0]))] + [str(value) for value in row[1:]] for row in columns
+                if row[0] + interval_ms <= now]
+        with self.lock:
+            self.entries[(category, symbol, str(interval))] = rows
+
+    def build_response(self, response, closed, open_row, limit):
+        """Assemble a newest-first kline response from cached rows"""
+        rows = [open_row] if open_row is not None else []
+        # A negative zero slice would return the whole cache, so only slice when room is left
+        remaining = limit - len(rows)
+        rows.extend(reversed(closed[len(closed) - remaining:] if remaining > 0 else []))
+
+        result = dict(response['result'])
+        result['list'] = rows
+        return {**response, 'result': result}
+
+    def invalidate(self, symbol=None):
+        """Forget cached candles for one symbol, or for all of them"""
+        with self.lock:
+            if symbol is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[1] == symbol]:
+                    del self.entries[key]
@@ -0,0 +1,27 @@
+import numpy as np
+
+KLINE_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+# Fixed-length Bybit intervals; monthly candles have no fixed length
+INTERVAL_MS = {
+    '1': 60_000, '3': 180_000, '5': 300_000, '15': 900_000, '30': 1_800_000,
+    '60': 3_600_000, '120': 7_200_000, '240': 14_400_000, '360': 21_600_000,
+    '720': 43_200_000, 'D': 86_400_000, 'W': 604_800_000,
+}
+
+def interval_to_ms(interval):
+    """Length of a kline interval in milliseconds, or None if it varies"""
+    return INTERVAL_MS.get(str(interval))
+
+def parse_klines(rows):
+    """Convert newest-first Bybit kline rows into oldest-first columnar arrays"""
+    if not rows:
+        return None
+
+    # One bulk string-to-float conversion, then a single copy that both
+    # reverses the rows and makes every column contiguous
+    matrix = np.array(rows, dtype=np.float64)[::-1, :len(KLINE_FIELDS)].T.copy()
+
+    arrays = dict(zip(KLINE_FIELDS[1:], matrix[1:]))
+    arrays['timestamp'] = matrix[0].astype(np.int64)
+    return arrays
@@ -0,0 +1,224 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import websocket
+from .klines import interval_to_ms
+from .logger import setup_logger
+
+MAINNET_WS_URL = "wss://stream.bybit.com/v5/public/linear"
+TESTNET_WS_URL = "wss://stream-testnet.bybit.com/v5/public/linear"
+
+# Bybit accepts at most this many topics per subscribe request
+TOPICS_PER_REQUEST = 10
+
+class MarketDataStream:
+    """Streams kline and ticker topics from the Bybit public WebSocket
+
+    Every kline update is merged into the candle store. Closed candles are
+    reported through ``on_candle_close(symbol, interval)``. After a
+    reconnect, or when a candle arrives after a gap, the missing candles are
+    backfilled through REST on a worker thread, so the WebSocket callback
+    thread keeps answering pings. A symbol's pushes are held back while its
+    backfill runs and merged, in order, once it is done.
+    """
+
+    def __init__(self, symbols, candles, rest_client, interval="5", url=None, testnet=True,
+                 on_candle_close=None, on_ticker=None, ping_interval=20, max_reconnect_delay=30,
+                 backfill_limit=200, backfill_workers=4):
+        self.symbols = list(symbols)
+        self.candles = candles
+        self.rest_client = rest_client
+        self.interval = str(interval)
+        self.interval_ms = interval_to_ms(interval)
+        self.url = url or (TESTNET_WS_URL if testnet else MAINNET_WS_URL)
+        self.on_candle_close = on_candle_close
+        self.on_ticker = on_ticker
+        self.ping_interval = ping_interval
+        self.max_reconnect_delay = max_reconnect_delay
+        self.backfill_limit = backfill_limit
+        self.logger = setup_logger("MarketDataStream")
+        self.backfills = ThreadPoolExecutor(max_workers=backfill_workers, thread_name_prefix="stream-backfill")
+        # Symbols with a backfill queued or running, mapped to the pushes held back meanwhile
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+        self.tickers = {}
+        self.ws = None
+        self.running = False
+        self.connected = threading.Event()
+        self.thread = None
+
+    @property
+    def topics(self):
+        topics = [f"kline.{self.interval}.{symbol}" for symbol in self.symbols]
+        topics.extend(f"tickers.{symbol}" for symbol in self.symbols)
+        return topics
+
+    def start(self):
+        """Start streaming on a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run_forever, daemon=True, name="market-stream")
+        self.thread.start()
+        self.logger.info(f"Market data stream started for {len(self.symbols)} symbols")
+
+    def stop(self):
+        """Stop streaming and close the connection"""
+        self.running = False
+        if self.ws:
+            self.ws.close()
+        self.backfills.shutdown(wait=False, cancel_futures=True)
+        self.logger.info("Market data stream stopped")
+
+    def run_forever(self):
+        """Connect, and keep reconnecting with backoff until stopped"""
+        delay = 1
+        while self.running:
+            started = time.monotonic()
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self.handle_open,
+                on_message=self.handle_message,
+                on_error=self.handle_error,
+                on_close=self.handle_close
+            )
+            heartbeat = threading.Thread(target=self.heartbeat, args=(self.ws,), daemon=True)
+            heartbeat.start()
+            self.ws.run_forever(ping_interval=self.ping_interval, ping_timeout=self.ping_interval / 2)
+            self.connected.clear()
+
+            if not self.running:
+                break
+
+            # Connections that stayed up for a while reset the backoff
+            if time.monotonic() - started > self.max_reconnect_delay:
+                delay = 1
+            self.logger.warning(f"Market data stream disconnected, reconnecting in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def heartbeat(self, ws):
+        """Send Bybit's application-level ping while a connection is open"""
+        while self.running and ws is self.ws:
+            time.sleep(self.ping_interval)
+            if self.connected.is_set() and ws is self.ws:
+                try:
+                    ws.send(json.dumps({"op": "ping"}))
+                except Exception:
+                    return
+
+    def handle_open(self, ws):
+        """Resubscribe every topic, then backfill anything missed while disconnected"""
+        topics = self.topics
+        for i in range(0, len(topics), TOPICS_PER_REQUEST):
+            ws.send(json.dumps({"op": "subscribe", "args": topics[i:i + TOPICS_PER_REQUEST]}))
+        self.connected.set()
+        self.logger.info(f"Subscribed to {len(topics)} topics")
+
+        for symbol in self.symbols:
+            self.schedule_backfill(symbol)
+
+    def handle_message(self, ws, message):
+        """Dispatch kline and ticker pushes"""
+        try:
+            payload = json.loads(message)
+            topic = payload.get('topic', '')
+            if topic.startswith('kline.'):
+                self.handle_kline(topic.rsplit('.', 1)[-1], payload['data'])
+            elif topic.startswith('tickers.'):
+                self.handle_ticker(topic.split('.', 1)[1], payload)
+            elif payload.get('op') == 'subscribe' and not payload.get('success', True):
+                self.logger.error(f"Subscription failed: {payload.get('ret_msg')}")
+        except Exception as e:
+            self.logger.error(f"Error handling stream message: {e}")
+
+    def handle_kline(self, symbol, candles):
+        """Merge kline pushes into the candle store, or hold them back while the symbol backfills"""
+        for candle in candles:
+            with self.pending_lock:
+                held = self.pending.get(symbol)
+                if held is not None:
+                    held.append(candle)
+                    continue
+
+            last_timestamp = self.candles.buffer(symbol, self.interval).last_timestamp
+            if (last_timestamp is None or self.interval_ms
+                    and int(candle['start']) > last_timestamp + self.interval_ms):
+                # Merging this candle first would leave the gap behind it unfillable
+                self.schedule_backfill(symbol, candle)
+                continue
+
+            self.apply_kline(symbol, candle)
+
+    def apply_kline(self, symbol, candle):
+        row = [candle['start'], candle['open'], candle['high'], candle['low'],
+               candle['close'], candle['volume'], candle.get('turnover', '0')]
+        self.candles.ingest(symbol, self.interval, {'result': {'list': [row]}})
+
+        if candle.get('confirm') and self.on_candle_close:
+            self.on_candle_close(symbol, self.interval)
+
+    def handle_ticker(self, symbol, payload):
+        """Keep the latest ticker per symbol, applying deltas onto the snapshot"""
+        if payload.get('type') == 'snapshot' or symbol not in self.tickers:
+            self.tickers[symbol] = dict(payload['data'])
+        else:
+            self.tickers[symbol].update(payload['data'])
+
+        if self.on_ticker:
+            self.on_ticker(symbol, self.tickers[symbol])
+
+    def handle_error(self, ws, error):
+        self.logger.error(f"Market data stream error: {error}")
+
+    def handle_close(self, ws, status_code, message):
+        self.logger.info(f"Market data stream closed: {status_code} {message}")
+
+    def schedule_backfill(self, symbol, candle=None):
+        """Queue a backfill for symbol, holding back ``candle`` and later pushes until it is done"""
+        with self.pending_lock:
+            held = self.pending.get(symbol)
+            if held is None:
+                held = self.pending[symbol] = []
+                try:
+                    self.backfills.submit(self.run_backfill, symbol)
+                except RuntimeError:
+                    # Stopped meanwhile
+                    del self.pending[symbol]
+                    return
+            if candle is not None:
+                held.append(candle)
+
+    def run_backfill(self, symbol):
+        """Backfill symbol, then merge the pushes that arrived meanwhile"""
+        self.backfill(symbol)
+        while True:
+            with self.pending_lock:
+                held = self.pending[symbol]
+                if not held:
+                    del self.pending[symbol]
+                    return
+                self.pending[symbol] = []
+            for candle in held:
+                try:
+                    self.apply_kline(symbol, candle)
+                except Exception as e:
+                    self.logger.error(f"Error applying held kline for {symbol}: {e}")
+
+    def backfill(self, symbol):
+        """Fetch candles missed since the last stored one through REST"""
+        try:
+            limit = self.backfill_limit
+            last_timestamp = self.candles.buffer(symbol, self.interval).last_timestamp
+            if last_timestamp is not None and self.interval_ms:
+                missing = (int(time.time() * 1000) - last_timestamp) // self.interval_ms + 2
+                limit = max(2, min(missing, limit))
+
+            response = self.rest_client.get_kline(category="linear", symbol=symbol,
+                                                  interval=self.interval, limit=limit)
+            if response['retCode'] == 0:
+                self.candles.ingest(symbol, self.interval, response)
+            else:
+                self.logger.error(f"Backfill failed for {symbol}: {response['retMsg']}")
+        except Exception as e:
+            self.logger.error(f"Error backfilling {symbol}: {e}")
@@ -0,0 +1,293 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from .klines import parse_klines, interval_to_ms, INTERVAL_MS, KLINE_FIELDS
+from .logger import setup_logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; appends are then only serialized within the process
+    fcntl = None
+
+# Fixed-width little-endian columns, so a file's row count is its size / 8
+COLUMN_DTYPES = {field: np.dtype('<i8') if field == 'timestamp' else np.dtype('<f8') for field in KLINE_FIELDS}
+ROW_BYTES = 8
+# Present while rewritten columns are being swapped in; see OHLCVStore.merge
+MERGE_MARKER = "merge.pending"
+# Symbols and intervals become path components, so only exchange-style names are accepted
+SYMBOL_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]*")
+INTERVALS = set(INTERVAL_MS) | {'M'}
+
+class OHLCVStore:
+    """Append-only on-disk candle history, one binary file per column
+
+    Candles for a (symbol, interval) live under ``root/symbol/interval/``
+    with one ``<field>.bin`` file per OHLCV column. Live updates only append
+    closed candles newer than the last stored one; older history is added
+    with ``merge``, which rewrites the columns. Reads return ``numpy.memmap``
+    slices: months of history can be sliced without loading or copying it.
+    Columns are appended one after another, and a crash between them is
+    repaired by truncating every column to the shortest one on the next
+    append. Writers hold a per-(symbol, interval) lock in the process and
+    an exclusive ``flock`` on ``.lock`` in the candle directory, so the bot,
+    the dashboards and a backfill can share one store while a write to one
+    symbol never holds up another; reads never create files.
+    """
+
+    def __init__(self, root="data/ohlcv"):
+        self.root = root
+        self.maps = {}
+        # Guards only the dicts below and maps; never held across file I/O or a flock wait
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        # (symbol, interval) keys whose file lock this process holds, so nested use does not deadlock
+        self.held = set()
+        self.logger = setup_logger("OHLCVStore")
+
+    def directory(self, symbol, interval):
+        if not SYMBOL_PATTERN.fullmatch(str(symbol)) or str(interval) not in INTERVALS:
+            raise ValueError(f"Invalid symbol or interval: {symbol!r} {interval!r}")
+        return os.path.join(self.root, symbol, str(interval))
+
+    def path(self, symbol, interval, field):
+        return os.path.join(self.directory(symbol, interval), f"{field}.bin")
+
+    @contextmanager
+    def locked(self, symbol, interval, create=True):
+        """Hold the in-process and cross-process write locks for a symbol and interval
+
+        Readers pass ``create=False``: the lock file is then only opened if
+        a writer already made it, since without one no merge can be pending.
+        """
+        key = (symbol, str(interval))
+        directory = self.directory(symbol, interval)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.RLock())
+        # Reentrant, so once acquired ``held`` can only list this key if this thread holds the flock
+        with key_lock:
+            with self.lock:
+                nested = key in self.held
+            if nested:
+                yield
+                return
+            path = os.path.join(directory, ".lock")
+            if create:
+                os.makedirs(directory, exist_ok=True)
+            elif not os.path.exists(path):
+                yield
+                return
+            with open(path, 'a' if create else 'r') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                with self.lock:
+                    self.held.add(key)
+                try:
+                    self.finish_merge(symbol, interval)
+                    yield
+                finally:
+                    with self.lock:
+                        self.held.discard(key)
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def count(self, symbol, interval):
+        """Number of complete candles stored for a symbol and interval"""
+        sizes = []
+        for field in KLINE_FIELDS:
+            try:
+                sizes.append(os.path.getsize(self.path(symbol, interval, field)))
+            except OSError:
+                return 0
+        return min(sizes) // ROW_BYTES
+
+    def first_timestamp(self, symbol, interval):
+        """Open time of the oldest stored candle, or None"""
+        timestamps = self.columns(symbol, interval)['timestamp']
+        return int(timestamps[0]) if len(timestamps) else None
+
+    def last_timestamp(self, symbol, interval):
+        """Open time of the newest stored candle, or None"""
+        timestamps = self.read(symbol, interval, count=1)['timestamp']
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def symbols(self, interval=None):
+        """Symbols with stored history, optionally only those holding ``interval``"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(symbol for symbol in os.listdir(self.root) if SYMBOL_PATTERN.fullmatch(symbol)
+                      and (interval is None or self.count(symbol, interval)))
+
+    def columns(self, symbol, interval):
+        """Memory maps of every column, reopened only when the files have grown"""
+        key = (symbol, str(interval))
+        count = self.count(symbol, interval)
+        with self.lock:
+            cached = self.maps.get(key)
+        if cached is not None and cached[0] == count:
+            return cached[1]
+        if not count:
+            return {field: np.empty(0, dtype=dtype) for field, dtype in COLUMN_DTYPES.items()}
+
+        # Mapped and cached under the symbol's locks, so a merge cannot swap columns in meanwhile
+        with self.locked(symbol, interval, create=False):
+            count = self.count(symbol, interval)
+            # Files can be longer than count after an interrupted append; map only complete rows
+            columns = {field: np.memmap(self.path(symbol, interval, field), dtype=dtype, mode='r', shape=(count,))
+                       for field, dtype in COLUMN_DTYPES.items()}
+            with self.lock:
+                self.maps[key] = (count, columns)
+        return columns
+
+    def read(self, symbol, interval, start=None, end=None, count=None):
+        """Oldest-first candles opening in [start, end) as read-only memmap slices
+
+        ``count`` keeps only the newest candles of the range. Slices alias
+        the files, so nothing is copied until the values are used.
+        """
+        columns = self.columns(symbol, interval)
+        timestamps = columns['timestamp']
+        first = 0 if start is None else int(np.searchsorted(timestamps, start))
+        last = len(timestamps) if end is None else int(np.searchsorted(timestamps, end))
+        if count is not None:
+            first = max(first, last - count)
+        return {field: values[first:last] for field, values in columns.items()}
+
+    def append(self, symbol, interval, arrays, now_ms=None):
+        """Append oldest-first columnar candles; returns how many were written
+
+        Candles at or before the last stored one, and the still-forming
+        candle (open time + interval after ``now_ms``), are skipped.
+        """
+        timestamps = np.asarray(arrays['timestamp'], dtype=np.int64)
+        if not len(timestamps):
+            return 0
+
+        # One writer at a time, across threads and processes, so appends cannot interleave
+        with self.locked(symbol, interval):
+            keep = self.closed(interval, timestamps, now_ms)
+            last_timestamp = self.last_timestamp(symbol, interval)
+            if last_timestamp is not None:
+                keep &= timestamps > last_timestamp
+            if not keep.any():
+                return 0
+
+            count = self.count(symbol, interval)
+            for field, dtype in COLUMN_DTYPES.items():
+                with open(self.path(symbol, interval, field), 'ab') as file:
+                    if file.tell() != count * ROW_BYTES:
+                        # Left over from an interrupted append
+                        file.truncate(count * ROW_BYTES)
+                        file.seek(count * ROW_BYTES)
+                    file.write(np.asarray(arrays[field])[keep].astype(dtype).tobytes())
+        return int(keep.sum())
+
+    def merge(self, symbol, interval, arrays, now_ms=None):
+        """Insert oldest-first columnar candles anywhere in the history; returns how many were added
+
+        Unlike ``append`` this accepts candles older than the stored ones.
+        Stored candles win over incoming ones with the same open time. Every
+        column is rewritten to a ``.merge`` file and then renamed over the
+        original, so a merge costs a full copy of the history and is meant
+        for backfills, not live updates. The renames are only started once
+        all files are written and a marker is in place, so a crash leaves
+        either the old or the new history once ``finish_merge`` has run.
+        """
+        timestamps = np.asarray(arrays['timestamp'], dtype=np.int64)
+        if not len(timestamps):
+            return 0
+
+        with self.locked(symbol, interval):
+            keep = self.closed(interval, timestamps, now_ms)
+            # Copied out of the memmaps, which must be closed before their files are replaced
+            stored = {field: np.array(values) for field, values in self.read(symbol, interval).items()}
+            self.release(symbol, interval)
+            keep &= ~np.isin(timestamps, stored['timestamp'])
+            # Overlapping input pages can repeat a candle; keep its first copy
+            first_copy = np.zeros(len(timestamps), dtype=bool)
+            first_copy[np.unique(timestamps, return_index=True)[1]] = True
+            keep &= first_copy
+            if not keep.any():
+                return 0
+
+            order = np.argsort(np.concatenate([stored['timestamp'], timestamps[keep]]), kind='stable')
+            for field, dtype in COLUMN_DTYPES.items():
+                values = np.concatenate([stored[field], np.asarray(arrays[field])[keep].astype(dtype)])
+                with open(f"{self.path(symbol, interval, field)}.merge", 'wb') as file:
+                    file.write(values[order].tobytes())
+                    file.flush()
+                    os.fsync(file.fileno())
+            open(os.path.join(self.directory(symbol, interval), MERGE_MARKER), 'w').close()
+            self.finish_merge(symbol, interval)
+        return int(keep.sum())
+
+    def finish_merge(self, symbol, interval):
+        """Swap in fully written merged columns, or discard a merge that never finished writing"""
+        marker = os.path.join(self.directory(symbol, interval), MERGE_MARKER)
+        committed = os.path.exists(marker)
+        if committed:
+            # Windows refuses to replace a file that is still mapped
+            self.release(symbol, interval)
+        for field in KLINE_FIELDS:
+            staged = f"{self.path(symbol, interval, field)}.merge"
+            if os.path.exists(staged):
+                if committed:
+                    os.replace(staged, self.path(symbol, interval, field))
+                else:
+                    os.remove(staged)
+        if committed:
+            os.remove(marker)
+            # Maps opened meanwhile would still show the replaced files
+            self.release(symbol, interval)
+
+    def release(self, symbol, interval):
+        """Drop the cached memory maps of a symbol and interval"""
+        with self.lock:
+            self.maps.pop((symbol, str(interval)), None)
+
+    def closed(self, interval, timestamps, now_ms=None):
+        """Mask of the candles that have closed by ``now_ms``"""
+        keep = np.ones(len(timestamps), dtype=bool)
+        interval_ms = interval_to_ms(interval)
+        if interval_ms:
+            now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+            keep &= timestamps + interval_ms <= now_ms
+        return keep
+
+    def ingest(self, symbol, interval, kline_data, now_ms=None):
+        """Persist the closed candles of a Bybit kline response we do not hold yet"""
+        if not kline_data or 'result' not in kline_data:
+            return 0
+
+        rows = kline_data['result']['list']
+        last_timestamp = self.last_timestamp(symbol, interval)
+
+        # Rows are newest-first, so stop at the first candle we already have
+        if last_timestamp is not None:
+            for i, row in enumerate(rows):
+                if int(row[0]) <= last_timestamp:
+                    rows = rows[:i]
+                    break
+
+        arrays = parse_klines(rows)
+        if arrays is None:
+            return 0
+        try:
+            return self.append(symbol, interval, arrays, now_ms)
+        except OSError as e:
+            self.logger.error(f"Error writing {symbol} {interval} candles to {self.root}: {e}")
+            return 0
+
+_default_stores = {}
+_default_stores_lock = threading.Lock()
+
+def get_ohlcv_store(root="data/ohlcv"):
+    """Get the on-disk candle store for a directory, shared by the bot and the dashboards"""
+    with _default_stores_lock:
+        store = _default_stores.get(root)
+        if store is None:
+            store = _default_stores[root] = OHLCVStore(root)
+        return store
@@ -0,0 +1,239 @@
+import heapq
+import itertools
+import threading
+import time
+from .logger import setup_logger
+
+# Lower numbers are served first when several requests are queued
+PRIORITY_ORDER = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_MARKET = 2
+
+# Requests per second per endpoint group, from Bybit's published v5 limits
+DEFAULT_RATE_LIMITS = {
+    'order': 10,
+    'trading_stop': 10,
+    'position': 50,
+    'account': 50,
+    'order_read': 50,
+    'market': 100,
+    'default': 10,
+    # Per-IP ceiling shared by every endpoint (600 requests per 5 seconds)
+    'ip': 120
+}
+
+ENDPOINT_GROUPS = {
+    'place_order': ('order', PRIORITY_ORDER),
+    'amend_order': ('order', PRIORITY_ORDER),
+    'cancel_order': ('order', PRIORITY_ORDER),
+    'cancel_all_orders': ('order', PRIORITY_ORDER),
+    'set_trading_stop': ('trading_stop', PRIORITY_ORDER),
+    'get_positions': ('position', PRIORITY_ACCOUNT),
+    'get_wallet_balance': ('account', PRIORITY_ACCOUNT),
+    'get_open_orders': ('order_read', PRIORITY_ACCOUNT),
+    'get_order_history': ('order_read', PRIORITY_ACCOUNT)
+}
+
+MARKET_PREFIXES = ('get_kline', 'get_tickers', 'get_instruments_info', 'get_orderbook',
+                   'get_server_time', 'get_mark_price_kline', 'get_index_price_kline')
+
+# retCode Bybit uses for "too many visits"
+RATE_LIMIT_RET_CODE = 10006
+
+def endpoint_group(method_name):
+    """Endpoint group and priority for a client method"""
+    if method_name in ENDPOINT_GROUPS:
+        return ENDPOINT_GROUPS[method_name]
+    if method_name.startswith(MARKET_PREFIXES):
+        return 'market', PRIORITY_MARKET
+    return 'default', PRIORITY_ACCOUNT
+
+class TokenBucket:
+    """Token bucket that can be corrected by the exchange's rate-limit headers"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available"""
+        self.refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def update(self, limit=None, remaining=None, reset_ms=None):
+        """Apply X-Bapi-Limit, X-Bapi-Limit-Status and X-Bapi-Limit-Reset-Timestamp"""
+        now = time.monotonic()
+        self.refill(now)
+        if limit:
+            self.rate = self.capacity = float(limit)
+        if remaining is not None:
+            self.tokens = min(self.tokens, float(remaining))
+        if remaining == 0 and reset_ms:
+            # Convert the wall-clock reset time onto the monotonic clock
+            self.blocked_until = now + max(0.0, reset_ms / 1000 - time.time())
+
+class RequestScheduler:
+    """Shared per-endpoint token buckets with priority queueing
+
+    Callers block in ``acquire`` until their endpoint group has a token.
+    Within a group, waiting requests are served by priority and then in
+    arrival order, so order traffic overtakes queued market-data reads.
+    """
+
+    def __init__(self, rate_limits=None):
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS, **(rate_limits or {}))
+        self.buckets = {}
+        self.waiting = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.stats = {'requests': 0, 'queued_seconds': 0.0, 'rate_limited': 0}
+
+    def bucket(self, group):
+        bucket = self.buckets.get(group)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_limits.get(group, self.rate_limits['default']))
+            self.buckets[group] = bucket
+            self.waiting[group] = []
+        return bucket
+
+    def acquire(self, group, priority=PRIORITY_MARKET, timeout=None):
+        """Block until a request in ``group`` may be sent"""
+        started = time.monotonic()
+        with self.condition:
+            bucket = self.bucket(group)
+            queue = self.waiting[group]
+            ticket = (priority, next(self.sequence))
+            heapq.heappush(queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if queue[0] == ticket:
+                        wait = bucket.wait_time(now)
+                        if wait <= 0:
+                            bucket.take()
+                            heapq.heappop(queue)
+                            self.stats['requests'] += 1
+                            self.stats['queued_seconds'] += now - started
+                            self.condition.notify_all()
+                            return
+
+                    if timeout is not None:
+                        remaining = started + timeout - now
+                        if remaining <= 0:
+                            raise TimeoutError(f"Timed out waiting for {group} rate limit")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self.condition.wait(wait)
+            except BaseException:
+                if ticket in queue:
+                    queue.remove(ticket)
+                    heapq.heapify(queue)
+                    self.condition.notify_all()
+                raise
+
+    def update_from_headers(self, group, headers):
+        """Feed Bybit's rate-limit response headers back into the bucket"""
+        if not headers or 'X-Bapi-Limit-Status' not in headers:
+            return
+        try:
+            with self.condition:
+                self.bucket(group).update(
+                    limit=int(headers['X-Bapi-Limit']) if headers.get('X-Bapi-Limit') else None,
+                    remaining=int(headers['X-Bapi-Limit-Status']),
+                    reset_ms=int(headers['X-Bapi-Limit-Reset-Timestamp']) if headers.get('X-Bapi-Limit-Reset-Timestamp') else None
+                )
+                self.condition.notify_all()
+        except (TypeError, ValueError):
+            pass
+
+    def block(self, group, headers=None, seconds=1.0):
+        """Hold back a group after a rate-limit rejection"""
+        with self.condition:
+            self.stats['rate_limited'] += 1
+            bucket = self.bucket(group)
+            bucket.tokens = 0
+            reset_ms = headers.get('X-Bapi-Limit-Reset-Timestamp') if headers else None
+            if reset_ms:
+                bucket.blocked_until = time.monotonic() + max(0.0, int(reset_ms) / 1000 - time.time())
+            else:
+                bucket.blocked_until = time.monotonic() + seconds
+            self.condition.notify_all()
+
+class RateLimitedClient:
+    """Wraps a pybit ``HTTP`` client so every call goes through the scheduler
+
+    Build the wrapped client with ``return_response_headers=True`` so the
+    limits Bybit reports are applied; plain responses work as well. Calls
+    rejected for rate limiting are re-queued up to ``max_requeues`` times
+    instead of failing.
+    """
+
+    def __init__(self, client, scheduler, max_requeues=5, acquire_timeout=None):
+        self.client = client
+        self.scheduler = scheduler
+        self.max_requeues = max_requeues
+        self.acquire_timeout = acquire_timeout
+        self.logger = setup_logger("RateLimiter")
+
+        # We queue on 10006 ourselves rather than letting pybit sleep blindly
+        retry_codes = getattr(client, 'retry_codes', None)
+        if isinstance(retry_codes, set):
+            retry_codes.discard(RATE_LIMIT_RET_CODE)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+
+        group, priority = endpoint_group(name)
+
+        def call(*args, **kwargs):
+            for attempt in range(self.max_requeues + 1):
+                self.scheduler.acquire(group, priority, timeout=self.acquire_timeout)
+                # Every endpoint also competes for the shared IP budget, orders first
+                self.scheduler.acquire('ip', priority, timeout=self.acquire_timeout)
+                try:
+                    response = attribute(*args, **kwargs)
+                except Exception as e:
+                    headers = getattr(e, 'resp_headers', None)
+                    if getattr(e, 'status_code', None) in (RATE_LIMIT_RET_CODE, 403) and attempt < self.max_requeues:
+                        self.logger.warning(f"Rate limited on {name}, re-queueing")
+                        self.scheduler.block(group, headers)
+                        continue
+                    raise
+
+                headers = None
+                if isinstance(response, tuple):
+                    response, headers = response[0], response[-1] if len(response) > 2 else None
+                self.scheduler.update_from_headers(group, headers)
+
+                if (isinstance(response, dict) and response.get('retCode') == RATE_LIMIT_RET_CODE
+                        and attempt < self.max_requeues):
+                    self.logger.warning(f"Rate limited on {name}, re-queueing")
+                    self.scheduler.block(group, headers)
+                    continue
+                return response
+
+        return call
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+def get_request_scheduler(rate_limits=None):
+    """Get the request scheduler shared by the bot and the dashboards"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler(rate_limits)
+        return _default_scheduler
@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+from .logger import setup_logger
+
+# Bybit retCodes for server-side trouble that is worth retrying
+TRANSIENT_RET_CODES = {10000, 10016, 10019}
+
+# retCode for a reused orderLinkId, i.e. an earlier attempt was accepted
+DUPLICATE_ORDER_RET_CODE = 110072
+
+# Calls that change exchange state; only retried when they are idempotent
+ORDER_METHODS = ('place_order', 'amend_order', 'cancel_order')
+
+class CircuitOpenError(Exception):
+    """Raised without calling the exchange while an endpoint's circuit is open"""
+
+def is_transient(error):
+    """Whether an exception is a timeout, connection drop or server-side error"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # requests' ReadTimeout, ConnectionError and SSLError all derive from OSError
+    if isinstance(error, OSError):
+        return True
+
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        return False
+    if type(error).__name__ == 'FailedRequestError':
+        # HTTP 5xx, or a body that was not JSON (pybit reports 409)
+        return status_code >= 500 or status_code == 409
+    return status_code in TRANSIENT_RET_CODES
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one endpoint
+
+    After ``failure_threshold`` transient failures in a row the circuit opens
+    and calls fail immediately. Once ``reset_timeout`` seconds have passed a
+    single trial call is let through; success closes the circuit again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Whether a call may go out now"""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        """Count a transient failure; returns True if this opened the circuit"""
+        with self.lock:
+            was_open = self.opened_at is not None
+            self.failures += 1
+            self.trial_running = False
+            if was_open or self.failures >= self.failure_threshold:
+                # A failed trial restarts the open period
+                self.opened_at = self.clock()
+                return not was_open
+            return False
+
+class ResilientClient:
+    """Wraps an exchange client with retries, deadlines and circuit breakers
+
+    Transient failures are retried with full-jitter exponential backoff for as
+    long as the call's deadline allows. Order calls are only retried when they
+    carry an ``orderLinkId``, which makes a resend idempotent. Each endpoint
+    has its own circuit breaker so a degraded endpoint fails fast.
+    """
+
+    def __init__(self, client, max_retries=3, base_delay=0.25, max_delay=4.0, deadline=10.0,
+                 deadlines=None, failure_threshold=5, reset_timeout=30.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.deadlines = deadlines or {}
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.breakers = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.logger = setup_logger("ResilientClient")
+
+    def breaker(self, name):
+        with self.lock:
+            breaker = self.breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout, self.clock)
+                self.breakers[name] = breaker
+                self.stats[name] = {'calls': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0,
+                                    'circuit_opened': 0}
+            return breaker
+
+    def count(self, name, key):
+        with self.lock:
+            self.stats[name][key] += 1
+
+    def metrics(self):
+        """Per-endpoint call, retry and failure counts plus circuit state"""
+        with self.lock:
+            breakers = dict(self.breakers)
+            stats = {name: dict(values) for name, values in self.stats.items()}
+        for name, values in stats.items():
+            values['circuit'] = breakers[name].state
+        return stats
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for a retry attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self.call(name, attribute, args, kwargs)
+
+        return call
+
+    def call(self, name, function, args, kwargs):
+        breaker = self.breaker(name)
+        self.count(name, 'calls')
+        retryable = name not in ORDER_METHODS or bool(kwargs.get('orderLinkId'))
+        deadline = self.clock() + self.deadlines.get(name, self.deadline)
+        attempt = 0
+
+        while True:
+            if not breaker.allow():
+                self.count(name, 'short_circuited')
+                raise CircuitOpenError(f"Circuit open for {name}, failing fast")
+
+            try:
+                response = function(*args, **kwargs)
+                error = None
+            except Exception as e:
+                response, error = None, e
+
+            if error is None and not (isinstance(response, dict)
+                                      and response.get('retCode') in TRANSIENT_RET_CODES):
+                breaker.record_success()
+                return response
+
+            if error is not None and not is_transient(error):
+                if attempt > 0 and getattr(error, 'status_code', None) == DUPLICATE_ORDER_RET_CODE:
+                    # The order went through on an attempt whose response was lost
+                    breaker.record_success()
+                    self.logger.warning(f"{name} {kwargs.get('orderLinkId')} was already accepted")
+                    return {'retCode': 0, 'retMsg': 'OK', 'result': {'orderLinkId': kwargs.get('orderLinkId')}}
+                # Business errors say nothing about endpoint health
+                breaker.record_success()
+                raise error
+
+            opened = breaker.record_failure()
+            if opened:
+                self.count(name, 'circuit_opened')
+                self.logger.error(f"Circuit opened for {name} after {breaker.failures} consecutive failures")
+
+            delay = self.backoff(attempt)
+            if (not retryable or breaker.state != "closed" or attempt >= self.max_retries
+                    or self.clock() + delay > deadline):
+                self.count(name, 'failures')
+                if error is not None:
+                    raise error
+                return response
+
+            attempt += 1
+            self.count(name, 'retries')
+            reason = str(error).splitlines()[0] if error is not None else response.get('retMsg')
+            self.logger.warning(f"{name} failed ({reason}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            self.sleep(delay)
@@ -0,0 +1,74 @@
+import hashlib
+import heapq
+import time
+from .klines import interval_to_ms
+from .logger import setup_logger
+
+class CandleScheduler:
+    """Fires per-symbol evaluations just after each candle closes
+
+    Deadlines are computed from absolute candle boundaries rather than from
+    the end of the previous run, so slow evaluations never accumulate drift.
+    A deadline that is reached more than ``tolerance`` seconds late is
+    reported as missed and skipped in favour of the next candle.
+    """
+
+    def __init__(self, symbols, interval="5", delay=1.0, jitter=0.0, tolerance=None,
+                 clock=time.time, sleep=time.sleep):
+        interval_ms = interval_to_ms(interval)
+        if interval_ms is None:
+            raise ValueError(f"Interval {interval} has no fixed length")
+
+        self.period = interval_ms / 1000
+        self.delay = delay
+        self.jitter = jitter
+        self.tolerance = self.period / 4 if tolerance is None else tolerance
+        self.clock = clock
+        self.sleep = sleep
+        self.logger = setup_logger("CandleScheduler")
+
+        self.missed = {}
+        self.queue = []
+        boundary = self.next_boundary(self.clock())
+        for symbol in symbols:
+            heapq.heappush(self.queue, (boundary + self.offset(symbol), symbol, boundary))
+
+    def next_boundary(self, now):
+        """Start time of the first candle opening after ``now``"""
+        return (now // self.period + 1) * self.period
+
+    def offset(self, symbol):
+        """Fixed delay after the close plus a stable per-symbol jitter"""
+        if not self.jitter:
+            return self.delay
+        # Hash rather than random so a symbol keeps its slot across restarts
+        fraction = int(hashlib.md5(symbol.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return self.delay + fraction * self.jitter
+
+    def wait_next(self):
+        """Sleep until the next deadline and return (boundary, due symbols)"""
+        while True:
+            deadline, symbol, boundary = self.queue[0]
+            now = self.clock()
+            if deadline > now:
+                self.sleep(deadline - now)
+                continue
+
+            due = []
+            while self.queue and self.queue[0][0] <= now and self.queue[0][2] == boundary:
+                deadline, symbol, _ = heapq.heappop(self.queue)
+                next_boundary = boundary + self.period
+
+                if now - deadline > self.tolerance:
+                    self.missed[symbol] = self.missed.get(symbol, 0) + 1
+                    self.logger.warning(f"Missed deadline for {symbol} by {now - deadline:.2f}s "
+                                        f"({self.missed[symbol]} missed so far)")
+                    # Skip straight to the first candle that is still ahead of us
+                    next_boundary = max(next_boundary, self.next_boundary(now))
+                else:
+                    due.append(symbol)
+
+                heapq.heappush(self.queue, (next_boundary + self.offset(symbol), symbol, next_boundary))
+
+            if due:
+                return boundary, due